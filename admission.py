@@ -0,0 +1,202 @@
+import contextvars
+import math
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+
+# Classe de cada rota pelo prefixo do endpoint. None = sem controle (rotas
+# que nao usam o banco). O que nao casar vai pra 'light' (GET) ou 'write'.
+ROUTE_CLASSES = (
+    ('obter_', 'light'),
+    ('disponibilidade_', 'light'),
+    ('listar_', 'heavy'),
+    ('buscar_', 'heavy'),
+    ('exportar_', 'heavy'),
+    ('emprestimos_do_usuario', 'heavy'),
+    ('estatisticas_', None),
+    ('metrics_endpoint', None),
+    ('recibo_', None),
+    ('saude_', None),
+    ('static', None),
+)
+
+# (limite inicial, minimo, maximo, fila, timeout em ms)
+CLASS_DEFAULTS = {
+    'light': (20, 2, 100, 100, 1000),
+    'heavy': (4, 1, 20, 20, 5000),
+    'write': (10, 2, 50, 50, 2000),
+}
+
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+# Prazo (time.monotonic) do request atual, lido pelo conect_db
+_deadline = contextvars.ContextVar('admission_deadline', default=None)
+
+
+def remaining():
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+# Limite de requests simultaneos de uma classe, com uma fila limitada de
+# espera. O limite se ajusta pela latencia: compara a media curta com a longa
+# (a latencia "sem carga") e encolhe quando o banco fica mais lento, crescendo
+# devagar (+sqrt(limite)) enquanto a latencia se mantem.
+class Limiter:
+    def __init__(self, name, limit, min_limit, max_limit, max_queue, timeout):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._rtt_short = None
+        self._rtt_long = None
+        self._stats = {'admitted': 0, 'rejected': 0, 'timeouts': 0}
+
+    def acquire(self, deadline):
+        with self._cond:
+            if self._in_flight < int(self.limit):
+                self._in_flight += 1
+                self._stats['admitted'] += 1
+                return True
+            if self._waiting >= self.max_queue:
+                self._stats['rejected'] += 1
+                return False
+            self._waiting += 1
+            try:
+                while self._in_flight >= int(self.limit):
+                    restante = deadline - time.monotonic()
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        return False
+                    self._cond.wait(restante)
+                self._in_flight += 1
+                self._stats['admitted'] += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, rtt=None):
+        with self._cond:
+            self._in_flight -= 1
+            if rtt is not None:
+                self._adapt(rtt)
+            livres = int(self.limit) - self._in_flight
+            if livres > 0:
+                self._cond.notify(livres)
+
+    def _adapt(self, rtt):
+        if self._rtt_short is None:
+            self._rtt_short = self._rtt_long = rtt
+        self._rtt_short = 0.9 * self._rtt_short + 0.1 * rtt
+        self._rtt_long = 0.99 * self._rtt_long + 0.01 * rtt
+        # a media longa nunca fica mais que 2x acima da curta, senao demora
+        # pra voltar a crescer depois de um pico
+        self._rtt_long = min(self._rtt_long, 2 * self._rtt_short)
+        gradiente = max(0.5, min(1.0, self._rtt_long / self._rtt_short))
+        novo = self.limit * gradiente + math.sqrt(self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, 0.8 * self.limit + 0.2 * novo))
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'limit': int(self.limit),
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'latency_ms': round(self._rtt_short * 1000, 2) if self._rtt_short is not None else None,
+            })
+        return stats
+
+
+# Controle de admissao por classe de rota, antes de o request chegar ao pool.
+# Quem nao consegue vaga ate o prazo (timeout da classe ou o header
+# X-Request-Timeout-Ms, o que for menor) recebe 503 com Retry-After na hora.
+class AdmissionControl:
+    def __init__(self, limiters):
+        self.limiters = limiters
+
+    @classmethod
+    def from_env(cls):
+        limiters = {}
+        for nome, (limit, min_limit, max_limit, fila, timeout_ms) in CLASS_DEFAULTS.items():
+            prefixo = f"ADMISSION_{nome.upper()}_"
+            limiters[nome] = Limiter(
+                nome,
+                limit=int(os.getenv(prefixo + 'LIMIT', limit)),
+                min_limit=int(os.getenv(prefixo + 'MIN', min_limit)),
+                max_limit=int(os.getenv(prefixo + 'MAX', max_limit)),
+                max_queue=int(os.getenv(prefixo + 'QUEUE', fila)),
+                timeout=float(os.getenv(prefixo + 'TIMEOUT_MS', timeout_ms)) / 1000,
+            )
+        return cls(limiters)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        @app.route('/admission/stats', methods=['GET'])
+        def estatisticas_admission():
+            return jsonify(self.stats_detail())
+
+    def classify(self, endpoint, method):
+        for prefixo, classe in ROUTE_CLASSES:
+            if endpoint.startswith(prefixo):
+                return classe
+        return 'light' if method in ('GET', 'HEAD') else 'write'
+
+    def _before_request(self):
+        _deadline.set(None)
+        if request.endpoint is None:
+            return None
+        classe = self.classify(request.endpoint, request.method)
+        if classe is None:
+            return None
+        limiter = self.limiters[classe]
+
+        timeout = limiter.timeout
+        pedido = request.headers.get(DEADLINE_HEADER)
+        if pedido:
+            try:
+                timeout = min(timeout, max(0.0, float(pedido) / 1000))
+            except ValueError:
+                pass
+        deadline = time.monotonic() + timeout
+
+        if not limiter.acquire(deadline):
+            retry_after = max(1, math.ceil(limiter.timeout))
+            return jsonify({"status": "error", "message": "Servidor sobrecarregado, tente novamente."}), 503, {'Retry-After': str(retry_after)}
+        _deadline.set(deadline)
+        g.admission = (limiter, time.monotonic())
+        return None
+
+    # A vaga so e devolvida quando a resposta termina de ser enviada (streams
+    # seguram a conexao ate o fim). Streams nao entram no ajuste do limite.
+    def _after_request(self, response):
+        admitido = g.pop('admission', None)
+        if admitido is None:
+            return response
+        limiter, inicio = admitido
+        if response.is_streamed:
+            response.call_on_close(limiter.release)
+        else:
+            limiter.release(time.monotonic() - inicio)
+        return response
+
+    def stats(self):
+        stats = {}
+        for nome, limiter in self.limiters.items():
+            for chave, valor in limiter.stats().items():
+                stats[f"{nome}_{chave}"] = valor
+        return stats
+
+    def stats_detail(self):
+        return {nome: limiter.stats() for nome, limiter in self.limiters.items()}
@@ -0,0 +1,220 @@
+# Contadores de emprestimos por usuario, por livro e por dia, mantidos pelas
+# rotas de escrita na mesma transacao do INSERT/UPDATE/DELETE. Os DELETE em
+# cascata (usuario/livro) nao disparam trigger no InnoDB, por isso a
+# manutencao e feita na aplicacao e nao com triggers.
+#
+#   python aggregates.py check      # compara com um COUNT(*) e lista as diferencas
+#   python aggregates.py rebuild    # recalcula tudo a partir de emprestimos
+import argparse
+import os
+import random
+import sys
+from collections import Counter
+
+import mysql.connector
+
+STATS_DEFAULT_LIMIT = int(os.getenv('STATS_DEFAULT_LIMIT', 10))
+STATS_MAX_LIMIT = int(os.getenv('STATS_MAX_LIMIT', 1000))
+
+# Todo emprestimo novo cai no contador de hoje. Pra que as transacoes de
+# emprestimo nao fiquem em fila atras da trava de uma linha so, o dia e
+# dividido em DAY_SLOTS linhas (dia, slot); cada transacao soma num slot
+# sorteado e a leitura soma os slots do dia.
+DAY_SLOTS = int(os.getenv('AGGREGATE_DAY_SLOTS', 16))
+
+# tabela -> (coluna, SELECT que recalcula a tabela do zero)
+AGGREGATES = {
+    'emprestimos_por_usuario': ('usuario_id', "SELECT usuario_id, COUNT(*) FROM emprestimos WHERE usuario_id IS NOT NULL GROUP BY usuario_id"),
+    'emprestimos_por_livro': ('livro_id', "SELECT livro_id, COUNT(*) FROM emprestimos WHERE livro_id IS NOT NULL GROUP BY livro_id"),
+    'emprestimos_por_dia': ('dia', "SELECT data_emprestimo, COUNT(*) FROM emprestimos GROUP BY data_emprestimo"),
+}
+
+LOAN_ROW_QUERY = "SELECT usuario_id, livro_id, data_emprestimo FROM emprestimos WHERE id = %s FOR UPDATE"
+OWNER_LOANS_QUERY = "SELECT usuario_id, livro_id, data_emprestimo FROM emprestimos WHERE {coluna} = %s FOR UPDATE"
+OWNER_TABLES = {'usuario_id': 'emprestimos_por_usuario', 'livro_id': 'emprestimos_por_livro'}
+
+
+# Statements que aplicam os emprestimos inseridos (+1) e removidos (-1) nos
+# contadores, como (sql, params, executemany). Cada linha e (usuario_id,
+# livro_id, data_emprestimo); data None quer dizer hoje, pras linhas recem
+# inseridas com NOW(). As chaves vao em ordem pra que duas transacoes travem
+# as linhas dos contadores sempre na mesma sequencia.
+def _statements(inseridas, removidas):
+    por_usuario = Counter()
+    por_livro = Counter()
+    por_dia = Counter()
+    for sinal, linhas in ((1, inseridas), (-1, removidas)):
+        for usuario_id, livro_id, dia in linhas:
+            if usuario_id is not None:
+                por_usuario[usuario_id] += sinal
+            if livro_id is not None:
+                por_livro[livro_id] += sinal
+            por_dia[dia] += sinal
+
+    statements = []
+    for tabela, coluna, deltas in (('emprestimos_por_usuario', 'usuario_id', por_usuario),
+                                   ('emprestimos_por_livro', 'livro_id', por_livro)):
+        valores = sorted((chave, delta) for chave, delta in deltas.items() if delta)
+        if valores:
+            statements.append((
+                f"INSERT INTO {tabela} ({coluna}, total) VALUES (%s, %s) "
+                "ON DUPLICATE KEY UPDATE total = total + VALUES(total)",
+                valores, True,
+            ))
+    slot = random.randrange(DAY_SLOTS)
+    for dia, delta in sorted(por_dia.items(), key=lambda item: str(item[0])):
+        if delta:
+            statements.append((
+                "INSERT INTO emprestimos_por_dia (dia, slot, total) VALUES (COALESCE(%s, CURDATE()), %s, %s) "
+                "ON DUPLICATE KEY UPDATE total = total + VALUES(total)",
+                (dia, slot, delta), False,
+            ))
+    return statements
+
+
+def apply(cursor, inseridas=(), removidas=()):
+    for sql, params, many in _statements(inseridas, removidas):
+        if many:
+            cursor.executemany(sql, params)
+        else:
+            cursor.execute(sql, params)
+
+
+# Mesmo que apply(), com o cursor de mysql.connector.aio (app_async.py)
+async def apply_async(cursor, inseridas=(), removidas=()):
+    for sql, params, many in _statements(inseridas, removidas):
+        if many:
+            await cursor.executemany(sql, params)
+        else:
+            await cursor.execute(sql, params)
+
+
+# Callback de insert_chunk (bulk e fila de escrita): linhas (usuario_id, livro_id)
+def on_loans_inserted(cursor, linhas):
+    apply(cursor, inseridas=[(usuario_id, livro_id, None) for usuario_id, livro_id in linhas])
+
+
+# Le (e trava) o emprestimo antes de um UPDATE/DELETE
+def loan_row(cursor, id):
+    cursor.execute(LOAN_ROW_QUERY, (id,))
+    return cursor.fetchone()
+
+
+async def loan_row_async(cursor, id):
+    await cursor.execute(LOAN_ROW_QUERY, (id,))
+    return await cursor.fetchone()
+
+
+# Antes de apagar um usuario ou livro: desconta os emprestimos que o
+# ON DELETE CASCADE vai levar junto e remove o contador do proprio dono
+def before_owner_delete(cursor, coluna, id):
+    cursor.execute(OWNER_LOANS_QUERY.format(coluna=coluna), (id,))
+    apply(cursor, removidas=cursor.fetchall())
+    cursor.execute(f"DELETE FROM {OWNER_TABLES[coluna]} WHERE {coluna} = %s", (id,))
+
+
+async def before_owner_delete_async(cursor, coluna, id):
+    await cursor.execute(OWNER_LOANS_QUERY.format(coluna=coluna), (id,))
+    await apply_async(cursor, removidas=await cursor.fetchall())
+    await cursor.execute(f"DELETE FROM {OWNER_TABLES[coluna]} WHERE {coluna} = %s", (id,))
+
+
+def read_limit(args):
+    limit = args.get('limit', STATS_DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("Parâmetro 'limit' deve ser um inteiro")
+    if limit < 1:
+        raise ValueError("Parâmetro 'limit' deve ser maior que zero")
+    return min(limit, STATS_MAX_LIMIT)
+
+
+def _expected(cursor, tabela):
+    cursor.execute(AGGREGATES[tabela][1])
+    return {chave: total for chave, total in cursor.fetchall()}
+
+
+# Soma por chave: os dias tem uma linha por slot
+def _current(cursor, tabela):
+    coluna = AGGREGATES[tabela][0]
+    cursor.execute(f"SELECT {coluna}, CAST(SUM(total) AS SIGNED) FROM {tabela} GROUP BY {coluna} HAVING SUM(total) <> 0")
+    return {chave: total for chave, total in cursor.fetchall()}
+
+
+# Diferencas entre os contadores e um COUNT(*) sobre emprestimos
+def check(conn):
+    cursor = conn.cursor()
+    try:
+        drift = {}
+        for tabela in AGGREGATES:
+            esperado = _expected(cursor, tabela)
+            atual = _current(cursor, tabela)
+            diferencas = [
+                {"key": str(chave), "expected": esperado.get(chave, 0), "actual": atual.get(chave, 0)}
+                for chave in sorted(set(esperado) | set(atual), key=str)
+                if esperado.get(chave, 0) != atual.get(chave, 0)
+            ]
+            if diferencas:
+                drift[tabela] = diferencas
+        return drift
+    finally:
+        cursor.close()
+
+
+# Recalcula as tres tabelas numa transacao. O INSERT ... SELECT trava as
+# linhas lidas de emprestimos, entao escritas concorrentes esperam o commit
+# em vez de se perderem.
+def rebuild(conn):
+    cursor = conn.cursor()
+    try:
+        for tabela, (coluna, select) in AGGREGATES.items():
+            cursor.execute(f"DELETE FROM {tabela}")
+            cursor.execute(f"INSERT INTO {tabela} ({coluna}, total) {select}")
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Contadores de empréstimos")
+    parser.add_argument('comando', choices=('check', 'rebuild'))
+    args = parser.parse_args()
+
+    config = {
+        'host': os.getenv('DB_HOST'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'database': os.getenv('DB_NAME'),
+        'port': int(os.getenv('DB_PORT', 24111)),
+    }
+    if os.getenv('DB_SSL_CA', 'ca.pem'):
+        config['ssl_ca'] = os.getenv('DB_SSL_CA', 'ca.pem')
+        config['ssl_verify_cert'] = True
+
+    conn = mysql.connector.connect(**config)
+    try:
+        if args.comando == 'rebuild':
+            rebuild(conn)
+            print("contadores recalculados")
+        drift = check(conn)
+    finally:
+        conn.close()
+
+    for tabela, diferencas in drift.items():
+        print(f"{tabela}: {len(diferencas)} diferenças")
+        for d in diferencas[:20]:
+            print(f"  {d['key']}: esperado {d['expected']}, atual {d['actual']}")
+    if drift:
+        sys.exit(1)
+    print("sem diferenças")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@ import os
 import mysql.connector
 from dotenv import load_dotenv 
 
+from db_pool import ConnectionPool
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,15 +19,23 @@ config = {
     'ssl_verify_cert': True
 }
 
+# Pool de conexoes por processo: evita o handshake TCP+TLS a cada request
+pool = ConnectionPool.from_env(config)
+
 def conect_db():
     try:
-        conn = mysql.connector.connect(**config)
+        conn = pool.get_connection()
         if conn.is_connected():
             return conn
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
 
+# Contadores do pool (checkouts, esperas, evictions...)
+@app.route('/pool/stats', methods=['GET'])
+def estatisticas_pool():
+    return jsonify(pool.stats())
+
 # Inserir um usuário no banco de dados
 @app.route('/usuario', methods=['POST'])
 def adicionar_usuario():
@@ -1,8 +1,34 @@
 from flask import Flask, request, jsonify
+import atexit
 import os
+import sys
 import mysql.connector
+from mysql.connector import errorcode
 from dotenv import load_dotenv 
 
+# modulos compartilhados (db_pool etc.) ficam na raiz do repositorio
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import admission
+import aggregates
+from batch import BatchError, run_batch
+from bulk import insert_in_chunks, read_bulk_rows, read_chunk_size
+from db_pool import ConnectionPool
+from entity_cache import EntityCache
+from fields import (EMPRESTIMOS_JOIN_FIELDS, TABLE_FIELDS, emprestimos_join_query, project,
+                    read_fields, select_list, where)
+from listing import build_page, read_date_range, read_page_args, stream_query
+from metrics import Metrics
+from multiget import multiget_response, parse_ids
+from profiler import Profiler
+from purge import TARGETS as PURGE_TARGETS, PurgeJobs, read_purge_request
+from replicas import ReplicaRouter, primary_requested, replica_read
+from search import read_search_args
+from slow_queries import SlowQueryLog
+from statements import StatementRegistry
+from table_versions import TableVersions, unversioned
+from write_behind import QueueFull, WriteBehindQueue
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -12,20 +38,176 @@ config = {
     'user': os.getenv('DB_USER'),
     'password': os.getenv('DB_PASSWORD'),
     'database': os.getenv('DB_NAME'),
-    'port': 24111,
-    'ssl_ca': 'ca.pem',
-    'ssl_verify_cert': True
+    'port': int(os.getenv('DB_PORT', 24111)),
 }
 
+# DB_SSL_CA vazio conecta sem TLS (ex.: o MySQL local do benchmark)
+if os.getenv('DB_SSL_CA', 'ca.pem'):
+    config['ssl_ca'] = os.getenv('DB_SSL_CA', 'ca.pem')
+    config['ssl_verify_cert'] = True
+
+# Pool de conexoes por processo: evita o handshake TCP+TLS a cada request
+pool = ConnectionPool.from_env(config)
+
+# GETs vao pras replicas de DB_REPLICAS (se houver), o resto pro primario
+router = ReplicaRouter.from_env(pool, config)
+router.init_app(app)
+
+# Prepared statements reaproveitados por conexao (contagem em /statements/stats)
+statements = StatementRegistry.from_env()
+
+# Cache dos GET por id (livro, usuario, emprestimo)
+cache = EntityCache.from_env()
+
+# Statements acima de SLOW_QUERY_MS, com EXPLAIN, em /slow-queries
+slow_queries = SlowQueryLog.from_env()
+
+# Histogramas por rota (connect/execute/fetch/serialize) em GET /metrics
+metrics = Metrics.from_env()
+metrics.init_app(app)
+metrics.register('db_pool', pool.stats,
+                 counters=('checkouts', 'waits', 'timeouts', 'created', 'evictions', 'broken'),
+                 gauges=('size', 'idle', 'in_use'))
+metrics.register('db_breaker', pool.breaker.stats,
+                 counters=('opens', 'rejected', 'failures', 'probes'),
+                 per_process=('state_code',))
+metrics.register('replicas', router.stats,
+                 counters=('primary_reads', 'replica_reads', 'fallbacks'))
+metrics.register('statements', statements.stats,
+                 counters=('prepares', 'hits', 'unprepared', 'evictions'))
+metrics.register('cache', cache.stats,
+                 counters=('hits', 'misses', 'evictions', 'invalidations'),
+                 gauges=('size',))
+metrics.register('slow_queries', slow_queries.stats,
+                 counters=('slow', 'explains', 'explain_errors', 'dropped'),
+                 gauges=('fingerprints', 'full_scans'))
+
+# Versao de cada tabela (compartilhada entre os workers) usada nos ETags
+versions = TableVersions(os.getenv('VERSIONS_PATH', '/tmp/table_versions.bin'))
+
+# Limite de requests simultaneos por classe de rota, ligado com ADMISSION_CONTROL=1
+if os.getenv('ADMISSION_CONTROL', '0') == '1':
+    admission_control = admission.AdmissionControl.from_env()
+    admission_control.init_app(app)
+    metrics.register('admission', admission_control.stats,
+                     counters=[f"{c}_{k}" for c in admission.CLASS_DEFAULTS for k in ('admitted', 'rejected', 'timeouts')],
+                     gauges=[f"{c}_{k}" for c in admission.CLASS_DEFAULTS for k in ('limit', 'in_flight', 'waiting')])
+
+# Profiler por amostragem dos requests, so com PROFILE_TOKEN (depois do
+# controle de admissao, pra nao medir a espera na fila)
+profiler = Profiler.from_env()
+profiler.init_app(app)
+
+# Fila de escrita dos POST /emprestimo (group commit), ligada com WRITE_BEHIND=1
+write_behind = None
+
 def conect_db():
     try:
-        conn = mysql.connector.connect(**config)
+        with metrics.phase('connect'):
+            # espera pelo pool so ate o prazo do request (controle de admissao)
+            conn = router.get_connection(admission.remaining())
         if conn.is_connected():
-            return conn
+            if replica_read():
+                # a replica pode estar atras da versao das tabelas: sem ETag
+                unversioned()
+            return metrics.instrument(slow_queries.wrap(statements.wrap(conn)))
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
 
+if os.getenv('WRITE_BEHIND', '0') == '1':
+    write_behind = WriteBehindQueue.from_env(
+        conect_db,
+        "INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())",
+        on_commit=lambda: versions.bump('emprestimos'),
+        on_insert=aggregates.on_loans_inserted,
+    )
+    metrics.register('write_behind', write_behind.stats,
+                     counters=('enqueued', 'rejected', 'flushes', 'rows', 'errors'),
+                     gauges=('queued',))
+    # grava o que ainda estiver na fila antes do processo sair
+    atexit.register(write_behind.shutdown)
+
+# Depois de cada bloco de um purge: ETags e cache dos emprestimos apagados e,
+# quando o bloco apagou o dono, do usuario/livro
+def purge_committed(recurso, owner_id, emprestimo_ids):
+    if emprestimo_ids:
+        versions.bump('emprestimos')
+        for emprestimo_id in emprestimo_ids:
+            cache.invalidate('emprestimo', emprestimo_id)
+    if owner_id is not None:
+        versions.bump(PURGE_TARGETS[recurso][0])
+        cache.invalidate(recurso, owner_id)
+
+# Purge em lote de usuarios/livros em blocos, segurando quando as replicas atrasam
+purge_jobs = PurgeJobs.from_env(conect_db, lag_fn=router.replication_lag, on_commit=purge_committed)
+metrics.register('purge', purge_jobs.stats,
+                 counters=('jobs', 'chunks', 'emprestimos_deleted', 'owners_deleted', 'throttles', 'retries', 'failures'),
+                 gauges=('queued',))
+
+# Chamado em cada worker do gunicorn depois do fork (gunicorn.conf.py): abre
+# as conexoes do pool deste processo antes de receber requests
+def init_worker():
+    try:
+        router.warm()
+    except mysql.connector.Error as err:
+        # o worker sobe assim mesmo; o /ready fica 503 ate o banco voltar
+        print(f"Error: {err}")
+    # a thread de purge tambem assume jobs de workers que morreram
+    purge_jobs.start()
+
+# Liveness: o processo responde (nao consulta o banco)
+@app.route('/live', methods=['GET'])
+def saude_live():
+    return jsonify({"status": "ok"}), 200
+
+# Readiness: 200 so com o primario respondendo a um SELECT 1. Vai direto no
+# pool, sem replicas nem controle de admissao, e espera no maximo READY_TIMEOUT.
+@app.route('/ready', methods=['GET'])
+def saude_ready():
+    try:
+        conn = pool.get_connection(float(os.getenv('READY_TIMEOUT', 2)))
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+    except mysql.connector.Error as err:
+        return jsonify({"status": "error", "message": f"Banco indisponível, {err}"}), 503
+    return jsonify({"status": "ok"}), 200
+
+# Contadores do pool (checkouts, esperas, evictions...)
+@app.route('/pool/stats', methods=['GET'])
+def estatisticas_pool():
+    return jsonify(pool.stats())
+
+# Preparos e reusos de cada statement
+@app.route('/statements/stats', methods=['GET'])
+def estatisticas_statements():
+    return jsonify(statements.stats_detail())
+
+# Statements lentos agrupados por fingerprint, do mais caro pro mais barato
+# ?limit= mostra so os N primeiros; DELETE zera a lista
+@app.route('/slow-queries', methods=['GET'])
+def estatisticas_slow_queries():
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Parâmetro 'limit' deve ser um inteiro"}), 400
+    return jsonify(slow_queries.stats_detail(limit))
+
+@app.route('/slow-queries', methods=['DELETE'])
+def estatisticas_slow_queries_reset():
+    slow_queries.reset()
+    return jsonify({"status": "ok", "message": "Lista de queries lentas zerada"})
+
+# Hits, misses e evictions do cache de entidades
+@app.route('/cache/stats', methods=['GET'])
+def estatisticas_cache():
+    return jsonify(cache.stats())
+
 # Inserir um usuario
 @app.route('/usuario', methods=['POST'])
 def adicionar_usuario():
@@ -36,6 +218,7 @@ def adicionar_usuario():
             cursor = conn.cursor()
             cursor.execute("INSERT INTO usuarios (nome, email, cpf) VALUES (%s, %s, %s)", (data['nome'], data['email'], data['cpf']))
             conn.commit()
+            versions.bump('usuarios')
             usuario_id = cursor.lastrowid
             return jsonify({"status": "ok", "usuario_id": usuario_id})
         except mysql.connector.Error as err:
@@ -45,6 +228,27 @@ def adicionar_usuario():
             conn.close()
     return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
 
+# Inserir varios usuários de uma vez (array JSON ou NDJSON)
+@app.route('/usuario/bulk', methods=['POST'])
+def adicionar_usuarios_bulk():
+    try:
+        chunk_size = read_chunk_size()
+        linhas = read_bulk_rows()
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            resultado = insert_in_chunks(conn, "INSERT INTO usuarios (nome, email, cpf) VALUES (%s, %s, %s)", ('nome', 'email', 'cpf'), linhas, chunk_size)
+            versions.bump('usuarios')
+            return jsonify({"status": "ok", **resultado}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao inserir usuários, {err}"}), 500
+        finally:
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
 # Inserir um livro no banco de dados
 @app.route('/livro', methods=['POST'])
 def adicionar_livro():
@@ -56,6 +260,7 @@ def adicionar_livro():
             cursor = conn.cursor()
             cursor.execute("INSERT INTO livros (titulo, isbn, autor) VALUES (%s, %s, %s)", (data['titulo'], data['isbn'], data['autor']))
             conn.commit()
+            versions.bump('livros')
             livro_id = cursor.lastrowid
             return jsonify({"status": "ok", "livro_id": livro_id})
         except mysql.connector.Error as err:
@@ -65,86 +270,535 @@ def adicionar_livro():
             conn.close()
     return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
 
+# Inserir varios livros de uma vez (array JSON ou NDJSON)
+@app.route('/livro/bulk', methods=['POST'])
+def adicionar_livros_bulk():
+    try:
+        chunk_size = read_chunk_size()
+        linhas = read_bulk_rows()
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            resultado = insert_in_chunks(conn, "INSERT INTO livros (titulo, isbn, autor) VALUES (%s, %s, %s)", ('titulo', 'isbn', 'autor'), linhas, chunk_size)
+            versions.bump('livros')
+            return jsonify({"status": "ok", **resultado}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao inserir livros, {err}"}), 500
+        finally:
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
 # Criar um emprestimo
 @app.route('/emprestimo', methods=['POST'])
 def adicionar_emprestimo():
     data = request.get_json()
+    if write_behind is not None:
+        return enfileirar_emprestimo(data)
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())", (data['usuario_id'], data['livro_id']))
+            emprestimo_id = cursor.lastrowid
+            aggregates.apply(cursor, inseridas=[(data['usuario_id'], data['livro_id'], None)])
+            conn.commit()
+            versions.bump('emprestimos')
+            return jsonify({"status": "ok", "emprestimo_id": emprestimo_id}), 201
+        except mysql.connector.Error as err:
+            # com o indice de emprestimos em aberto, um livro ja emprestado
+            # responde como no checkout
+            if err.errno == errorcode.ER_DUP_ENTRY:
+                return jsonify({"status": "error", "message": "Livro já está emprestado."}), 409
+            if err.errno == errorcode.ER_NO_REFERENCED_ROW_2:
+                return jsonify({"status": "error", "message": "Usuário ou livro não encontrado."}), 404
+            return jsonify({"status": "error", "message": f"Erro ao criar empréstimo, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Com a fila de escrita ligada o INSERT vai pro proximo group commit. O
+# request espera o commit e responde o id como antes; com ?async=1 (ou se o
+# commit demorar mais que WRITE_BEHIND_ACK_TIMEOUT) responde 202 com um recibo.
+def enfileirar_emprestimo(data):
+    try:
+        ticket = write_behind.submit((data['usuario_id'], data['livro_id']))
+    except QueueFull as err:
+        return jsonify({"status": "error", "message": str(err)}), 503, {'Retry-After': '1'}
+    if request.args.get('async') != '1' and ticket.wait(float(os.getenv('WRITE_BEHIND_ACK_TIMEOUT', 5))):
+        if ticket.erro is not None:
+            return jsonify({"status": "error", "message": f"Erro ao criar empréstimo, {ticket.erro}"}), 500
+        return jsonify({"status": "ok", "emprestimo_id": ticket.emprestimo_id}), 201
+    return jsonify(ticket.as_dict()), 202, {'Location': f"/emprestimo/recibo/{ticket.id}"}
+
+# Situacao de um recibo da fila de escrita: pending, ok (com o id) ou error.
+# O recibo so existe no worker que recebeu o POST.
+@app.route('/emprestimo/recibo/<recibo>', methods=['GET'])
+def recibo_emprestimo(recibo):
+    ticket = write_behind.receipt(recibo) if write_behind is not None else None
+    if ticket is None:
+        return jsonify({"status": "error", "message": "Recibo não encontrado"}), 404
+    return jsonify(ticket.as_dict()), 200
+
+# Varias escritas numa conexao e num commit so. Recebe {"operations": [...]}
+# com {"method", "path", "body"} no formato das rotas individuais (POST/PUT/
+# DELETE de /usuario, /livro e /emprestimo e POST /emprestimo/<id>/devolucao).
+# "$N" referencia o id gerado pela operacao N. Se uma operacao falha nada e
+# gravado e a resposta diz qual foi.
+@app.route('/batch', methods=['POST'])
+def executar_batch():
+    data = request.get_json(silent=True)
+    operacoes = data.get('operations') if isinstance(data, dict) else data
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor()
+            resultado = run_batch(cursor, operacoes)
             conn.commit()
+        except BatchError as err:
+            conn.rollback()
+            return jsonify({"status": "error", "index": err.index, "message": err.message}), err.status
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return jsonify({"status": "error", "message": f"Erro ao executar batch, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+
+        if resultado.tables:
+            versions.bump(*sorted(resultado.tables))
+        for entidade, id in resultado.invalidate:
+            cache.invalidate(entidade, id)
+        for entidade in resultado.invalidate_all:
+            cache.invalidate_all(entidade)
+        return jsonify({"status": "ok", "results": resultado.results}), 200
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Apagar varios usuarios/livros (e os emprestimos deles) em segundo plano.
+# Recebe {"ids": [...]} ou {"filter": {"campo": "valor"}} e responde 202 com o
+# id do job; o andamento fica em GET /purge/<job_id>.
+@app.route('/usuario/purge', methods=['POST'])
+def purgar_usuarios():
+    return iniciar_purge('usuario')
+
+@app.route('/livro/purge', methods=['POST'])
+def purgar_livros():
+    return iniciar_purge('livro')
+
+def iniciar_purge(recurso):
+    try:
+        pedido = read_purge_request(recurso, request.get_json(silent=True))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    try:
+        job_id = purge_jobs.submit(recurso, pedido)
+    except mysql.connector.Error as err:
+        return jsonify({"status": "error", "message": f"Erro ao criar purge, {err}"}), 500
+    return jsonify({"status": "ok", "job_id": job_id}), 202, {'Location': f"/purge/{job_id}"}
+
+# Situacao de um purge: queued, running, done, failed ou cancelled, com o
+# progresso (donos e emprestimos apagados, blocos, tempo segurado)
+@app.route('/purge/<job_id>', methods=['GET'])
+def status_purge(job_id):
+    try:
+        job = purge_jobs.get(job_id)
+    except mysql.connector.Error as err:
+        return jsonify({"status": "error", "message": f"Erro ao consultar purge, {err}"}), 500
+    if job is None:
+        return jsonify({"status": "error", "message": "Purge não encontrado"}), 404
+    return jsonify(job), 200
+
+# Cancelar um purge: o que ja foi apagado fica apagado
+@app.route('/purge/<job_id>', methods=['DELETE'])
+def cancelar_purge(job_id):
+    try:
+        cancelado = purge_jobs.cancel(job_id)
+    except mysql.connector.Error as err:
+        return jsonify({"status": "error", "message": f"Erro ao cancelar purge, {err}"}), 500
+    if not cancelado:
+        return jsonify({"status": "error", "message": "Purge não encontrado ou já terminado"}), 404
+    return jsonify({"status": "ok", "message": "Purge cancelado"}), 200
+
+# Emprestar um livro (checkout). O indice unico em emprestimos.livro_em_aberto
+# garante no maximo um emprestimo aberto por livro: dois checkouts do mesmo
+# livro ao mesmo tempo disputam so a entrada desse livro no indice, e o
+# segundo recebe 409. Livros diferentes nao se bloqueiam.
+@app.route('/emprestimo/checkout', methods=['POST'])
+def emprestar_livro():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not all(isinstance(data.get(c), int) for c in ('usuario_id', 'livro_id')):
+        return jsonify({"status": "error", "message": "Informe 'usuario_id' e 'livro_id' (inteiros)."}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())", (data['usuario_id'], data['livro_id']))
             emprestimo_id = cursor.lastrowid
-            return jsonify({"status": "ok", "emprestimo_id": emprestimo_id}, 201)
+            aggregates.apply(cursor, inseridas=[(data['usuario_id'], data['livro_id'], None)])
+            conn.commit()
+            versions.bump('emprestimos')
+            return jsonify({"status": "ok", "emprestimo_id": emprestimo_id}), 201
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao criar empréstimo, {err}"}, 500)
+            if err.errno == errorcode.ER_DUP_ENTRY:
+                return jsonify({"status": "error", "message": "Livro já está emprestado."}), 409
+            if err.errno == errorcode.ER_NO_REFERENCED_ROW_2:
+                return jsonify({"status": "error", "message": "Usuário ou livro não encontrado."}), 404
+            return jsonify({"status": "error", "message": f"Erro ao criar empréstimo, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Devolver um livro: fecha o emprestimo preenchendo data_devolucao
+@app.route('/emprestimo/<int:id>/devolucao', methods=['POST'])
+def devolver_livro(id):
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE emprestimos SET data_devolucao = CURDATE() WHERE id = %s AND data_devolucao IS NULL", (id,))
+            conn.commit()
+            if cursor.rowcount == 0:
+                # so consulta de novo pra escolher a mensagem de erro
+                cursor.execute("SELECT id FROM emprestimos WHERE id = %s", (id,))
+                if not cursor.fetchone():
+                    return jsonify({"status": "error", "message": "Empréstimo não encontrado."}), 404
+                return jsonify({"status": "error", "message": "Empréstimo já foi devolvido."}), 409
+            versions.bump('emprestimos')
+            cache.invalidate('emprestimo', id)
+            return jsonify({"status": "ok", "message": f"Empréstimo de id {id} devolvido com sucesso."}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao devolver empréstimo, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Ver se um livro esta disponivel (uma busca no indice de emprestimos abertos)
+@app.route('/livro/<int:id>/disponibilidade', methods=['GET'])
+@versions.conditional('livros', 'emprestimos')
+def disponibilidade_livro(id):
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT l.id, e.id AS emprestimo_id, e.usuario_id, e.data_emprestimo
+                FROM livros l
+                LEFT JOIN emprestimos e ON e.livro_em_aberto = l.id
+                WHERE l.id = %s
+            """, (id,))
+            livro = cursor.fetchone()
+            if not livro:
+                return jsonify({"status": "error", "message": "Livro não encontrado."}), 404
+            if livro['emprestimo_id'] is None:
+                return jsonify({"status": "ok", "livro_id": id, "disponivel": True}), 200
+            return jsonify({"status": "ok", "livro_id": id, "disponivel": False, "emprestimo": {
+                "id": livro['emprestimo_id'],
+                "usuario_id": livro['usuario_id'],
+                "data_emprestimo": livro['data_emprestimo'],
+            }}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao consultar disponibilidade, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Emprestimos em aberto de um usuario (indice usuario_id + data_devolucao)
+@app.route('/usuario/<int:id>/emprestimos', methods=['GET'])
+@versions.conditional('emprestimos', 'livros')
+def emprestimos_do_usuario(id):
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT e.id, e.livro_id, l.titulo AS livro, e.data_emprestimo
+                FROM emprestimos e
+                JOIN livros l ON e.livro_id = l.id
+                WHERE e.usuario_id = %s AND e.data_devolucao IS NULL
+                ORDER BY e.id
+            """, (id,))
+            emprestimos = cursor.fetchall()
+            return jsonify({"status": "ok", "usuario_id": id, "data": emprestimos}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao listar empréstimos do usuário, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Inserir varios empréstimos de uma vez (array JSON ou NDJSON)
+@app.route('/emprestimo/bulk', methods=['POST'])
+def adicionar_emprestimos_bulk():
+    try:
+        chunk_size = read_chunk_size()
+        linhas = read_bulk_rows()
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            resultado = insert_in_chunks(conn, "INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())", ('usuario_id', 'livro_id'), linhas, chunk_size,
+                                         on_insert=aggregates.on_loans_inserted)
+            versions.bump('emprestimos')
+            return jsonify({"status": "ok", **resultado}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao inserir empréstimos, {err}"}), 500
+        finally:
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 # Listar todos os usuários
+# ?ids=1,2,3 busca varios pelo id; ?fields=a,b escolhe as colunas
+# ?limit=&after= pagina por id; ?stream=json|ndjson|csv manda a tabela inteira em stream
 @app.route('/usuario', methods=['GET'])
+@versions.conditional('usuarios')
 def listar_usuarios():
+    try:
+        campos = read_fields(request.args, 'usuarios')
+        colunas = select_list(campos)
+        if 'ids' in request.args:
+            ids = parse_ids(request.args['ids'])
+            return multiget_response(conect_db, cache, 'usuario', 'usuarios', ids, campos)
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    formato = request.args.get('stream')
+    if formato:
+        return stream_query(conect_db, f"SELECT {colunas} FROM usuarios ORDER BY id", (), formato)
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM usuarios")
+            if pagina:
+                limit, after_id = pagina
+                cursor.execute(f"SELECT {colunas} FROM usuarios WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(cursor.fetchall(), limit))
+            cursor.execute(f"SELECT {colunas} FROM usuarios")
             usuarios = cursor.fetchall()
             if not usuarios:
-                return jsonify({"status": "ok", "message": "Nenhum usuário encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Nenhum usuário encontrado"}), 404
             return jsonify(usuarios)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao listar usuários, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao listar usuários, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 # Listar todos os livros
+# ?ids=1,2,3 busca varios pelo id; ?fields=a,b escolhe as colunas
+# ?limit=&after= pagina por id; ?stream=json|ndjson|csv manda a tabela inteira em stream
 @app.route('/livro', methods=['GET'])
+@versions.conditional('livros')
 def listar_livros():
+    try:
+        campos = read_fields(request.args, 'livros')
+        colunas = select_list(campos)
+        if 'ids' in request.args:
+            ids = parse_ids(request.args['ids'])
+            return multiget_response(conect_db, cache, 'livro', 'livros', ids, campos)
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    formato = request.args.get('stream')
+    if formato:
+        return stream_query(conect_db, f"SELECT {colunas} FROM livros ORDER BY id", (), formato)
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM livros")
+            if pagina:
+                limit, after_id = pagina
+                cursor.execute(f"SELECT {colunas} FROM livros WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(cursor.fetchall(), limit))
+            cursor.execute(f"SELECT {colunas} FROM livros")
             livros = cursor.fetchall()
             if not livros:
-                return jsonify({"status": "ok", "message": "Nenhum livro encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Nenhum livro encontrado"}), 404
             return jsonify(livros)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao listar livros, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao listar livros, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 # Listar todos os emprestimos
+# ?ids=1,2,3 busca varios pelo id (linhas de emprestimos, sem o JOIN)
+# ?fields=id,usuario,livro,data_emprestimo escolhe as colunas
+# ?limit=&after= pagina por id; ?stream=json|ndjson|csv manda a tabela inteira em stream
 @app.route('/emprestimo', methods=['GET'])
+@versions.conditional('emprestimos', 'usuarios', 'livros')
 def listar_emprestimos():
+    try:
+        if 'ids' in request.args:
+            ids = parse_ids(request.args['ids'])
+            campos = read_fields(request.args, 'emprestimos')
+            return multiget_response(conect_db, cache, 'emprestimo', 'emprestimos', ids, campos)
+        campos = read_fields(request.args, EMPRESTIMOS_JOIN_FIELDS)
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    # so faz o JOIN com usuarios/livros se o campo correspondente foi pedido
+    query, condicoes = emprestimos_join_query(campos)
+
+    formato = request.args.get('stream')
+    if formato:
+        return stream_query(conect_db, query + where(condicoes) + " ORDER BY e.id", (), formato)
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT e.id, u.nome AS usuario, l.titulo AS livro, e.data_emprestimo 
-                FROM emprestimos e 
-                JOIN usuarios u ON e.usuario_id = u.id 
-                JOIN livros l ON e.livro_id = l.id
-            """)
+            if pagina:
+                limit, after_id = pagina
+                cursor.execute(query + where(condicoes + ["e.id > %s"]) + " ORDER BY e.id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(cursor.fetchall(), limit))
+            cursor.execute(query + where(condicoes))
             emprestimos = cursor.fetchall()
             if not emprestimos:
-                return jsonify({"status": "ok", "message": "Nenhum empréstimo encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Nenhum empréstimo encontrado"}), 404
             return jsonify(emprestimos)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao listar empréstimos, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao listar empréstimos, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Exportar os emprestimos (com nome do usuario e titulo do livro) em stream
+# ?format=csv|ndjson (padrao csv), ?gzip=1 comprime a resposta
+# ?from=&to= filtra por data_emprestimo (usa o idx_emprestimos_data)
+@app.route('/emprestimo/export', methods=['GET'])
+@versions.conditional('emprestimos', 'usuarios', 'livros')
+def exportar_emprestimos():
+    formato = request.args.get('format', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({"status": "error", "message": "Parâmetro 'format' deve ser csv ou ndjson"}), 400
+    try:
+        desde, ate = read_date_range(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    condicoes = []
+    params = []
+    if desde is not None:
+        condicoes.append("e.data_emprestimo >= %s")
+        params.append(desde)
+    if ate is not None:
+        condicoes.append("e.data_emprestimo < %s")
+        params.append(ate)
+    query = """
+        SELECT e.id, e.usuario_id, u.nome AS usuario, e.livro_id, l.titulo AS livro,
+               e.data_emprestimo, e.data_devolucao
+        FROM emprestimos e
+        JOIN usuarios u ON e.usuario_id = u.id
+        JOIN livros l ON e.livro_id = l.id
+    """ + where(condicoes) + " ORDER BY e.data_emprestimo, e.id"
+
+    response = stream_query(conect_db, query, tuple(params), formato, compress=request.args.get('gzip') == '1')
+    if isinstance(response, tuple):
+        return response
+    response.headers['Content-Disposition'] = f"attachment; filename=emprestimos.{formato}"
+    return response
+
+# Estatisticas de emprestimos, lidas dos contadores (aggregates.py) em vez
+# de agregar a tabela de emprestimos a cada request
+# ?limit=N: os N usuarios que mais pegaram livros emprestados
+@app.route('/stats/usuarios', methods=['GET'])
+@versions.conditional('emprestimos', 'usuarios')
+def stats_emprestimos_por_usuario():
+    try:
+        limit = aggregates.read_limit(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    return stats_query("""
+        SELECT a.usuario_id, u.nome, a.total
+        FROM emprestimos_por_usuario a
+        JOIN usuarios u ON u.id = a.usuario_id
+        WHERE a.total > 0
+        ORDER BY a.total DESC, a.usuario_id
+        LIMIT %s
+    """, (limit,))
+
+@app.route('/stats/usuarios/<int:id>', methods=['GET'])
+@versions.conditional('emprestimos')
+def stats_emprestimos_do_usuario(id):
+    return stats_query("SELECT usuario_id, total FROM emprestimos_por_usuario WHERE usuario_id = %s", (id,), um=True)
+
+# ?limit=N: os N titulos mais emprestados
+@app.route('/stats/livros', methods=['GET'])
+@versions.conditional('emprestimos', 'livros')
+def stats_emprestimos_por_livro():
+    try:
+        limit = aggregates.read_limit(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    return stats_query("""
+        SELECT a.livro_id, l.titulo, l.autor, a.total
+        FROM emprestimos_por_livro a
+        JOIN livros l ON l.id = a.livro_id
+        WHERE a.total > 0
+        ORDER BY a.total DESC, a.livro_id
+        LIMIT %s
+    """, (limit,))
+
+@app.route('/stats/livros/<int:id>', methods=['GET'])
+@versions.conditional('emprestimos')
+def stats_emprestimos_do_livro(id):
+    return stats_query("SELECT livro_id, total FROM emprestimos_por_livro WHERE livro_id = %s", (id,), um=True)
+
+# Emprestimos por dia; ?from=&to= como no export
+@app.route('/stats/dias', methods=['GET'])
+@versions.conditional('emprestimos')
+def stats_emprestimos_por_dia():
+    try:
+        desde, ate = read_date_range(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    condicoes = []
+    params = []
+    if desde is not None:
+        condicoes.append("dia >= %s")
+        params.append(desde)
+    if ate is not None:
+        condicoes.append("dia < %s")
+        params.append(ate)
+    # cada dia tem uma linha por slot (aggregates.DAY_SLOTS)
+    return stats_query("SELECT dia, CAST(SUM(total) AS SIGNED) AS total FROM emprestimos_por_dia" + where(condicoes)
+                       + " GROUP BY dia HAVING SUM(total) > 0 ORDER BY dia", tuple(params))
+
+# Sem linha no contador o total e 0 (usuario/livro sem emprestimos)
+def stats_query(query, params, um=False):
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params)
+            if um:
+                linha = cursor.fetchone()
+                return jsonify({"status": "ok", "total": linha['total'] if linha else 0}), 200
+            return jsonify({"status": "ok", "data": cursor.fetchall()}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao ler estatísticas, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 # Atualizar um livro pelo id
 @app.route('/livro/<int:id>', methods=['PUT'])
@@ -172,13 +826,18 @@ def atualizar_livro(id):
                 return jsonify({"status": "error", "message": "Livro não encontrado."}), 404
 
             #gerar uma query dinamica com base nos campos q chegaram 
-            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
-            valores = list(campos_a_atualizar.values()) + [id]
+            # colunas em ordem fixa: o mesmo conjunto de campos gera o mesmo SQL
+            # e reaproveita o prepared statement
+            colunas = sorted(campos_a_atualizar)
+            set_clause = ", ".join([f"{campo} = %s" for campo in colunas])
+            valores = [campos_a_atualizar[campo] for campo in colunas] + [id]
 
             query = f"UPDATE livros SET {set_clause} WHERE id = %s"
 
             cursor.execute(query, valores)
             conn.commit()
+            versions.bump('livros')
+            cache.invalidate('livro', id)
 
             if cursor.rowcount == 0:
                 return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
@@ -203,8 +862,13 @@ def deletar_usuario(id):
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor()
+            aggregates.before_owner_delete(cursor, 'usuario_id', id)
             cursor.execute("DELETE FROM usuarios WHERE id = %s", (id,))
             conn.commit()
+            versions.bump('usuarios', 'emprestimos')
+            cache.invalidate('usuario', id)
+            # o ON DELETE CASCADE apaga os emprestimos do usuario junto
+            cache.invalidate_all('emprestimo')
             return jsonify({"status": "ok", "message": "Usuário deletado com sucesso"}, 200)
         except mysql.connector.Error as err:
             return jsonify({"status": "error", "message": f"Erro ao deletar usuário, {err}"}, 500)
@@ -220,8 +884,13 @@ def deletar_livro(id):
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor()
+            aggregates.before_owner_delete(cursor, 'livro_id', id)
             cursor.execute("DELETE FROM livros WHERE id = %s", (id,))
             conn.commit()
+            versions.bump('livros', 'emprestimos')
+            cache.invalidate('livro', id)
+            # o ON DELETE CASCADE apaga os emprestimos do livro junto
+            cache.invalidate_all('emprestimo')
             return jsonify({"status": "ok", "message": "Livro deletado com sucesso"}, 200)
         except mysql.connector.Error as err:
             return jsonify({"status": "error", "message": f"Erro ao deletar livro, {err}"}, 500)
@@ -245,21 +914,32 @@ def atualizar_emprestimo(id):
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT id FROM emprestimos WHERE id = %s", (id,))
-            emprestimo = cursor.fetchone()
+            emprestimo = aggregates.loan_row(cursor, id)
 
             if not emprestimo:
                 return jsonify({"status": "error", "message": "Empréstimo não encontrado."}), 404
                 
-            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
-            valores = list(campos_a_atualizar.values()) + [id]
+            # colunas em ordem fixa: o mesmo conjunto de campos gera o mesmo SQL
+            # e reaproveita o prepared statement
+            colunas = sorted(campos_a_atualizar)
+            set_clause = ", ".join([f"{campo} = %s" for campo in colunas])
+            valores = [campos_a_atualizar[campo] for campo in colunas] + [id]
 
             query = f"UPDATE emprestimos SET {set_clause} WHERE id = %s"
             cursor.execute(query, valores)
+            rowcount = cursor.rowcount
+            # move o emprestimo de um contador pro outro (usuario, livro ou dia)
+            usuario_id, livro_id, data_emprestimo = emprestimo
+            novo = (campos_a_atualizar.get('usuario_id', usuario_id),
+                    campos_a_atualizar.get('livro_id', livro_id),
+                    campos_a_atualizar.get('data_emprestimo', data_emprestimo))
+            aggregates.apply(cursor, inseridas=[novo], removidas=[emprestimo])
             conn.commit()
+            versions.bump('emprestimos')
+            cache.invalidate('emprestimo', id)
 
 
-            if cursor.rowcount == 0:
+            if rowcount == 0:
                 return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
 
             return jsonify({"status": "ok", "message": f"Empréstimo de id {id} atualizado com sucesso."}), 200
@@ -281,8 +961,13 @@ def deletar_emprestimo(id):
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor()
+            emprestimo = aggregates.loan_row(cursor, id)
             cursor.execute("DELETE FROM emprestimos WHERE id = %s", (id,))
+            if emprestimo:
+                aggregates.apply(cursor, removidas=[emprestimo])
             conn.commit()
+            versions.bump('emprestimos')
+            cache.invalidate('emprestimo', id)
             return jsonify({"status": "ok", "message": "Empréstimo deletado com sucesso"}, 200)
         except mysql.connector.Error as err:
             return jsonify({"status": "error", "message": f"Erro ao deletar empréstimo, {err}"}, 500)
@@ -315,12 +1000,17 @@ def atualizar_usuario(id):
             if not usuario:
                 return jsonify({"status": "error", "message": "Usuário não encontrado."}), 404
 
-            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
-            valores = list(campos_a_atualizar.values()) + [id]
+            # colunas em ordem fixa: o mesmo conjunto de campos gera o mesmo SQL
+            # e reaproveita o prepared statement
+            colunas = sorted(campos_a_atualizar)
+            set_clause = ", ".join([f"{campo} = %s" for campo in colunas])
+            valores = [campos_a_atualizar[campo] for campo in colunas] + [id]
 
             query = f"UPDATE usuarios SET {set_clause} WHERE id = %s"
             cursor.execute(query, valores)
             conn.commit()
+            versions.bump('usuarios')
+            cache.invalidate('usuario', id)
 
             if cursor.rowcount == 0:
                 return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
@@ -337,63 +1027,198 @@ def atualizar_usuario(id):
     return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados."}), 500
 
 
+# Buscar livros por titulo/autor (?q=, ?limit=), ordenado por relevancia
+@app.route('/livro/search', methods=['GET'])
+@versions.conditional('livros')
+def buscar_livros():
+    try:
+        campos = read_fields(request.args, 'livros') or TABLE_FIELDS['livros']
+        busca, limit = read_search_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {select_list(campos)}, MATCH(titulo, autor) AGAINST (%s IN BOOLEAN MODE) AS score
+                FROM livros
+                WHERE MATCH(titulo, autor) AGAINST (%s IN BOOLEAN MODE)
+                ORDER BY score DESC
+                LIMIT %s
+            """, (busca, busca, limit))
+            livros = cursor.fetchall()
+            return jsonify({"status": "ok", "data": livros}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao buscar livros, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Buscar usuários por nome/email (?q=, ?limit=), ordenado por relevancia
+@app.route('/usuario/search', methods=['GET'])
+@versions.conditional('usuarios')
+def buscar_usuarios():
+    try:
+        campos = read_fields(request.args, 'usuarios') or TABLE_FIELDS['usuarios']
+        busca, limit = read_search_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = conect_db()
+    if conn and conn.is_connected():
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {select_list(campos)}, MATCH(nome, email) AGAINST (%s IN BOOLEAN MODE) AS score
+                FROM usuarios
+                WHERE MATCH(nome, email) AGAINST (%s IN BOOLEAN MODE)
+                ORDER BY score DESC
+                LIMIT %s
+            """, (busca, busca, limit))
+            usuarios = cursor.fetchall()
+            return jsonify({"status": "ok", "data": usuarios}), 200
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao buscar usuários, {err}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
 #obter livro pelo id
 @app.route('/livro/<int:id>', methods=['GET'])
+@versions.conditional('livros')
 def obter_livro(id):
+    try:
+        campos = read_fields(request.args, 'livros')
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    livro = None if primary_requested() else cache.get('livro', id)
+    if livro is not None:
+        unversioned()
+        return jsonify(project(livro, campos))
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM livros WHERE id = %s", (id,))
+            cursor.execute(f"SELECT {select_list(campos)} FROM livros WHERE id = %s", (id,))
             livro = cursor.fetchone()
             if not livro:
-                return jsonify({"status": "error", "message": "Livro não encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Livro não encontrado"}), 404
+            if campos is None and not replica_read():
+                cache.set('livro', id, livro)
             return jsonify(livro)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao obter livro, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao obter livro, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 
 #obter usuario pelo id
 @app.route('/usuario/<int:id>', methods=['GET'])
+@versions.conditional('usuarios')
 def obter_usuario(id):
+    try:
+        campos = read_fields(request.args, 'usuarios')
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    usuario = None if primary_requested() else cache.get('usuario', id)
+    if usuario is not None:
+        unversioned()
+        return jsonify(project(usuario, campos))
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM usuarios WHERE id = %s", (id,))
+            cursor.execute(f"SELECT {select_list(campos)} FROM usuarios WHERE id = %s", (id,))
             usuario = cursor.fetchone()
             if not usuario:
-                return jsonify({"status": "error", "message": "Usuário não encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Usuário não encontrado"}), 404
+            if campos is None and not replica_read():
+                cache.set('usuario', id, usuario)
             return jsonify(usuario)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao obter usuário, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao obter usuário, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
 
 #obter emprestimo pelo id
 @app.route('/emprestimo/<int:id>', methods=['GET'])
+@versions.conditional('emprestimos')
 def obter_emprestimo(id):
+    try:
+        campos = read_fields(request.args, 'emprestimos')
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    emprestimo = None if primary_requested() else cache.get('emprestimo', id)
+    if emprestimo is not None:
+        unversioned()
+        return jsonify(project(emprestimo, campos))
+
     conn = conect_db()
     if conn and conn.is_connected():
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM emprestimos WHERE id = %s", (id,))
+            cursor.execute(f"SELECT {select_list(campos)} FROM emprestimos WHERE id = %s", (id,))
             emprestimo = cursor.fetchone()
             if not emprestimo:
-                return jsonify({"status": "error", "message": "Empréstimo não encontrado"}, 404)
+                return jsonify({"status": "error", "message": "Empréstimo não encontrado"}), 404
+            if campos is None and not replica_read():
+                cache.set('emprestimo', id, emprestimo)
             return jsonify(emprestimo)
         except mysql.connector.Error as err:
-            return jsonify({"status": "error", "message": f"Erro ao obter empréstimo, {err}"}, 500)
+            return jsonify({"status": "error", "message": f"Erro ao obter empréstimo, {err}"}), 500
         finally:
             cursor.close()
             conn.close()
-    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Buscar varios livros pelo id (corpo {"ids": [...]})
+@app.route('/livro/lookup', methods=['POST'])
+def obter_livros():
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("O corpo deve ser um objeto JSON com 'ids'")
+        ids = parse_ids(data.get('ids'))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    return multiget_response(conect_db, cache, 'livro', 'livros', ids)
+
+# Buscar varios usuários pelo id (corpo {"ids": [...]})
+@app.route('/usuario/lookup', methods=['POST'])
+def obter_usuarios():
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("O corpo deve ser um objeto JSON com 'ids'")
+        ids = parse_ids(data.get('ids'))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    return multiget_response(conect_db, cache, 'usuario', 'usuarios', ids)
+
+# Buscar varios empréstimos pelo id (corpo {"ids": [...]})
+@app.route('/emprestimo/lookup', methods=['POST'])
+def obter_emprestimos():
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("O corpo deve ser um objeto JSON com 'ids'")
+        ids = parse_ids(data.get('ids'))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+    return multiget_response(conect_db, cache, 'emprestimo', 'emprestimos', ids)
 
     
 if __name__ == '__main__':
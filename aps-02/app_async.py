@@ -0,0 +1,530 @@
+# Versao ASGI do app.py: mesmas rotas CRUD e mesmas respostas JSON, mas com
+# Quart + mysql.connector.aio, pra que um processo mantenha muitas queries em
+# andamento enquanto espera o banco. Sobe com `python serve.py --mode asgi`.
+# Rotas extras do app.py (bulk, stream, cache, ETag) ainda nao tem versao async.
+from quart import Quart, request, jsonify
+import os
+import sys
+import mysql.connector
+from mysql.connector import errorcode
+from dotenv import load_dotenv 
+
+# modulos compartilhados (db_pool etc.) ficam na raiz do repositorio
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import aggregates
+from async_pool import AsyncConnectionPool
+from entity_cache import EntityCache
+from listing import build_page, read_page_args
+from table_versions import TableVersions
+
+load_dotenv()
+
+app = Quart(__name__)
+
+config = {
+    'host': os.getenv('DB_HOST'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'port': int(os.getenv('DB_PORT', 24111)),
+}
+
+# DB_SSL_CA vazio conecta sem TLS (ex.: o MySQL local do benchmark)
+if os.getenv('DB_SSL_CA', 'ca.pem'):
+    config['ssl_ca'] = os.getenv('DB_SSL_CA', 'ca.pem')
+    config['ssl_verify_cert'] = True
+
+# Pool async, um por processo
+pool = AsyncConnectionPool.from_env(config)
+
+# Este app ainda nao serve ETag nem cache, mas as escritas invalidam os dois
+# como no app.py: o arquivo de versoes e o cache sqlite sao compartilhados
+# com os workers WSGI da mesma maquina
+versions = TableVersions(os.getenv('VERSIONS_PATH', '/tmp/table_versions.bin'))
+cache = EntityCache.from_env()
+
+async def conect_db():
+    try:
+        conn = await pool.get_connection()
+        if await conn.is_connected():
+            return conn
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
+
+# Startup de cada worker do uvicorn: abre as conexoes do pool deste processo
+# antes de receber requests
+@app.before_serving
+async def init_worker():
+    try:
+        await pool.warm()
+    except (mysql.connector.Error, OSError) as err:
+        # o worker sobe assim mesmo; o /ready fica 503 ate o banco voltar
+        print(f"Error: {err}")
+
+# Liveness: o processo responde (nao consulta o banco)
+@app.route('/live', methods=['GET'])
+async def saude_live():
+    return jsonify({"status": "ok"}), 200
+
+# Readiness: 200 so com o banco respondendo a um SELECT 1 em ate READY_TIMEOUT
+@app.route('/ready', methods=['GET'])
+async def saude_ready():
+    try:
+        conn = await pool.get_connection(float(os.getenv('READY_TIMEOUT', 2)))
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT 1")
+            await cursor.fetchall()
+            await cursor.close()
+        finally:
+            await conn.close()
+    # o driver async deixa passar o OSError de uma conexao recusada
+    except (mysql.connector.Error, OSError) as err:
+        return jsonify({"status": "error", "message": f"Banco indisponível, {err}"}), 503
+    return jsonify({"status": "ok"}), 200
+
+# Contadores do pool (checkouts, esperas, evictions...)
+@app.route('/pool/stats', methods=['GET'])
+async def estatisticas_pool():
+    return jsonify(pool.stats())
+
+# Inserir um usuario
+@app.route('/usuario', methods=['POST'])
+async def adicionar_usuario():
+    data = await request.get_json()
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("INSERT INTO usuarios (nome, email, cpf) VALUES (%s, %s, %s)", (data['nome'], data['email'], data['cpf']))
+            await conn.commit()
+            versions.bump('usuarios')
+            usuario_id = cursor.lastrowid
+            return jsonify({"status": "ok", "usuario_id": usuario_id})
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao inserir usuário, {err}"})
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+
+# Inserir um livro no banco de dados
+@app.route('/livro', methods=['POST'])
+async def adicionar_livro():
+    data = await request.get_json()
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("INSERT INTO livros (titulo, isbn, autor) VALUES (%s, %s, %s)", (data['titulo'], data['isbn'], data['autor']))
+            await conn.commit()
+            versions.bump('livros')
+            livro_id = cursor.lastrowid
+            return jsonify({"status": "ok", "livro_id": livro_id})
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao inserir livro, {err}"})
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+
+# Criar um emprestimo
+@app.route('/emprestimo', methods=['POST'])
+async def adicionar_emprestimo():
+    data = await request.get_json()
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())", (data['usuario_id'], data['livro_id']))
+            emprestimo_id = cursor.lastrowid
+            await aggregates.apply_async(cursor, inseridas=[(data['usuario_id'], data['livro_id'], None)])
+            await conn.commit()
+            versions.bump('emprestimos')
+            return jsonify({"status": "ok", "emprestimo_id": emprestimo_id}), 201
+        except mysql.connector.Error as err:
+            # com o indice de emprestimos em aberto, um livro ja emprestado
+            # responde como no checkout
+            if err.errno == errorcode.ER_DUP_ENTRY:
+                return jsonify({"status": "error", "message": "Livro já está emprestado."}), 409
+            if err.errno == errorcode.ER_NO_REFERENCED_ROW_2:
+                return jsonify({"status": "error", "message": "Usuário ou livro não encontrado."}), 404
+            return jsonify({"status": "error", "message": f"Erro ao criar empréstimo, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Listar todos os usuários
+@app.route('/usuario', methods=['GET'])
+async def listar_usuarios():
+    try:
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            if pagina:
+                limit, after_id = pagina
+                await cursor.execute("SELECT * FROM usuarios WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(await cursor.fetchall(), limit))
+            await cursor.execute("SELECT * FROM usuarios")
+            usuarios = await cursor.fetchall()
+            if not usuarios:
+                return jsonify({"status": "error", "message": "Nenhum usuário encontrado"}), 404
+            return jsonify(usuarios)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao listar usuários, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Listar todos os livros
+@app.route('/livro', methods=['GET'])
+async def listar_livros():
+    try:
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            if pagina:
+                limit, after_id = pagina
+                await cursor.execute("SELECT * FROM livros WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(await cursor.fetchall(), limit))
+            await cursor.execute("SELECT * FROM livros")
+            livros = await cursor.fetchall()
+            if not livros:
+                return jsonify({"status": "error", "message": "Nenhum livro encontrado"}), 404
+            return jsonify(livros)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao listar livros, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Listar todos os emprestimos
+@app.route('/emprestimo', methods=['GET'])
+async def listar_emprestimos():
+    try:
+        pagina = read_page_args(request.args)
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    query = """
+                SELECT e.id, u.nome AS usuario, l.titulo AS livro, e.data_emprestimo 
+                FROM emprestimos e 
+                JOIN usuarios u ON e.usuario_id = u.id 
+                JOIN livros l ON e.livro_id = l.id
+            """
+
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            if pagina:
+                limit, after_id = pagina
+                await cursor.execute(query + " WHERE e.id > %s ORDER BY e.id LIMIT %s", (after_id, limit + 1))
+                return jsonify(build_page(await cursor.fetchall(), limit))
+            await cursor.execute(query)
+            emprestimos = await cursor.fetchall()
+            if not emprestimos:
+                return jsonify({"status": "error", "message": "Nenhum empréstimo encontrado"}), 404
+            return jsonify(emprestimos)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao listar empréstimos, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+# Atualizar um livro pelo id
+@app.route('/livro/<int:id>', methods=['PUT'])
+async def atualizar_livro(id):
+    data = await request.get_json()
+
+    # Valida se ao menos um campo foi fornecido para atualizar 
+    campos_validos = {'titulo', 'isbn', 'autor'}
+    campos_a_atualizar = {k: v for k, v in data.items() if k in campos_validos}
+
+    if not campos_a_atualizar:
+        return jsonify({"status": "error", "message": "Nenhum campo válido fornecido para atualização. Campos aceitos: 'titulo', 'isbn', 'autor'."}), 400
+
+    conn = await conect_db()
+
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+
+            # Verifica se o livro existe
+            await cursor.execute("SELECT id FROM livros WHERE id = %s", (id,))
+            livro = await cursor.fetchone()
+
+            if not livro:
+                return jsonify({"status": "error", "message": "Livro não encontrado."}), 404
+
+            #gerar uma query dinamica com base nos campos q chegaram 
+            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
+            valores = list(campos_a_atualizar.values()) + [id]
+
+            query = f"UPDATE livros SET {set_clause} WHERE id = %s"
+
+            await cursor.execute(query, valores)
+            await conn.commit()
+            versions.bump('livros')
+            cache.invalidate('livro', id)
+
+            if cursor.rowcount == 0:
+                return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
+
+            return jsonify({"status": "ok", "message": f"Livro de id {id} atualizado com sucesso."}), 200
+
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao atualizar livro: {err}"}), 500
+
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados."}), 500
+
+
+
+# Deletar um usuario pelo id
+@app.route('/usuario/<int:id>', methods=['DELETE'])
+async def deletar_usuario(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            # contadores dos emprestimos que o ON DELETE CASCADE leva junto
+            await aggregates.before_owner_delete_async(cursor, 'usuario_id', id)
+            await cursor.execute("DELETE FROM usuarios WHERE id = %s", (id,))
+            await conn.commit()
+            versions.bump('usuarios', 'emprestimos')
+            cache.invalidate('usuario', id)
+            # o ON DELETE CASCADE apaga os emprestimos do usuario junto
+            cache.invalidate_all('emprestimo')
+            return jsonify({"status": "ok", "message": "Usuário deletado com sucesso"}, 200)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao deletar usuário, {err}"}, 500)
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+
+# Deletar um livro pelo id
+@app.route('/livro/<int:id>', methods=['DELETE'])
+async def deletar_livro(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            await aggregates.before_owner_delete_async(cursor, 'livro_id', id)
+            await cursor.execute("DELETE FROM livros WHERE id = %s", (id,))
+            await conn.commit()
+            versions.bump('livros', 'emprestimos')
+            cache.invalidate('livro', id)
+            # o ON DELETE CASCADE apaga os emprestimos do livro junto
+            cache.invalidate_all('emprestimo')
+            return jsonify({"status": "ok", "message": "Livro deletado com sucesso"}, 200)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao deletar livro, {err}"}, 500)
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+
+# Atualizar um empréstimo pelo ID
+@app.route('/emprestimo/<int:id>', methods=['PUT'])
+async def atualizar_emprestimo(id):
+    data = await request.get_json()
+   
+    campos_validos = {'usuario_id', 'livro_id', 'data_emprestimo'}
+    campos_a_atualizar = {k: v for k, v in data.items() if k in campos_validos}
+
+    if not campos_a_atualizar:
+        return jsonify({"status": "error", "message": "Nenhum campo válido fornecido para atualização. Campos aceitos: 'usuario_id', 'livro_id', 'data_emprestimo'."}), 400
+    
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            emprestimo = await aggregates.loan_row_async(cursor, id)
+
+            if not emprestimo:
+                return jsonify({"status": "error", "message": "Empréstimo não encontrado."}), 404
+                
+            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
+            valores = list(campos_a_atualizar.values()) + [id]
+
+            query = f"UPDATE emprestimos SET {set_clause} WHERE id = %s"
+            await cursor.execute(query, valores)
+            rowcount = cursor.rowcount
+            # move o emprestimo de um contador pro outro (usuario, livro ou dia)
+            usuario_id, livro_id, data_emprestimo = emprestimo
+            novo = (campos_a_atualizar.get('usuario_id', usuario_id),
+                    campos_a_atualizar.get('livro_id', livro_id),
+                    campos_a_atualizar.get('data_emprestimo', data_emprestimo))
+            await aggregates.apply_async(cursor, inseridas=[novo], removidas=[emprestimo])
+            await conn.commit()
+            versions.bump('emprestimos')
+            cache.invalidate('emprestimo', id)
+
+
+            if rowcount == 0:
+                return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
+
+            return jsonify({"status": "ok", "message": f"Empréstimo de id {id} atualizado com sucesso."}), 200
+
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao atualizar empréstimo: {err}"}), 500
+
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados."}), 500
+
+
+# Deletar um emprestimo pelo id
+@app.route('/emprestimo/<int:id>', methods=['DELETE'])
+async def deletar_emprestimo(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+            emprestimo = await aggregates.loan_row_async(cursor, id)
+            await cursor.execute("DELETE FROM emprestimos WHERE id = %s", (id,))
+            if emprestimo:
+                await aggregates.apply_async(cursor, removidas=[emprestimo])
+            await conn.commit()
+            versions.bump('emprestimos')
+            cache.invalidate('emprestimo', id)
+            return jsonify({"status": "ok", "message": "Empréstimo deletado com sucesso"}, 200)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao deletar empréstimo, {err}"}, 500)
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}, 500)
+
+# Atualizar um usuario pelo id
+@app.route('/usuario/<int:id>', methods=['PUT'])
+async def atualizar_usuario(id):
+    data = await request.get_json()
+
+    campos_validos = {'nome', 'email', 'cpf'}
+    campos_a_atualizar = {k: v for k, v in data.items() if k in campos_validos}
+
+    if not campos_a_atualizar:
+        return jsonify({"status": "error", "message": "Nenhum campo válido fornecido para atualização. Campos aceitos: 'nome', 'email', 'cpf'."}), 400
+
+    conn = await conect_db()
+
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor()
+
+            # Verifica se o usuário existe
+            await cursor.execute("SELECT id FROM usuarios WHERE id = %s", (id,))
+            usuario = await cursor.fetchone()
+
+            if not usuario:
+                return jsonify({"status": "error", "message": "Usuário não encontrado."}), 404
+
+            set_clause = ", ".join([f"{campo} = %s" for campo in campos_a_atualizar.keys()])
+            valores = list(campos_a_atualizar.values()) + [id]
+
+            query = f"UPDATE usuarios SET {set_clause} WHERE id = %s"
+            await cursor.execute(query, valores)
+            await conn.commit()
+            versions.bump('usuarios')
+            cache.invalidate('usuario', id)
+
+            if cursor.rowcount == 0:
+                return jsonify({"status": "error", "message": "Nenhuma alteração foi feita."}), 400
+
+            return jsonify({"status": "ok", "message": "Usuário atualizado com sucesso."}), 200
+
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao atualizar usuário: {err}"}), 500
+
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados."}), 500
+
+
+#obter livro pelo id
+@app.route('/livro/<int:id>', methods=['GET'])
+async def obter_livro(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            await cursor.execute("SELECT * FROM livros WHERE id = %s", (id,))
+            livro = await cursor.fetchone()
+            if not livro:
+                return jsonify({"status": "error", "message": "Livro não encontrado"}), 404
+            return jsonify(livro)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao obter livro, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+
+#obter usuario pelo id
+@app.route('/usuario/<int:id>', methods=['GET'])
+async def obter_usuario(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            await cursor.execute("SELECT * FROM usuarios WHERE id = %s", (id,))
+            usuario = await cursor.fetchone()
+            if not usuario:
+                return jsonify({"status": "error", "message": "Usuário não encontrado"}), 404
+            return jsonify(usuario)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao obter usuário, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+#obter emprestimo pelo id
+@app.route('/emprestimo/<int:id>', methods=['GET'])
+async def obter_emprestimo(id):
+    conn = await conect_db()
+    if conn and await conn.is_connected():
+        try:
+            cursor = await conn.cursor(dictionary=True)
+            await cursor.execute("SELECT * FROM emprestimos WHERE id = %s", (id,))
+            emprestimo = await cursor.fetchone()
+            if not emprestimo:
+                return jsonify({"status": "error", "message": "Empréstimo não encontrado"}), 404
+            return jsonify(emprestimo)
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao obter empréstimo, {err}"}), 500
+        finally:
+            await cursor.close()
+            await conn.close()
+    return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+    
+if __name__ == '__main__':
+    app.run(debug=True)
\ No newline at end of file
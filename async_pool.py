@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+
+import mysql.connector
+import mysql.connector.aio
+from mysql.connector.errors import PoolError
+
+from circuit_breaker import CircuitBreaker
+
+
+# Versao async do PooledConnection do db_pool: await conn.close() devolve a
+# conexao ao pool
+class AsyncPooledConnection:
+    def __init__(self, pool, raw, generation):
+        self._pool = pool
+        self._raw = raw
+        self._generation = generation
+        self._released = False
+
+    async def is_connected(self):
+        return not self._released
+
+    async def close(self):
+        if not self._released:
+            self._released = True
+            await self._pool._release(self._raw, self._generation)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+# Mesmas regras do db_pool.ConnectionPool (min/max, eviction, ping no
+# checkout, espera limitada, circuit breaker), mas com mysql.connector.aio:
+# enquanto uma query espera o banco, o event loop atende outros requests.
+class AsyncConnectionPool:
+    def __init__(self, config, min_size=1, max_size=50, max_idle=300.0,
+                 max_lifetime=3600.0, ping_interval=30.0, timeout=5.0, breaker=None):
+        if min_size > max_size:
+            raise ValueError("min_size nao pode ser maior que max_size")
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.breaker = breaker
+        self._generation = 0
+        self._reset()
+
+    @classmethod
+    def from_env(cls, config):
+        return cls(
+            config,
+            min_size=int(os.getenv('DB_POOL_MIN', 1)),
+            max_size=int(os.getenv('DB_ASYNC_POOL_MAX', 50)),
+            max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            breaker=CircuitBreaker.from_env(),
+        )
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._generation += 1
+        # a Condition e criada no primeiro uso, dentro do event loop do servidor
+        self._cond = None
+        self._idle = []
+        self._size = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'evictions': 0,
+            'broken': 0,
+        }
+
+    def _condition(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _connect(self):
+        if self.breaker is None:
+            raw = await mysql.connector.aio.connect(**self.config)
+        else:
+            self.breaker.before_call()
+            try:
+                raw = await mysql.connector.aio.connect(**self.config)
+            # o driver async deixa passar OSError numa conexao recusada; um
+            # connect cancelado tambem encerra a sonda do half-open
+            except BaseException:
+                self.breaker.on_failure()
+                raise
+            self.breaker.on_success()
+        raw._pool_created_at = time.monotonic()
+        return raw
+
+    async def _discard(self, raw):
+        try:
+            await raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def _evict_locked(self, now):
+        expired = []
+        keep = []
+        for entry in self._idle:
+            raw, created_at, used_at = entry
+            too_old = now - created_at > self.max_lifetime
+            too_idle = now - used_at > self.max_idle
+            if too_old or (too_idle and self._size - len(expired) > self.min_size):
+                expired.append(raw)
+            else:
+                keep.append(entry)
+        if expired:
+            self._idle = keep
+            self._size -= len(expired)
+            self._stats['evictions'] += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    async def get_connection(self, timeout=None):
+        cond = self._condition()
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        generation = self._generation
+        self._stats['checkouts'] += 1
+
+        while True:
+            waited = False
+            async with cond:
+                expired = self._evict_locked(time.monotonic())
+                while True:
+                    if self._idle:
+                        raw, _, used_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        raw = None
+                        break
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError(f"Nenhuma conexao livre no pool apos {timeout}s")
+                    try:
+                        await asyncio.wait_for(cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+            for old in expired:
+                await self._discard(old)
+
+            if raw is None:
+                try:
+                    raw = await self._connect()
+                except Exception:
+                    async with cond:
+                        self._size -= 1
+                        cond.notify()
+                    raise
+                self._stats['created'] += 1
+                return AsyncPooledConnection(self, raw, generation)
+
+            if time.monotonic() - used_at < self.ping_interval or await raw.is_connected():
+                return AsyncPooledConnection(self, raw, generation)
+
+            await self._discard(raw)
+            async with cond:
+                self._size -= 1
+                self._stats['broken'] += 1
+                cond.notify()
+
+    async def _release(self, raw, generation):
+        if generation != self._generation or self._pid != os.getpid():
+            return
+        cond = self._condition()
+        try:
+            if raw.in_transaction:
+                await raw.rollback()
+        except mysql.connector.Error:
+            await self._discard(raw)
+            async with cond:
+                self._size -= 1
+                self._stats['broken'] += 1
+                cond.notify()
+            return
+        async with cond:
+            self._idle.append((raw, raw._pool_created_at, time.monotonic()))
+            cond.notify()
+
+    # Abre conexoes ate min_size (usado no startup de cada worker)
+    async def warm(self):
+        cond = self._condition()
+        conns = []
+        try:
+            while True:
+                async with cond:
+                    if self._size >= self.min_size:
+                        break
+                conns.append(await self.get_connection())
+        finally:
+            for conn in conns:
+                await conn.close()
+
+    def stats(self):
+        data = dict(self._stats)
+        data['size'] = self._size
+        data['idle'] = len(self._idle)
+        data['in_use'] = self._size - len(self._idle)
+        data['min_size'] = self.min_size
+        data['max_size'] = self.max_size
+        if self.breaker is not None:
+            data['breaker'] = self.breaker.stats()
+        return data
@@ -0,0 +1,189 @@
+import os
+import re
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import aggregates
+
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 100))
+
+# recurso -> (tabela, campos do INSERT, campos aceitos no PUT, tabelas que um
+# DELETE altera). Os INSERTs sao os mesmos SQL das rotas individuais, pra
+# reaproveitar os prepared statements.
+RESOURCES = {
+    'usuario': ('usuarios', ('nome', 'email', 'cpf'), ('nome', 'email', 'cpf'), ('usuarios', 'emprestimos')),
+    'livro': ('livros', ('titulo', 'isbn', 'autor'), ('titulo', 'isbn', 'autor'), ('livros', 'emprestimos')),
+    'emprestimo': ('emprestimos', ('usuario_id', 'livro_id'), ('usuario_id', 'livro_id', 'data_emprestimo'), ('emprestimos',)),
+}
+
+INSERTS = {
+    'usuario': "INSERT INTO usuarios (nome, email, cpf) VALUES (%s, %s, %s)",
+    'livro': "INSERT INTO livros (titulo, isbn, autor) VALUES (%s, %s, %s)",
+    'emprestimo': "INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())",
+}
+
+PATH_RE = re.compile(r'^/(usuario|livro|emprestimo)(?:/([^/]+))?(/devolucao)?$')
+REF_RE = re.compile(r'^\$(\d+)$')
+
+
+class BatchError(Exception):
+    def __init__(self, index, status, message):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+        self.message = message
+
+
+# Resultado do batch: a resposta de cada operacao, as tabelas alteradas (pros
+# ETags) e as entradas do cache a invalidar. Tudo so vale depois do commit.
+class BatchResult:
+    def __init__(self):
+        self.results = []
+        self.tables = set()
+        self.invalidate = set()
+        self.invalidate_all = set()
+
+
+# Executa as operacoes em ordem no cursor, sem commit. "$N" (no caminho ou
+# num campo *_id do corpo) vira o id gerado pela operacao N. Levanta BatchError
+# na primeira operacao que falhar; quem chama desfaz a transacao.
+def run_batch(cursor, operacoes):
+    if not isinstance(operacoes, list) or not operacoes:
+        raise BatchError(None, 400, "Informe uma lista de operações")
+    if len(operacoes) > BATCH_MAX_OPERATIONS:
+        raise BatchError(None, 400, f"No máximo {BATCH_MAX_OPERATIONS} operações por batch")
+
+    resultado = BatchResult()
+    for indice, op in enumerate(operacoes):
+        try:
+            status, corpo = _run_operation(cursor, resultado, op)
+        except mysql.connector.Error as err:
+            if err.errno == errorcode.ER_DUP_ENTRY:
+                raise BatchError(indice, 409, f"Registro duplicado, {err}")
+            if err.errno in (errorcode.ER_NO_REFERENCED_ROW_2, errorcode.ER_NO_REFERENCED_ROW):
+                raise BatchError(indice, 404, "Usuário ou livro não encontrado.")
+            raise BatchError(indice, 500, str(err))
+        except BatchError as err:
+            err.index = indice
+            raise
+        resultado.results.append({"index": indice, "status": status, **corpo})
+    return resultado
+
+
+def _run_operation(cursor, resultado, op):
+    if not isinstance(op, dict):
+        raise BatchError(None, 400, "Cada operação deve ser um objeto com 'method' e 'path'")
+    metodo = str(op.get('method', '')).upper()
+    casamento = PATH_RE.match(str(op.get('path', '')))
+    if not casamento:
+        raise BatchError(None, 400, f"Caminho não suportado: {op.get('path')}")
+    recurso, id, devolucao = casamento.groups()
+    if id is not None:
+        id = _resolve(resultado, id)
+    corpo = op.get('body') or {}
+    if not isinstance(corpo, dict):
+        raise BatchError(None, 400, "'body' deve ser um objeto")
+    # so chaves estrangeiras (*_id) aceitam referencia: um titulo "$5" fica como esta
+    corpo = {chave: _resolve(resultado, valor) if _is_ref(chave, valor) else valor
+             for chave, valor in corpo.items()}
+
+    if metodo == 'POST' and id is None:
+        return _insert(cursor, resultado, recurso, corpo)
+    if metodo == 'POST' and recurso == 'emprestimo' and devolucao:
+        return _return_loan(cursor, resultado, id)
+    if devolucao is None and id is not None and metodo == 'PUT':
+        return _update(cursor, resultado, recurso, id, corpo)
+    if devolucao is None and id is not None and metodo == 'DELETE':
+        return _delete(cursor, resultado, recurso, id)
+    raise BatchError(None, 400, f"Operação não suportada: {metodo} {op.get('path')}")
+
+
+def _is_ref(chave, valor):
+    return chave.endswith('_id') and isinstance(valor, str) and REF_RE.match(valor) is not None
+
+
+def _resolve(resultado, valor):
+    ref = REF_RE.match(valor)
+    if ref:
+        n = int(ref.group(1))
+        if n >= len(resultado.results) or 'id' not in resultado.results[n]:
+            raise BatchError(None, 400, f"Referência inválida: {valor} (a operação {n} não gerou id)")
+        return resultado.results[n]['id']
+    try:
+        return int(valor)
+    except ValueError:
+        raise BatchError(None, 400, f"Id inválido: {valor}")
+
+
+def _insert(cursor, resultado, recurso, corpo):
+    tabela, campos, _, _ = RESOURCES[recurso]
+    faltando = [c for c in campos if c not in corpo]
+    if faltando:
+        raise BatchError(None, 400, f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+    cursor.execute(INSERTS[recurso], tuple(corpo[c] for c in campos))
+    id = cursor.lastrowid
+    if recurso == 'emprestimo':
+        aggregates.apply(cursor, inseridas=[(corpo['usuario_id'], corpo['livro_id'], None)])
+    resultado.tables.add(tabela)
+    return 201, {"id": id}
+
+
+# UPDATE direto, sem o SELECT de existencia das rotas: so consulta se nenhuma
+# linha mudou, pra diferenciar "nao existe" de "nada mudou"
+def _update(cursor, resultado, recurso, id, corpo):
+    tabela, _, aceitos, _ = RESOURCES[recurso]
+    colunas = sorted(c for c in corpo if c in aceitos)
+    if not colunas:
+        raise BatchError(None, 400, f"Nenhum campo válido fornecido para atualização. Campos aceitos: {', '.join(aceitos)}.")
+
+    antigo = aggregates.loan_row(cursor, id) if recurso == 'emprestimo' else None
+    if recurso == 'emprestimo' and antigo is None:
+        raise BatchError(None, 404, "Registro não encontrado.")
+    set_clause = ", ".join([f"{campo} = %s" for campo in colunas])
+    cursor.execute(f"UPDATE {tabela} SET {set_clause} WHERE id = %s", [corpo[c] for c in colunas] + [id])
+    if cursor.rowcount == 0:
+        if antigo is None:
+            cursor.execute(f"SELECT id FROM {tabela} WHERE id = %s", (id,))
+            if not cursor.fetchone():
+                raise BatchError(None, 404, "Registro não encontrado.")
+        return 200, {"id": id, "changed": False}
+
+    if antigo is not None:
+        usuario_id, livro_id, data_emprestimo = antigo
+        novo = (corpo.get('usuario_id', usuario_id), corpo.get('livro_id', livro_id),
+                corpo.get('data_emprestimo', data_emprestimo))
+        aggregates.apply(cursor, inseridas=[novo], removidas=[antigo])
+    resultado.tables.add(tabela)
+    resultado.invalidate.add((recurso, id))
+    return 200, {"id": id, "changed": True}
+
+
+def _delete(cursor, resultado, recurso, id):
+    tabela, _, _, alteradas = RESOURCES[recurso]
+    if recurso == 'emprestimo':
+        antigo = aggregates.loan_row(cursor, id)
+        if antigo is not None:
+            aggregates.apply(cursor, removidas=[antigo])
+    else:
+        aggregates.before_owner_delete(cursor, f"{recurso}_id", id)
+        # o ON DELETE CASCADE apaga os emprestimos junto
+        resultado.invalidate_all.add('emprestimo')
+    cursor.execute(f"DELETE FROM {tabela} WHERE id = %s", (id,))
+    if cursor.rowcount == 0:
+        raise BatchError(None, 404, "Registro não encontrado.")
+    resultado.tables.update(alteradas)
+    resultado.invalidate.add((recurso, id))
+    return 200, {"id": id}
+
+
+def _return_loan(cursor, resultado, id):
+    cursor.execute("UPDATE emprestimos SET data_devolucao = CURDATE() WHERE id = %s AND data_devolucao IS NULL", (id,))
+    if cursor.rowcount == 0:
+        cursor.execute("SELECT id FROM emprestimos WHERE id = %s", (id,))
+        if not cursor.fetchone():
+            raise BatchError(None, 404, "Empréstimo não encontrado.")
+        raise BatchError(None, 409, "Empréstimo já foi devolvido.")
+    resultado.tables.add('emprestimos')
+    resultado.invalidate.add(('emprestimo', id))
+    return 200, {"id": id}
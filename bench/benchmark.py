@@ -0,0 +1,449 @@
+# Benchmark da API contra um MySQL local.
+#
+#   python bench/benchmark.py db-up                  # sobe o MySQL do docker-compose.yml
+#   python bench/benchmark.py seed --rows 100000      # gera dados sinteticos
+#   python bench/benchmark.py run --start-app --concurrency 1,8,32
+#   python bench/benchmark.py compare antes.json depois.json
+#
+# O `run` mede vazao e latencia (p50/p95/p99) por rota em cada nivel de
+# concorrencia e salva tudo em JSON (bench/results/) pra comparar commits.
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+import mysql.connector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, 'bench')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# aggregates.py e migrate.py ficam na raiz do repositorio
+sys.path.append(ROOT)
+import aggregates
+import migrate
+
+DB_DEFAULTS = {
+    'host': '127.0.0.1',
+    'port': 3307,
+    'user': 'root',
+    'password': 'bench',
+    'database': 'biblioteca',
+}
+REPLICA_PORT = 3308
+
+DEFAULT_MIX = [
+    'GET /livro/{livro_id}=30',
+    'GET /usuario/{usuario_id}=10',
+    'GET /emprestimo/{emprestimo_id}=5',
+    'GET /livro?limit=100=15',
+    'GET /emprestimo?limit=100=15',
+    'POST /usuario=5',
+    'POST /emprestimo/checkout=5',
+    'POST /emprestimo/{emprestimo_aberto}/devolucao=5',
+    'PUT /livro/{livro_id}=10',
+]
+
+SEED_BATCH = 5000
+PALAVRAS = ['Dom', 'Casmurro', 'Memorias', 'Sertao', 'Veredas', 'Capitu', 'Iracema',
+            'Quincas', 'Borba', 'Vidas', 'Secas', 'Macunaima', 'Cortico', 'Triste', 'Fim']
+
+
+def db_config(args):
+    return {
+        'host': args.db_host,
+        'port': args.db_port,
+        'user': args.db_user,
+        'password': args.db_password,
+        'database': args.db_name,
+    }
+
+
+def db_up(args):
+    comando = ['docker', 'compose', '-f', os.path.join(BENCH_DIR, 'docker-compose.yml')]
+    if args.replica:
+        comando += ['--profile', 'replica']
+    subprocess.run(comando + ['up', '-d', '--wait'], check=True)
+    if args.replica:
+        ligar_replica()
+    # roda depois de ligar a replica, que recebe as migracoes pela replicacao
+    conn = mysql.connector.connect(**DB_DEFAULTS)
+    try:
+        executadas = migrate.migrate(conn)
+    finally:
+        conn.close()
+    print(f"  {len(executadas)} migracoes aplicadas")
+
+
+# As duas instancias criam as tabelas base sozinhas (init do docker), entao a replica
+# marca o que o primario ja executou como aplicado e replica so dali em diante
+def ligar_replica():
+    primario = mysql.connector.connect(**DB_DEFAULTS)
+    cursor = primario.cursor()
+    cursor.execute("SELECT @@GLOBAL.gtid_executed")
+    gtids = cursor.fetchone()[0].replace('\n', '')
+    cursor.close()
+    primario.close()
+
+    replica = mysql.connector.connect(**dict(DB_DEFAULTS, port=REPLICA_PORT))
+    cursor = replica.cursor()
+    cursor.execute("SHOW REPLICA STATUS")
+    if cursor.fetchall():
+        print("  replica ja configurada")
+    else:
+        cursor.execute("RESET MASTER")
+        cursor.execute("SET GLOBAL gtid_purged = %s", (gtids,))
+        cursor.execute(
+            "CHANGE REPLICATION SOURCE TO SOURCE_HOST = 'mysql', SOURCE_PORT = 3306, "
+            "SOURCE_USER = 'root', SOURCE_PASSWORD = %s, SOURCE_AUTO_POSITION = 1, GET_SOURCE_PUBLIC_KEY = 1",
+            (DB_DEFAULTS['password'],),
+        )
+        cursor.execute("START REPLICA")
+        cursor.execute("SET GLOBAL super_read_only = ON")
+        print(f"  replica em 127.0.0.1:{REPLICA_PORT}")
+    cursor.close()
+    replica.close()
+
+
+# Dados sinteticos: `rows` linhas em cada tabela, inseridas em lotes
+def seed(args):
+    rnd = random.Random(42)
+    conn = mysql.connector.connect(**db_config(args))
+    cursor = conn.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for tabela in ('emprestimos', 'livros', 'usuarios'):
+        cursor.execute(f"TRUNCATE TABLE {tabela}")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+    def inserir(query, gerar):
+        for inicio in range(0, args.rows, SEED_BATCH):
+            fim = min(inicio + SEED_BATCH, args.rows)
+            cursor.executemany(query, [gerar(i) for i in range(inicio, fim)])
+            conn.commit()
+        print(f"  {query.split()[2]}: {args.rows} linhas")
+
+    hoje = datetime.date.today()
+    inserir("INSERT INTO usuarios (nome, cpf, email) VALUES (%s, %s, %s)",
+            lambda i: (f"Usuario {i}", f"{i:011d}", f"usuario{i}@bench.local"))
+    inserir("INSERT INTO livros (titulo, isbn, autor) VALUES (%s, %s, %s)",
+            lambda i: (' '.join(rnd.choices(PALAVRAS, k=3)), f"{i:013d}", f"Autor {i % 1000}"))
+    inserir("INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo, data_devolucao) VALUES (%s, %s, %s, %s)",
+            lambda i: emprestimo(i, rnd, args.rows, hoje))
+    aggregates.rebuild(conn)
+    print("  contadores de emprestimos recalculados")
+    cursor.close()
+    conn.close()
+
+
+# 1 em cada 10 emprestimos fica em aberto, sempre num livro diferente (so
+# pode haver um emprestimo aberto por livro); os outros ja foram devolvidos
+def emprestimo(i, rnd, rows, hoje):
+    data = hoje - datetime.timedelta(days=rnd.randint(0, 730))
+    if i % 10 == 0:
+        return rnd.randint(1, rows), i + 1, data, None
+    return rnd.randint(1, rows), rnd.randint(1, rows), data, data + datetime.timedelta(days=rnd.randint(1, 30))
+
+
+def parse_mix(itens):
+    mix = []
+    for item in itens:
+        rota, peso = item.rsplit('=', 1)
+        metodo, caminho = rota.split(' ', 1)
+        mix.append((metodo.upper(), caminho, float(peso)))
+    return mix
+
+
+def corpo(metodo, caminho, rnd, rows):
+    if metodo == 'POST' and caminho == '/usuario':
+        sufixo = uuid.uuid4().hex
+        return {'nome': f"Bench {sufixo[:8]}", 'email': f"{sufixo}@bench.local",
+                'cpf': f"9{rnd.randrange(10 ** 10):010d}"}
+    if metodo == 'POST' and caminho == '/livro':
+        return {'titulo': ' '.join(rnd.choices(PALAVRAS, k=3)), 'autor': 'Bench',
+                'isbn': f"9{rnd.randrange(10 ** 12):012d}"}
+    if metodo == 'POST' and caminho in ('/emprestimo', '/emprestimo/checkout'):
+        return {'usuario_id': rnd.randint(1, rows), 'livro_id': rnd.randint(1, rows)}
+    if metodo == 'PUT' and caminho.startswith('/livro/'):
+        return {'titulo': ' '.join(rnd.choices(PALAVRAS, k=3))}
+    if metodo == 'PUT' and caminho.startswith('/usuario/'):
+        return {'nome': f"Bench {rnd.randrange(10 ** 6)}"}
+    return None
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    # nearest-rank
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+# As rotas antigas respondem alguns erros com HTTP 200 e o status no corpo
+# ([{"status": "error", ...}, 500]); esses contam como erro tambem
+def falhou(status, body):
+    if status >= 400:
+        return True
+    if b'"error"' not in body:
+        return False
+    try:
+        dados = json.loads(body)
+    except ValueError:
+        return False
+    if isinstance(dados, list) and len(dados) == 2 and isinstance(dados[1], int):
+        return dados[1] >= 400
+    return isinstance(dados, dict) and dados.get('status') == 'error'
+
+
+# Cada thread mantem uma conexao keep-alive e sorteia rotas do mix ate o prazo.
+# {emprestimo_aberto} e um emprestimo aberto por um checkout desta thread; sem
+# nenhum, a rota que o usa e sorteada de novo.
+def carga(url, mix, rows, concorrencia, duracao, aquecimento):
+    alvo = urllib.parse.urlsplit(url)
+    pesos = [peso for _, _, peso in mix]
+    amostras = [{} for _ in range(concorrencia)]
+    inicio_medicao = time.monotonic() + aquecimento
+    fim = inicio_medicao + duracao
+
+    def worker(n):
+        rnd = random.Random(n)
+        conn = http.client.HTTPConnection(alvo.hostname, alvo.port, timeout=30)
+        minhas = amostras[n]
+        abertos = []
+        while True:
+            agora = time.monotonic()
+            if agora >= fim:
+                break
+            metodo, modelo, _ = rnd.choices(mix, weights=pesos)[0]
+            aberto = None
+            if '{emprestimo_aberto}' in modelo:
+                if not abertos:
+                    continue
+                aberto = abertos.pop(rnd.randrange(len(abertos)))
+            caminho = modelo.format(livro_id=rnd.randint(1, rows), usuario_id=rnd.randint(1, rows),
+                                    emprestimo_id=rnd.randint(1, rows), emprestimo_aberto=aberto)
+            dados = corpo(metodo, caminho, rnd, rows)
+            headers = {}
+            body = None
+            if dados is not None:
+                body = json.dumps(dados)
+                headers['Content-Type'] = 'application/json'
+            t0 = time.perf_counter()
+            try:
+                conn.request(metodo, caminho, body=body, headers=headers)
+                resposta = conn.getresponse()
+                conteudo = resposta.read()
+                erro = falhou(resposta.status, conteudo)
+                if not erro and caminho == '/emprestimo/checkout':
+                    abertos.append(json.loads(conteudo)['emprestimo_id'])
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(alvo.hostname, alvo.port, timeout=30)
+                erro = True
+            latencia = time.perf_counter() - t0
+            if agora < inicio_medicao:
+                continue
+            registro = minhas.setdefault(f"{metodo} {modelo}", {'lat': [], 'errors': 0})
+            registro['lat'].append(latencia)
+            registro['errors'] += erro
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    rotas = {}
+    for minhas in amostras:
+        for rota, registro in minhas.items():
+            junto = rotas.setdefault(rota, {'lat': [], 'errors': 0})
+            junto['lat'].extend(registro['lat'])
+            junto['errors'] += registro['errors']
+
+    resultado = {'concurrency': concorrencia, 'routes': {}}
+    total = 0
+    for rota, registro in sorted(rotas.items()):
+        lat = sorted(registro['lat'])
+        total += len(lat)
+        resultado['routes'][rota] = {
+            'count': len(lat),
+            'errors': registro['errors'],
+            'rps': len(lat) / duracao,
+            'mean_ms': sum(lat) / len(lat) * 1000,
+            'p50_ms': percentil(lat, 50) * 1000,
+            'p95_ms': percentil(lat, 95) * 1000,
+            'p99_ms': percentil(lat, 99) * 1000,
+        }
+    resultado['total_rps'] = total / duracao
+    return resultado
+
+
+def iniciar_app(args):
+    env = dict(os.environ)
+    cfg = db_config(args)
+    env.update({
+        'DB_HOST': cfg['host'],
+        'DB_PORT': str(cfg['port']),
+        'DB_USER': cfg['user'],
+        'DB_PASSWORD': cfg['password'],
+        'DB_NAME': cfg['database'],
+        'DB_SSL_CA': '',
+    })
+    if args.db_replicas:
+        env['DB_REPLICAS'] = args.db_replicas
+    porta = urllib.parse.urlsplit(args.url).port
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--mode', args.mode,
+         '--port', str(porta), '--workers', str(args.workers), '--host', '127.0.0.1'],
+        env=env,
+    )
+    alvo = urllib.parse.urlsplit(args.url)
+    prazo = time.monotonic() + 30
+    while time.monotonic() < prazo:
+        try:
+            conn = http.client.HTTPConnection(alvo.hostname, alvo.port, timeout=2)
+            conn.request('GET', '/pool/stats')
+            if conn.getresponse().status == 200:
+                return processo
+        except OSError:
+            pass
+        time.sleep(0.5)
+    processo.terminate()
+    raise SystemExit("O app nao respondeu em 30s")
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    mix = parse_mix(args.mix or DEFAULT_MIX)
+    processo = iniciar_app(args) if args.start_app else None
+    try:
+        niveis = []
+        for concorrencia in [int(c) for c in args.concurrency.split(',')]:
+            print(f"concorrencia {concorrencia}...")
+            resultado = carga(args.url, mix, args.rows, concorrencia, args.duration, args.warmup)
+            imprimir(resultado)
+            niveis.append(resultado)
+    finally:
+        if processo:
+            processo.terminate()
+            processo.wait()
+
+    commit = commit_atual()
+    saida = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'mode': args.mode,
+            'workers': args.workers,
+            'rows': args.rows,
+            'duration': args.duration,
+            'mix': args.mix or DEFAULT_MIX,
+        },
+        'results': niveis,
+    }
+    caminho = args.output
+    if caminho is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        nome = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{commit or 'sem-commit'}-{args.mode}.json"
+        caminho = os.path.join(RESULTS_DIR, nome)
+    with open(caminho, 'w') as f:
+        json.dump(saida, f, indent=2)
+    print(f"resultados salvos em {caminho}")
+
+
+def imprimir(resultado):
+    print(f"  total: {resultado['total_rps']:.1f} req/s")
+    print(f"  {'rota':<36} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'erros':>6}")
+    for rota, r in resultado['routes'].items():
+        print(f"  {rota:<36} {r['rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}")
+
+
+# Mostra a variacao de vazao e p95 por rota entre dois resultados
+def compare(args):
+    with open(args.antes) as f:
+        antes = json.load(f)
+    with open(args.depois) as f:
+        depois = json.load(f)
+    por_nivel = {r['concurrency']: r for r in antes['results']}
+    print(f"{antes['meta']['commit']} -> {depois['meta']['commit']}")
+    for nivel in depois['results']:
+        base = por_nivel.get(nivel['concurrency'])
+        if base is None:
+            continue
+        print(f"concorrencia {nivel['concurrency']}: {base['total_rps']:.1f} -> {nivel['total_rps']:.1f} req/s "
+              f"({variacao(base['total_rps'], nivel['total_rps'])})")
+        for rota, r in nivel['routes'].items():
+            b = base['routes'].get(rota)
+            if b is None:
+                continue
+            print(f"  {rota:<36} req/s {variacao(b['rps'], r['rps']):>8}   p95 {variacao(b['p95_ms'], r['p95_ms']):>8}")
+
+
+def variacao(antes, depois):
+    if not antes:
+        return 'n/a'
+    return f"{(depois - antes) / antes * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da API da biblioteca")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    def opcoes_db(p):
+        p.add_argument('--db-host', default=DB_DEFAULTS['host'])
+        p.add_argument('--db-port', type=int, default=DB_DEFAULTS['port'])
+        p.add_argument('--db-user', default=DB_DEFAULTS['user'])
+        p.add_argument('--db-password', default=DB_DEFAULTS['password'])
+        p.add_argument('--db-name', default=DB_DEFAULTS['database'])
+
+    p = sub.add_parser('db-up', help="sobe o MySQL local via docker compose")
+    p.add_argument('--replica', action='store_true', help=f"sobe tambem uma replica em {REPLICA_PORT}")
+    p.set_defaults(func=db_up)
+
+    p = sub.add_parser('seed', help="apaga e gera dados sinteticos")
+    opcoes_db(p)
+    p.add_argument('--rows', type=int, default=10000, help="linhas por tabela")
+    p.set_defaults(func=seed)
+
+    p = sub.add_parser('run', help="roda a carga e salva os resultados")
+    opcoes_db(p)
+    p.add_argument('--url', default='http://127.0.0.1:5050')
+    p.add_argument('--start-app', action='store_true', help="sobe o serve.py apontando pro MySQL local")
+    p.add_argument('--mode', choices=('wsgi', 'asgi'), default='wsgi')
+    p.add_argument('--workers', type=int, default=1)
+    p.add_argument('--db-replicas', help=f"DB_REPLICAS do app, ex.: 127.0.0.1:{REPLICA_PORT}")
+    p.add_argument('--rows', type=int, default=10000, help="linhas por tabela usadas no seed")
+    p.add_argument('--concurrency', default='1,8,32')
+    p.add_argument('--duration', type=float, default=30, help="segundos medidos por nivel")
+    p.add_argument('--warmup', type=float, default=5, help="segundos descartados no inicio de cada nivel")
+    p.add_argument('--mix', action='append', help="'METODO /caminho=peso'; pode repetir. Aceita {livro_id}, {usuario_id}, {emprestimo_id}")
+    p.add_argument('--output')
+    p.set_defaults(func=run)
+
+    p = sub.add_parser('compare', help="compara dois arquivos de resultado")
+    p.add_argument('antes')
+    p.add_argument('depois')
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import json
+import os
+
+import mysql.connector
+from flask import request
+
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 500))
+BULK_MAX_CHUNK_SIZE = int(os.getenv('BULK_MAX_CHUNK_SIZE', 5000))
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+
+
+def read_chunk_size():
+    chunk_size = request.args.get('chunk_size', BULK_CHUNK_SIZE)
+    try:
+        chunk_size = int(chunk_size)
+    except ValueError:
+        raise ValueError("Parâmetro 'chunk_size' deve ser um inteiro")
+    if chunk_size < 1:
+        raise ValueError("Parâmetro 'chunk_size' deve ser maior que zero")
+    return min(chunk_size, BULK_MAX_CHUNK_SIZE)
+
+
+# Gera (indice, objeto, erro) pra cada linha do corpo. Aceita um array JSON
+# ou NDJSON; no NDJSON o corpo e lido linha a linha, sem carregar tudo.
+def read_bulk_rows():
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _read_ndjson()
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("O corpo deve ser um array JSON ou NDJSON")
+    return ((indice, obj, None) for indice, obj in enumerate(data))
+
+
+def _read_ndjson():
+    indice = 0
+    for linha in request.stream:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield indice, json.loads(linha), None
+        except ValueError as err:
+            yield indice, None, f"JSON inválido: {err}"
+        indice += 1
+
+
+def _values(obj, colunas):
+    if not isinstance(obj, dict):
+        raise ValueError("Cada item deve ser um objeto JSON")
+    faltando = [c for c in colunas if c not in obj]
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+    return tuple(obj[c] for c in colunas)
+
+
+# Insere as linhas em blocos de chunk_size com um executemany (que o conector
+# transforma num INSERT multi-row) e um commit por bloco. Se o bloco falhar
+# (ex.: isbn/cpf/email duplicado), refaz o bloco linha a linha pra isolar as
+# linhas com problema sem perder as outras.
+def insert_in_chunks(conn, query, colunas, linhas, chunk_size, on_insert=None):
+    resultado = {"inserted": 0, "ids": [], "errors": []}
+    bloco = []
+
+    for indice, obj, erro in linhas:
+        if erro is None:
+            try:
+                bloco.append((indice, _values(obj, colunas)))
+            except ValueError as err:
+                erro = str(err)
+        if erro is not None:
+            resultado["errors"].append({"index": indice, "message": erro})
+        if len(bloco) >= chunk_size:
+            _flush(conn, query, bloco, resultado, on_insert)
+            bloco = []
+
+    if bloco:
+        _flush(conn, query, bloco, resultado, on_insert)
+    resultado["errors"].sort(key=lambda e: e["index"])
+    return resultado
+
+
+def _flush(conn, query, bloco, resultado, on_insert):
+    for indice, id, erro in insert_chunk(conn, query, bloco, on_insert):
+        if erro is None:
+            resultado["ids"].append({"index": indice, "id": id})
+            resultado["inserted"] += 1
+        else:
+            resultado["errors"].append({"index": indice, "message": erro})
+
+
+# Insere um bloco de (chave, valores) numa transacao so. Retorna
+# (chave, id, None) pra cada linha inserida e (chave, None, erro) pras que
+# falharam. Tambem usado pela fila de escrita (write_behind.py).
+# on_insert(cursor, valores das linhas inseridas) roda antes do commit, na
+# mesma transacao (ex.: contadores de aggregates.py).
+def insert_chunk(conn, query, bloco, on_insert=None):
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.executemany(query, [valores for _, valores in bloco])
+            # INSERT multi-row gera ids consecutivos a partir de lastrowid
+            # (innodb_autoinc_lock_mode 1 ou 2, auto_increment_increment = 1)
+            primeiro_id = cursor.lastrowid
+            if on_insert is not None:
+                on_insert(cursor, [valores for _, valores in bloco])
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+        else:
+            return [(chave, primeiro_id + offset, None) for offset, (chave, _) in enumerate(bloco)]
+
+        # Um erro de chave duplicada/FK desfaz so o statement, nao a transacao
+        resultado = []
+        inseridas = []
+        for chave, valores in bloco:
+            try:
+                cursor.execute(query, valores)
+            except mysql.connector.Error as err:
+                resultado.append((chave, None, str(err)))
+            else:
+                resultado.append((chave, cursor.lastrowid, None))
+                inseridas.append(valores)
+        if on_insert is not None and inseridas:
+            on_insert(cursor, inseridas)
+        conn.commit()
+        return resultado
+    finally:
+        cursor.close()
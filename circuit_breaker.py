@@ -0,0 +1,92 @@
+import os
+import random
+import threading
+import time
+
+from mysql.connector.errors import InterfaceError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_CODES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(InterfaceError):
+    pass
+
+
+# Disjuntor das conexoes novas com o banco. Depois de `failures` falhas de
+# conexao seguidas ele abre e as tentativas falham na hora, sem esperar o
+# timeout de TCP/TLS. Passado o tempo de espera (backoff exponencial com
+# jitter) entra em half-open: uma tentativa so (a sonda) vai ao banco; se der
+# certo fecha, se falhar abre de novo com o dobro da espera.
+class CircuitBreaker:
+    def __init__(self, failures=3, base_backoff=1.0, max_backoff=30.0):
+        self.failures = failures
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opens_in_row = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._stats = {'opens': 0, 'rejected': 0, 'failures': 0, 'probes': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failures=int(os.getenv('DB_BREAKER_FAILURES', 3)),
+            base_backoff=float(os.getenv('DB_BREAKER_BACKOFF', 1)),
+            max_backoff=float(os.getenv('DB_BREAKER_MAX_BACKOFF', 30)),
+        )
+
+    # Chamado antes de abrir uma conexao; levanta CircuitOpenError se o
+    # disjuntor estiver aberto (ou se outra thread ja estiver sondando)
+    def before_call(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self._stats['probes'] += 1
+                return
+            self._stats['rejected'] += 1
+            restante = max(0.0, self._open_until - time.monotonic())
+        raise CircuitOpenError(msg=f"Banco indisponível (circuit breaker aberto, nova tentativa em {restante:.1f}s)")
+
+    def on_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive = 0
+            self._opens_in_row = 0
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._consecutive += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._consecutive >= self.failures):
+                self._open()
+            self._probing = False
+
+    def _open(self):
+        espera = min(self.max_backoff, self.base_backoff * 2 ** self._opens_in_row)
+        # "equal jitter": metade fixa e metade aleatoria, pra que os workers
+        # nao mandem as sondas todos ao mesmo tempo
+        espera = espera / 2 + random.uniform(0, espera / 2)
+        self._state = OPEN
+        self._open_until = time.monotonic() + espera
+        self._opens_in_row += 1
+        self._stats['opens'] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['state'] = self._state
+            data['state_code'] = STATE_CODES[self._state]
+            data['retry_in'] = round(max(0.0, self._open_until - time.monotonic()), 3) if self._state == OPEN else 0.0
+            return data
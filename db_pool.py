@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from circuit_breaker import CircuitBreaker
+
+
+# Conexao emprestada pelo pool. As rotas continuam chamando conn.close() no
+# finally, mas aqui isso devolve a conexao ao pool em vez de fechar o socket.
+class PooledConnection:
+    def __init__(self, pool, raw, generation):
+        self._pool = pool
+        self._raw = raw
+        self._generation = generation
+        self._released = False
+
+    # A validacao ja foi feita no checkout, entao nao precisamos de outro ping
+    def is_connected(self):
+        return not self._released
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self._generation)
+
+    # Fecha o socket de verdade em vez de devolver ao pool (ex.: a conexao
+    # ficou com resultado pendente de um stream interrompido)
+    def discard(self):
+        if not self._released:
+            self._released = True
+            self._pool._drop(self._raw, self._generation)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    def __init__(self, config, min_size=1, max_size=10, max_idle=300.0,
+                 max_lifetime=3600.0, ping_interval=30.0, timeout=5.0, breaker=None):
+        if min_size > max_size:
+            raise ValueError("min_size nao pode ser maior que max_size")
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.breaker = breaker
+        self._generation = 0
+        self._reset()
+
+    # Le os limites do pool das variaveis de ambiente (DB_POOL_*)
+    @classmethod
+    def from_env(cls, config):
+        return cls(
+            config,
+            min_size=int(os.getenv('DB_POOL_MIN', 1)),
+            max_size=int(os.getenv('DB_POOL_MAX', 10)),
+            max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            breaker=CircuitBreaker.from_env(),
+        )
+
+    # Estado por processo. Depois de um fork o filho descarta as conexoes
+    # herdadas (sem fechar, o socket ainda pertence ao pai) e comeca do zero.
+    def _reset(self):
+        self._pid = os.getpid()
+        self._generation += 1
+        self._cond = threading.Condition()
+        self._idle = []  # (conexao, criada_em, usada_em), a mais recente no fim
+        self._size = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'evictions': 0,
+            'broken': 0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    # Com o banco fora do ar o circuit breaker faz as conexoes novas falharem
+    # na hora em vez de cada request esperar o timeout de conexao
+    def _connect(self):
+        if self.breaker is None:
+            raw = mysql.connector.connect(**self.config)
+        else:
+            self.breaker.before_call()
+            try:
+                raw = mysql.connector.connect(**self.config)
+            # qualquer falha (OSError, SSL...) conta, senao a sonda do
+            # half-open nunca terminaria
+            except Exception:
+                self.breaker.on_failure()
+                raise
+            self.breaker.on_success()
+        raw._pool_created_at = time.monotonic()
+        # prepared statements desta conexao (statements.py)
+        raw._statements = OrderedDict()
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    # Remove conexoes ociosas demais ou velhas demais, mantendo min_size.
+    # As mais antigas ficam no inicio da lista.
+    def _evict_locked(self, now):
+        expired = []
+        keep = []
+        for entry in self._idle:
+            raw, created_at, used_at = entry
+            too_old = now - created_at > self.max_lifetime
+            too_idle = now - used_at > self.max_idle
+            if too_old or (too_idle and self._size - len(expired) > self.min_size):
+                expired.append(raw)
+            else:
+                keep.append(entry)
+        if expired:
+            self._idle = keep
+            self._size -= len(expired)
+            self._stats['evictions'] += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def get_connection(self, timeout=None):
+        self._check_pid()
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        generation = self._generation
+        with self._cond:
+            self._stats['checkouts'] += 1
+
+        while True:
+            waited = False
+            with self._cond:
+                expired = self._evict_locked(time.monotonic())
+                while True:
+                    if self._idle:
+                        raw, _, used_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        raw = None
+                        break
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError(f"Nenhuma conexao livre no pool apos {timeout}s")
+                    self._cond.wait(remaining)
+
+            for old in expired:
+                self._discard(old)
+
+            if raw is None:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                return PooledConnection(self, raw, generation)
+
+            # Liveness check so quando a conexao ficou parada por um tempo
+            if time.monotonic() - used_at < self.ping_interval or raw.is_connected():
+                return PooledConnection(self, raw, generation)
+
+            self._discard(raw)
+            with self._cond:
+                self._size -= 1
+                self._stats['broken'] += 1
+                self._cond.notify()
+
+    def _drop(self, raw, generation):
+        if generation != self._generation or self._pid != os.getpid():
+            return
+        self._discard(raw)
+        with self._cond:
+            self._size -= 1
+            self._stats['broken'] += 1
+            self._cond.notify()
+
+    def _release(self, raw, generation):
+        if generation != self._generation or self._pid != os.getpid():
+            return
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except mysql.connector.Error:
+            self._drop(raw, generation)
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._idle.append((raw, raw._pool_created_at, now))
+            self._cond.notify()
+
+    # Abre conexoes ate min_size (usado no startup de cada worker)
+    def warm(self):
+        self._check_pid()
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                conns.append(self.get_connection())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def stats(self):
+        self._check_pid()
+        with self._cond:
+            data = dict(self._stats)
+            data['size'] = self._size
+            data['idle'] = len(self._idle)
+            data['in_use'] = self._size - len(self._idle)
+            data['min_size'] = self.min_size
+            data['max_size'] = self.max_size
+        if self.breaker is not None:
+            data['breaker'] = self.breaker.stats()
+        return data
@@ -0,0 +1,179 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Backend em memoria: LRU limitado por quantidade de entradas, um por processo
+class LocalBackend:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == prefix]:
+                del self._data[key]
+
+    def size(self):
+        return len(self._data)
+
+
+# Backend compartilhado entre workers da mesma maquina: um arquivo SQLite
+# local faz o papel de um cache externo (tipo Redis) sem dependencia nova.
+# Uma invalidacao feita por um worker vale pra todos.
+class SQLiteBackend:
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    entidade TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (entidade, id)
+                )
+            """)
+
+    # uma conexao sqlite por thread (e por processo, ja que o pid entra na chave)
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE entidade = ? AND id = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(key)
+            self.evictions += 1
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (entidade, id, value, expires_at) VALUES (?, ?, ?, ?)",
+            (key[0], key[1], pickle.dumps(value), time.time() + ttl),
+        )
+        # sem LRU de verdade aqui: quando passa do limite, sai quem expira antes
+        excesso = self.size() - self.max_entries
+        if excesso > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY expires_at LIMIT ?)",
+                (excesso,),
+            )
+            self.evictions += excesso
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE entidade = ? AND id = ?", key)
+
+    def clear(self, prefix):
+        self._conn().execute("DELETE FROM cache WHERE entidade = ?", (prefix,))
+
+    def size(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+# Cache read-through das rotas obter_*. As chaves sao (entidade, id).
+# As rotas de escrita chamam invalidate() depois do commit; a TTL limita o
+# tempo que um valor pode ficar velho se alguma escrita passar por fora.
+class EntityCache:
+    def __init__(self, backend, ttl=60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        # Com mais de um worker o cache local deixaria cada um servindo a sua
+        # copia ate a TTL depois de uma escrita feita em outro; o padrao passa
+        # a ser o sqlite, compartilhado, e o local e recusado
+        workers = int(os.getenv('WEB_CONCURRENCY', 1))
+        tipo = os.getenv('CACHE_BACKEND', 'sqlite' if workers > 1 else 'local')
+        max_entries = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+        if tipo == 'local' and workers > 1:
+            raise ValueError(f"CACHE_BACKEND=local com {workers} workers: use sqlite")
+        if tipo == 'sqlite':
+            backend = SQLiteBackend(os.getenv('CACHE_PATH', '/tmp/entity_cache.sqlite'), max_entries)
+        elif tipo == 'local':
+            backend = LocalBackend(max_entries)
+        else:
+            raise ValueError(f"CACHE_BACKEND inválido: {tipo}")
+        return cls(backend, ttl=float(os.getenv('CACHE_TTL', 60)))
+
+    def get(self, entidade, id):
+        value = self.backend.get((entidade, id))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    # CACHE_TTL=0 desliga o cache
+    def set(self, entidade, id, value):
+        if self.ttl <= 0:
+            return
+        self.backend.set((entidade, id), value, self.ttl)
+
+    def invalidate(self, entidade, id):
+        self.invalidations += 1
+        self.backend.delete((entidade, id))
+
+    # usado quando um DELETE em cascata pode ter apagado linhas de outra tabela
+    def invalidate_all(self, entidade):
+        self.invalidations += 1
+        self.backend.clear(entidade)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+            'size': self.backend.size(),
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,72 @@
+# Colunas que o cliente pode pedir com ?fields= em cada tabela. O id vem
+# sempre (paginacao, cache e multi-get dependem dele).
+TABLE_FIELDS = {
+    'usuarios': ('id', 'nome', 'email', 'cpf'),
+    'livros': ('id', 'titulo', 'isbn', 'autor'),
+    'emprestimos': ('id', 'usuario_id', 'livro_id', 'data_emprestimo', 'data_devolucao'),
+}
+
+# Campos do GET /emprestimo (o JOIN) -> expressao no SELECT e tabela que exige
+EMPRESTIMOS_JOIN_FIELDS = {
+    'id': ('e.id', None),
+    'usuario': ('u.nome AS usuario', 'usuarios'),
+    'livro': ('l.titulo AS livro', 'livros'),
+    'data_emprestimo': ('e.data_emprestimo', None),
+}
+
+
+# Le ?fields=a,b da query string. Retorna None quando o cliente nao pediu
+# (SELECT * como antes) ou a tupla de campos validados, com o id na frente.
+def read_fields(args, permitidos):
+    valor = args.get('fields')
+    if valor is None:
+        return None
+    if isinstance(permitidos, str):
+        permitidos = TABLE_FIELDS[permitidos]
+    campos = [c.strip() for c in valor.split(',') if c.strip()]
+    invalidos = [c for c in campos if c not in permitidos]
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}. Campos aceitos: {', '.join(permitidos)}.")
+    return tuple(dict.fromkeys(['id'] + campos))
+
+
+# Os nomes ja foram validados contra a whitelist, entao podem ir direto no SQL
+def select_list(campos):
+    if campos is None:
+        return '*'
+    return ', '.join(campos)
+
+
+def project(linha, campos):
+    if campos is None or linha is None:
+        return linha
+    return {c: linha[c] for c in campos}
+
+
+# Monta o SELECT ... FROM do GET /emprestimo so com os JOINs que os campos
+# pedidos precisam. Sem o JOIN, o filtro "IS NOT NULL" mantem o mesmo
+# resultado do INNER JOIN (a FK garante que um id nao nulo existe).
+# Retorna (sql, condicoes) pra rota acrescentar paginacao no WHERE.
+def emprestimos_join_query(campos):
+    if campos is None:
+        campos = tuple(EMPRESTIMOS_JOIN_FIELDS)
+    colunas = [EMPRESTIMOS_JOIN_FIELDS[c][0] for c in campos]
+    precisa = {EMPRESTIMOS_JOIN_FIELDS[c][1] for c in campos}
+
+    sql = f"SELECT {', '.join(colunas)} FROM emprestimos e"
+    condicoes = []
+    if 'usuarios' in precisa:
+        sql += " JOIN usuarios u ON e.usuario_id = u.id"
+    else:
+        condicoes.append("e.usuario_id IS NOT NULL")
+    if 'livros' in precisa:
+        sql += " JOIN livros l ON e.livro_id = l.id"
+    else:
+        condicoes.append("e.livro_id IS NOT NULL")
+    return sql, condicoes
+
+
+def where(condicoes):
+    if not condicoes:
+        return ''
+    return ' WHERE ' + ' AND '.join(condicoes)
@@ -0,0 +1,70 @@
+# Gunicorn (pre-fork) servindo o app Flask de aps-02/app.py:
+#
+#   gunicorn -c gunicorn.conf.py      # ou python serve.py
+#
+# Com preload o master importa o app uma vez (load_dotenv, config, pool,
+# metricas...) e os workers nascem de um fork ja prontos. Nada de banco e
+# aberto no import: cada worker abre as proprias conexoes em post_worker_init.
+import math
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# CPUs que o processo pode usar: afinidade e, em container, a cota do cgroup v2
+def cpu_count():
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, periodo = f.read().split()
+        if quota != 'max':
+            n = min(n, max(1, math.ceil(int(quota) / int(periodo))))
+    except (OSError, ValueError):
+        pass
+    return n
+
+
+chdir = os.path.join(ROOT, 'aps-02')
+wsgi_app = 'app:app'
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+
+# Um worker por CPU (o Python de cada um usa um core). As threads esperam o
+# MySQL na maior parte do tempo; o padrao e uma por conexao do pool do worker,
+# ja que threads alem disso so ficariam esperando conexao livre.
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', cpu_count()))
+# o app le o numero de workers (ex.: pra escolher o backend do cache)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', os.getenv('DB_POOL_MAX', 10)))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Cada worker e reciclado depois de GUNICORN_MAX_REQUESTS requests (+ jitter,
+# pra nao reiniciarem todos juntos; 0 desliga); o master sobe o substituto
+# antes de o antigo sair. O worker que sai grava a fila de escrita no atexit,
+# e um purge que estava com ele e retomado por outro worker quando o lease
+# expira.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+accesslog = '-' if os.getenv('GUNICORN_ACCESS_LOG', '0') == '1' else None
+
+
+def post_worker_init(worker):
+    import app
+    app.init_worker()
+
+
+# Roda no master quando um worker sai: soma os contadores dele no arquivo dos
+# workers aposentados e apaga o arquivo do pid, antes que o pid seja reusado
+def child_exit(server, worker):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import metrics
+    metrics.retire(metrics.directory_from_env(), worker.pid)
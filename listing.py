@@ -0,0 +1,162 @@
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import zlib
+
+import mysql.connector
+from flask import Response, current_app, jsonify
+
+PAGE_DEFAULT_LIMIT = int(os.getenv('PAGE_DEFAULT_LIMIT', 100))
+PAGE_MAX_LIMIT = int(os.getenv('PAGE_MAX_LIMIT', 1000))
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# O token de proxima pagina e so o ultimo id visto, codificado pra ser opaco
+def encode_cursor(last_id):
+    raw = json.dumps({'id': last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))['id']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Parâmetro 'after' inválido")
+    if not isinstance(last_id, int):
+        raise ValueError("Parâmetro 'after' inválido")
+    return last_id
+
+
+# Recebe request.args e retorna (limit, after_id) quando o cliente pediu
+# paginacao, ou None pro comportamento antigo (lista inteira)
+def read_page_args(args):
+    limit = args.get('limit')
+    after = args.get('after')
+    if limit is None and after is None:
+        return None
+    if limit is None:
+        limit = PAGE_DEFAULT_LIMIT
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("Parâmetro 'limit' deve ser um inteiro")
+        if limit < 1:
+            raise ValueError("Parâmetro 'limit' deve ser maior que zero")
+        limit = min(limit, PAGE_MAX_LIMIT)
+    after_id = decode_cursor(after) if after else 0
+    return limit, after_id
+
+
+# ?from=AAAA-MM-DD&to=AAAA-MM-DD: from inclusivo e to exclusivo, pra que
+# exportacoes incrementais encadeiem sem repetir nem pular dias
+def read_date_range(args):
+    intervalo = []
+    for nome in ('from', 'to'):
+        valor = args.get(nome)
+        if valor is not None:
+            try:
+                valor = datetime.date.fromisoformat(valor)
+            except ValueError:
+                raise ValueError(f"Parâmetro '{nome}' deve ser uma data AAAA-MM-DD")
+        intervalo.append(valor)
+    return tuple(intervalo)
+
+
+# As queries buscam limit + 1 linhas: se a extra veio, existe proxima pagina
+def build_page(rows, limit):
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    next_token = encode_cursor(rows[-1]['id']) if has_next else None
+    return {"status": "ok", "data": rows, "next": next_token}
+
+
+# Executa a query num cursor nao bufferizado e manda as linhas pro cliente
+# conforme chegam, em lotes de STREAM_BATCH_SIZE. A conexao so volta pro pool
+# quando o gerador termina. Com compress=True o corpo sai em gzip, comprimido
+# lote a lote.
+def stream_query(conect_db, query, params, formato, compress=False):
+    if formato not in STREAM_FORMATS:
+        return jsonify({"status": "error", "message": f"Formato de stream inválido. Formatos aceitos: {', '.join(STREAM_FORMATS)}."}), 400
+
+    conn = conect_db()
+    if not (conn and conn.is_connected()):
+        return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+    except mysql.connector.Error as err:
+        conn.close()
+        return jsonify({"status": "error", "message": f"Erro ao executar consulta, {err}"}), 500
+
+    dumps = current_app.json.dumps
+
+    estado = {'terminou': False}
+
+    def gerar():
+        primeiro = True
+        if formato == 'json':
+            yield '['
+        elif formato == 'csv':
+            yield _csv_lines([cursor.column_names])
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if formato == 'json':
+                partes = [dumps(row) for row in rows]
+                yield ('' if primeiro else ',') + ','.join(partes)
+            elif formato == 'csv':
+                yield _csv_lines([row.values() for row in rows])
+            else:
+                yield ''.join(dumps(row) + '\n' for row in rows)
+            primeiro = False
+        if formato == 'json':
+            yield ']'
+        estado['terminou'] = True
+
+    # Chamado pelo servidor quando a resposta acaba, inclusive se o cliente
+    # desconectar antes do fim
+    def liberar():
+        if estado['terminou']:
+            cursor.close()
+            conn.close()
+        else:
+            # ainda ha linhas pendentes no socket, entao a conexao nao pode
+            # voltar pro pool
+            conn.discard()
+
+    if compress:
+        response = Response(_gzip(gerar()), mimetype=STREAM_FORMATS[formato])
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gerar(), mimetype=STREAM_FORMATS[formato])
+    response.call_on_close(liberar)
+    return response
+
+
+# Datas viram ISO (str(date)) e NULL vira campo vazio
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+
+def _gzip(partes):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for parte in partes:
+        dados = compressor.compress(parte.encode())
+        if dados:
+            yield dados
+    yield compressor.flush()
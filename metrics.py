@@ -0,0 +1,397 @@
+import contextvars
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_DIR = '/tmp/app_metrics'
+
+# Contadores e histogramas dos workers que ja sairam, somados num arquivo so
+RETIRED_FILE = 'retired.json'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMS = {
+    'app_request_duration_seconds': ("Tempo total do request por rota", LATENCY_BUCKETS),
+    'app_request_phase_seconds': ("Tempo por fase do request (connect, execute, fetch, serialize)", LATENCY_BUCKETS),
+    'app_response_rows': ("Linhas lidas do banco por request", ROWS_BUCKETS),
+    'app_response_size_bytes': ("Tamanho do corpo da resposta", SIZE_BUCKETS),
+}
+
+PHASES = ('connect', 'execute', 'fetch', 'serialize')
+
+# Medicoes do request atual. Contextvar em vez de flask.g porque o corpo de
+# uma resposta em stream e gerado depois que o contexto do request acabou.
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+class _RequestTimings:
+    __slots__ = ('route', 'start', 'phases', 'rows', 'size')
+
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.size = 0
+
+
+def _add_phase(phase, elapsed):
+    timings = _current.get()
+    if timings is not None:
+        timings.phases[phase] += elapsed
+
+
+def _add_rows(rows):
+    timings = _current.get()
+    if timings is not None and rows:
+        timings.rows += rows
+
+
+# Cursor que cronometra execute/fetch e conta as linhas lidas
+class TimedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            _add_phase('execute', time.perf_counter() - t0)
+
+    def executemany(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            _add_phase('execute', time.perf_counter() - t0)
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = self._cursor.fetchone()
+        _add_phase('fetch', time.perf_counter() - t0)
+        _add_rows(row is not None)
+        return row
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = self._cursor.fetchall()
+        _add_phase('fetch', time.perf_counter() - t0)
+        _add_rows(len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        _add_phase('fetch', time.perf_counter() - t0)
+        _add_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# Provider JSON do Flask que soma o tempo de serializacao na fase 'serialize'
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            _add_phase('serialize', time.perf_counter() - t0)
+
+
+# Histogramas por rota. Cada processo acumula em memoria e grava um arquivo
+# proprio em METRICS_DIR a cada flush_interval segundos; o /metrics junta os
+# arquivos de todos os workers. O arquivo de um worker que sai e somado em
+# retired.json e apagado (child_exit do gunicorn, ou o proximo /metrics).
+class Metrics:
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._histograms = {}
+        self._sources = []
+        self._last_flush = 0.0
+        self._pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(directory_from_env())
+
+    def init_app(self, app):
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        @app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    # Fonte extra de numeros (ex.: pool.stats). counters sao somados como
+    # contadores e gauges como gauges; per_process sao gauges que nao fazem
+    # sentido somados (ex.: estado do breaker) e saem uma serie por pid. O
+    # resto do dict e ignorado.
+    def register(self, name, fn, counters=(), gauges=(), per_process=()):
+        self._sources.append((name, fn, tuple(counters), tuple(gauges), tuple(per_process)))
+
+    def instrument(self, conn):
+        return TimedConnection(conn)
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            _add_phase(name, time.perf_counter() - t0)
+
+    def _before_request(self):
+        _current.set(_RequestTimings(request.endpoint or 'desconhecida'))
+
+    def _after_request(self, response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        if response.is_streamed:
+            response.response = self._count_bytes(response.response, timings)
+            response.call_on_close(lambda: self._finish(timings))
+        else:
+            timings.size = response.calculate_content_length() or 0
+            self._finish(timings)
+        return response
+
+    def _count_bytes(self, iterable, timings):
+        for chunk in iterable:
+            timings.size += len(chunk)
+            yield chunk
+
+    def _finish(self, timings):
+        _current.set(None)
+        total = time.perf_counter() - timings.start
+        route = timings.route
+        with self._lock:
+            self._observe('app_request_duration_seconds', (('route', route),), total)
+            for phase, elapsed in timings.phases.items():
+                self._observe('app_request_phase_seconds', (('route', route), ('phase', phase)), elapsed)
+            self._observe('app_response_rows', (('route', route),), timings.rows)
+            self._observe('app_response_size_bytes', (('route', route),), timings.size)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(wait=False)
+
+    def _observe(self, name, labels, value):
+        key = (name, labels)
+        hist = self._histograms.get(key)
+        buckets = HISTOGRAMS[name][1]
+        if hist is None:
+            # contagem por bucket (sem acumular) + soma + total
+            hist = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+        index = bisect_left(buckets, value)
+        if index < len(buckets):
+            hist[0][index] += 1
+        hist[1] += value
+        hist[2] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            histograms = [
+                [name, list(labels), list(hist[0]), hist[1], hist[2]]
+                for (name, labels), hist in self._histograms.items()
+            ]
+        sources = []
+        for name, fn, counters, gauges, per_process in self._sources:
+            data = fn()
+            sources.append([name, {k: data[k] for k in counters}, {k: data[k] for k in gauges},
+                            {k: data[k] for k in per_process}])
+        return {'pid': os.getpid(), 'histograms': histograms, 'sources': sources}
+
+    # Grava o estado deste processo (escrita atomica via rename). No primeiro
+    # flush de um processo, um arquivo com o mesmo pid so pode ser de um
+    # processo antigo (pid reaproveitado): ele e aposentado antes de ser
+    # sobrescrito, senao os contadores andariam pra tras. Um flush por vez no
+    # processo; com wait=False (fim de request) quem chega durante um flush
+    # em andamento nao espera, ele ja grava o estado atual.
+    def flush(self, wait=True):
+        if not self._flush_lock.acquire(blocking=wait):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            pid = os.getpid()
+            if self._pid != pid:
+                retire(self.directory, pid)
+                self._pid = pid
+            path = os.path.join(self.directory, f"{pid}.json")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp, path)
+        finally:
+            self._flush_lock.release()
+
+    # Soma os arquivos dos workers vivos e o retired.json (pra que os
+    # contadores nao andem pra tras) e gera o texto do Prometheus
+    def render(self):
+        self.flush()
+        for pid in _pids(self.directory):
+            if not _alive(pid):
+                retire(self.directory, pid)
+        histograms = {}
+        counters = {}
+        gauges = {}
+        per_process = {}
+        with _locked(self.directory, fcntl.LOCK_SH):
+            arquivos = [_read(path) for path in glob.glob(os.path.join(self.directory, '*.json'))]
+        for data in arquivos:
+            if data is None:
+                continue
+            _merge(data, histograms, counters)
+            if data['pid'] is None or not _alive(data['pid']):
+                continue
+            for name, _, source_gauges, source_per_process in data['sources']:
+                for k, v in source_gauges.items():
+                    gauges[f"app_{name}_{k}"] = gauges.get(f"app_{name}_{k}", 0) + v
+                for k, v in source_per_process.items():
+                    per_process.setdefault(f"app_{name}_{k}", []).append((data['pid'], v))
+
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            series = sorted((k, v) for k, v in histograms.items() if k[0] == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (_, labels), (counts, total, count) in series:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                acumulado = 0
+                for bound, c in zip(buckets, counts):
+                    acumulado += c
+                    lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {acumulado}')
+                lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{label_text}}} {total}")
+                lines.append(f"{name}_count{{{label_text}}} {count}")
+        for (source, k), value in sorted(counters.items()):
+            lines.append(f"# TYPE app_{source}_{k}_total counter")
+            lines.append(f"app_{source}_{k}_total {value}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        for name, series in sorted(per_process.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for pid, value in sorted(series):
+                lines.append(f'{name}{{pid="{pid}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def directory_from_env():
+    return os.getenv('METRICS_DIR', DEFAULT_DIR)
+
+
+# Soma os contadores e histogramas do arquivo de um worker que saiu em
+# retired.json e apaga o arquivo dele. Os gauges do worker morto sao
+# descartados. Chamado pelo child_exit do gunicorn e, pra quem roda sem ele,
+# pelo /metrics ao achar o arquivo de um pid morto.
+def retire(directory, pid):
+    path = os.path.join(directory, f"{pid}.json")
+    with _locked(directory, fcntl.LOCK_EX):
+        data = _read(path)
+        if data is None:
+            return
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        histograms = {}
+        counters = {}
+        retired = _read(retired_path)
+        if retired is not None:
+            _merge(retired, histograms, counters)
+        _merge(data, histograms, counters)
+        sources = {}
+        for key, value in counters.items():
+            name, k = key
+            sources.setdefault(name, {})[k] = value
+        snapshot = {
+            'pid': None,
+            'histograms': [[name, [list(label) for label in labels], buckets, total, count]
+                           for (name, labels), (buckets, total, count) in histograms.items()],
+            'sources': [[name, source_counters, {}, {}] for name, source_counters in sources.items()],
+        }
+        tmp = retired_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, retired_path)
+        os.remove(path)
+
+
+def _merge(data, histograms, counters):
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(tuple(label) for label in labels))
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+    for name, source_counters, *_ in data['sources']:
+        for k, v in source_counters.items():
+            counters[(name, k)] = counters.get((name, k), 0) + v
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pids(directory):
+    pids = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        nome = os.path.basename(path)[:-len('.json')]
+        if nome.isdigit():
+            pids.append(int(nome))
+    return pids
+
+
+# Trava entre processos: o retire troca dois arquivos e o /metrics nao pode
+# ler um worker ja somado em retired.json e o arquivo dele ao mesmo tempo
+@contextmanager
+def _locked(directory, operation):
+    fd = os.open(os.path.join(directory, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,197 @@
+# Migracoes de schema versionadas: cada arquivo NNNN_nome.sql de migrations/
+# roda uma vez, em ordem, e fica registrado em schema_migrations com o
+# checksum do arquivo. DDL no MySQL faz commit implicito, entao uma migracao
+# que falha no meio para o runner e precisa ser corrigida a mao.
+#
+#   python migrate.py               # aplica as pendentes
+#   python migrate.py status        # lista aplicadas, pendentes e alteradas
+#   python migrate.py baseline 0006 # marca ate 0006 como aplicadas sem rodar
+#                                   # (banco criado com o sql_queries.txt antigo)
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+import mysql.connector
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+FILE_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Trava nomeada: dois deploys (ou dois workers) nao aplicam ao mesmo tempo
+LOCK_NAME = 'schema_migrations'
+LOCK_TIMEOUT = int(os.getenv('MIGRATIONS_LOCK_TIMEOUT', 60))
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+
+    # Separa em statements por ';' no fim da linha (os arquivos nao tem
+    # procedures nem ';' dentro de strings)
+    def statements(self):
+        linhas = [l for l in self.sql.splitlines() if not l.strip().startswith('--')]
+        return [s.strip() for s in re.split(r';\s*$', '\n'.join(linhas), flags=re.M) if s.strip()]
+
+
+def load(directory=MIGRATIONS_DIR):
+    migracoes = []
+    for arquivo in sorted(os.listdir(directory)):
+        casamento = FILE_RE.match(arquivo)
+        if casamento:
+            migracoes.append(Migration(casamento.group(1), casamento.group(2), os.path.join(directory, arquivo)))
+    versoes = [m.version for m in migracoes]
+    if len(set(versoes)) != len(versoes):
+        raise ValueError("Versões de migração repetidas em " + directory)
+    return migracoes
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+
+
+def _applied(cursor):
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def _record(cursor, migracao):
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, applied_at) VALUES (%s, %s, %s, NOW())",
+        (migracao.version, migracao.name, migracao.checksum),
+    )
+
+
+def _lock(cursor):
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError(f"Outra migração em andamento (trava '{LOCK_NAME}')")
+
+
+def _unlock(cursor):
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    cursor.fetchall()
+
+
+# (migracao, estado) pra cada arquivo: applied, pending ou changed (o arquivo
+# mudou depois de aplicado)
+def status(conn, migracoes=None):
+    migracoes = load() if migracoes is None else migracoes
+    cursor = conn.cursor()
+    try:
+        _ensure_table(cursor)
+        aplicadas = _applied(cursor)
+    finally:
+        cursor.close()
+    resultado = []
+    for m in migracoes:
+        if m.version not in aplicadas:
+            resultado.append((m, 'pending'))
+        elif aplicadas[m.version] != m.checksum:
+            resultado.append((m, 'changed'))
+        else:
+            resultado.append((m, 'applied'))
+    return resultado
+
+
+# Aplica as pendentes em ordem e devolve as que rodaram. on_apply(migracao)
+# e chamado antes de cada uma (pra log).
+def migrate(conn, migracoes=None, on_apply=None):
+    migracoes = load() if migracoes is None else migracoes
+    cursor = conn.cursor()
+    try:
+        _lock(cursor)
+        try:
+            _ensure_table(cursor)
+            aplicadas = _applied(cursor)
+            executadas = []
+            for m in migracoes:
+                if m.version in aplicadas:
+                    continue
+                if on_apply is not None:
+                    on_apply(m)
+                for statement in m.statements():
+                    cursor.execute(statement)
+                _record(cursor, m)
+                conn.commit()
+                executadas.append(m)
+            return executadas
+        finally:
+            _unlock(cursor)
+    finally:
+        cursor.close()
+
+
+# Registra como aplicadas, sem executar, as migracoes ate `version`
+def baseline(conn, version, migracoes=None):
+    migracoes = load() if migracoes is None else migracoes
+    cursor = conn.cursor()
+    try:
+        _ensure_table(cursor)
+        aplicadas = _applied(cursor)
+        marcadas = []
+        for m in migracoes:
+            if int(m.version) <= int(version) and m.version not in aplicadas:
+                _record(cursor, m)
+                marcadas.append(m)
+        conn.commit()
+        return marcadas
+    finally:
+        cursor.close()
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Migrações de schema")
+    parser.add_argument('comando', nargs='?', default='up', choices=('up', 'status', 'baseline'))
+    parser.add_argument('version', nargs='?', help="última versão já aplicada (baseline)")
+    args = parser.parse_args()
+    if args.comando == 'baseline' and not args.version:
+        parser.error("baseline precisa da versão, ex.: python migrate.py baseline 0006")
+
+    config = {
+        'host': os.getenv('DB_HOST'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'database': os.getenv('DB_NAME'),
+        'port': int(os.getenv('DB_PORT', 24111)),
+    }
+    if os.getenv('DB_SSL_CA', 'ca.pem'):
+        config['ssl_ca'] = os.getenv('DB_SSL_CA', 'ca.pem')
+        config['ssl_verify_cert'] = True
+
+    conn = mysql.connector.connect(**config)
+    try:
+        if args.comando == 'up':
+            executadas = migrate(conn, on_apply=lambda m: print(f"aplicando {m.version}_{m.name}"))
+            print(f"{len(executadas)} migrações aplicadas")
+        elif args.comando == 'baseline':
+            for m in baseline(conn, args.version):
+                print(f"marcada {m.version}_{m.name}")
+        else:
+            alteradas = 0
+            for m, estado in status(conn):
+                alteradas += estado == 'changed'
+                print(f"{m.version}_{m.name}: {estado}")
+            if alteradas:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+-- Índices de busca (GET /livro/search e GET /usuario/search)
+-- O InnoDB mantém os índices FULLTEXT a cada INSERT/UPDATE/DELETE.
+-- As colunas precisam de collation accent-insensitive (utf8mb4_0900_ai_ci,
+-- o padrão do MySQL 8) pra "sertao" achar "Sertão".
+ALTER TABLE livros ADD FULLTEXT INDEX ft_livros_titulo_autor (titulo, autor);
+ALTER TABLE usuarios ADD FULLTEXT INDEX ft_usuarios_nome_email (nome, email);
@@ -0,0 +1,5 @@
+-- Índices de cobertura para as listagens com ?fields= (ex.: um dropdown que
+-- só pede id e titulo lê o índice em vez da tabela inteira)
+CREATE INDEX idx_livros_titulo ON livros (titulo);
+CREATE INDEX idx_usuarios_nome ON usuarios (nome);
+CREATE INDEX idx_emprestimos_usuario_livro_data ON emprestimos (usuario_id, livro_id, data_emprestimo);
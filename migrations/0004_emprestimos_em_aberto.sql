@@ -0,0 +1,26 @@
+-- Empréstimos em aberto (checkout/devolução)
+-- livro_em_aberto só tem valor enquanto o empréstimo não foi devolvido, então
+-- o índice único permite no máximo um empréstimo aberto por livro e responde
+-- "o livro está disponível?" sem varrer a tabela. A coluna é INVISIBLE pra
+-- não aparecer nos SELECT * (MySQL 8.0.23+).
+--
+-- Antes do índice, o POST /emprestimo nunca preenchia data_devolucao: um livro
+-- emprestado duas vezes tem dois empréstimos "abertos" e o índice único não
+-- seria criado. Fica aberto só o mais recente de cada livro; os anteriores são
+-- dados como devolvidos na data em que o livro foi emprestado de novo.
+UPDATE emprestimos e
+    JOIN (
+        SELECT livro_id, MAX(id) AS ultimo
+        FROM emprestimos
+        WHERE data_devolucao IS NULL AND livro_id IS NOT NULL
+        GROUP BY livro_id
+        HAVING COUNT(*) > 1
+    ) abertos ON abertos.livro_id = e.livro_id
+    JOIN emprestimos ultimo ON ultimo.id = abertos.ultimo
+SET e.data_devolucao = GREATEST(e.data_emprestimo, ultimo.data_emprestimo)
+WHERE e.data_devolucao IS NULL AND e.id < abertos.ultimo;
+
+ALTER TABLE emprestimos
+    ADD COLUMN livro_em_aberto INT AS (IF(data_devolucao IS NULL, livro_id, NULL)) VIRTUAL INVISIBLE,
+    ADD UNIQUE INDEX uq_emprestimos_livro_em_aberto (livro_em_aberto),
+    ADD INDEX idx_emprestimos_usuario_aberto (usuario_id, data_devolucao);
@@ -0,0 +1,2 @@
+-- Exportação incremental de empréstimos por data (GET /emprestimo/export?from=)
+CREATE INDEX idx_emprestimos_data ON emprestimos (data_emprestimo);
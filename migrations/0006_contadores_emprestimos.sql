@@ -0,0 +1,35 @@
+-- Contadores de empréstimos (GET /stats/...), mantidos pela aplicação na
+-- mesma transação de cada escrita em emprestimos (ver aggregates.py). Os
+-- índices por total respondem os "mais emprestados" lendo só N linhas.
+-- `python aggregates.py rebuild` recalcula as três tabelas.
+CREATE TABLE emprestimos_por_usuario (
+    usuario_id INT PRIMARY KEY,
+    total INT NOT NULL,
+    INDEX idx_emprestimos_por_usuario_total (total DESC, usuario_id)
+);
+
+CREATE TABLE emprestimos_por_livro (
+    livro_id INT PRIMARY KEY,
+    total INT NOT NULL,
+    INDEX idx_emprestimos_por_livro_total (total DESC, livro_id)
+);
+
+-- Todo empréstimo novo soma no dia de hoje: o dia é dividido em linhas
+-- (dia, slot) pra que as transações não esperem a trava de uma linha só.
+-- A leitura soma os slots do dia.
+CREATE TABLE emprestimos_por_dia (
+    dia DATE NOT NULL,
+    slot TINYINT UNSIGNED NOT NULL DEFAULT 0,
+    total INT NOT NULL,
+    PRIMARY KEY (dia, slot)
+);
+
+-- Contagem inicial a partir dos empréstimos que já existem
+INSERT INTO emprestimos_por_usuario (usuario_id, total)
+SELECT usuario_id, COUNT(*) FROM emprestimos WHERE usuario_id IS NOT NULL GROUP BY usuario_id;
+
+INSERT INTO emprestimos_por_livro (livro_id, total)
+SELECT livro_id, COUNT(*) FROM emprestimos WHERE livro_id IS NOT NULL GROUP BY livro_id;
+
+INSERT INTO emprestimos_por_dia (dia, total)
+SELECT data_emprestimo, COUNT(*) FROM emprestimos GROUP BY data_emprestimo;
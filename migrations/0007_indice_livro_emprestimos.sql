@@ -0,0 +1,5 @@
+-- Empréstimos de um livro (DELETE /livro/<id> desconta os contadores lendo
+-- usuario_id, livro_id e data_emprestimo de cada empréstimo do livro). Cobre
+-- a leitura como o idx_emprestimos_usuario_livro_data cobre a do usuário e
+-- substitui o índice que o MySQL cria sozinho pra FK de livro_id.
+CREATE INDEX idx_emprestimos_livro_usuario_data ON emprestimos (livro_id, usuario_id, data_emprestimo);
@@ -0,0 +1,24 @@
+-- Jobs de purge em lote (POST /usuario/purge e /livro/purge). O status fica
+-- no banco pra que GET /purge/<id> responda de qualquer worker; o pedido
+-- guarda a lista de ids ou o filtro em JSON. owner é o worker que roda o job
+-- e updated_at o lease dele (renovado a cada bloco); last_owner_id é o último
+-- usuário/livro terminado, de onde outro worker continua se o dono morrer.
+CREATE TABLE purge_jobs (
+    id CHAR(32) PRIMARY KEY,
+    recurso VARCHAR(16) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    pedido MEDIUMTEXT NOT NULL,
+    owners_total INT,
+    owners_deleted INT NOT NULL DEFAULT 0,
+    emprestimos_deleted INT NOT NULL DEFAULT 0,
+    chunks INT NOT NULL DEFAULT 0,
+    chunk_size INT,
+    throttled_ms BIGINT NOT NULL DEFAULT 0,
+    error TEXT,
+    owner VARCHAR(128),
+    last_owner_id INT,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    finished_at DATETIME,
+    INDEX idx_purge_jobs_status (status, updated_at)
+);
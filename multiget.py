@@ -0,0 +1,81 @@
+import os
+
+import mysql.connector
+from flask import jsonify
+
+from fields import project, select_list
+from replicas import primary_requested, replica_read
+from table_versions import unversioned
+
+MULTIGET_CHUNK_SIZE = int(os.getenv('MULTIGET_CHUNK_SIZE', 1000))
+MULTIGET_MAX_IDS = int(os.getenv('MULTIGET_MAX_IDS', 10000))
+
+
+# Aceita "1,2,3" (query string) ou [1, 2, 3] (corpo JSON). Ids repetidos
+# sao consultados uma vez so.
+def parse_ids(valor):
+    if isinstance(valor, str):
+        valor = [v for v in valor.split(',') if v.strip()]
+    if not isinstance(valor, list) or not valor:
+        raise ValueError("Informe uma lista de ids")
+    ids = []
+    for v in valor:
+        if isinstance(v, bool):
+            raise ValueError(f"Id inválido: {v}")
+        try:
+            ids.append(int(v))
+        except (TypeError, ValueError):
+            raise ValueError(f"Id inválido: {v}")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MULTIGET_MAX_IDS:
+        raise ValueError(f"No máximo {MULTIGET_MAX_IDS} ids por requisição")
+    return ids
+
+
+# Busca varias linhas por id numa conexao so: primeiro no cache de entidades,
+# depois o que faltou com WHERE id IN (...) em blocos de MULTIGET_CHUNK_SIZE.
+# Responde um mapa id -> linha e a lista de ids que nao existem.
+# Com campos (?fields=) so essas colunas sao lidas, e as linhas parciais nao
+# vao pro cache. Linhas lidas de replica tambem nao (podem estar atrasadas), e
+# com ?consistency=primary o cache nao e consultado.
+def multiget_response(conect_db, cache, entidade, tabela, ids, campos=None):
+    encontrados = {}
+    faltando = []
+    for id in ids:
+        linha = None if primary_requested() else cache.get(entidade, id)
+        if linha is None:
+            faltando.append(id)
+        else:
+            encontrados[id] = project(linha, campos)
+    if encontrados:
+        # linha do cache pode ser mais velha que a versao lida pro ETag
+        unversioned()
+
+    if faltando:
+        conn = conect_db()
+        if not (conn and conn.is_connected()):
+            return jsonify({"status": "error", "message": "Erro ao conectar ao banco de dados"}), 500
+        try:
+            cacheable = campos is None and not replica_read()
+            cursor = conn.cursor(dictionary=True)
+            try:
+                for inicio in range(0, len(faltando), MULTIGET_CHUNK_SIZE):
+                    bloco = faltando[inicio:inicio + MULTIGET_CHUNK_SIZE]
+                    marcadores = ', '.join(['%s'] * len(bloco))
+                    cursor.execute(f"SELECT {select_list(campos)} FROM {tabela} WHERE id IN ({marcadores})", bloco)
+                    for linha in cursor.fetchall():
+                        encontrados[linha['id']] = linha
+                        if cacheable:
+                            cache.set(entidade, linha['id'], linha)
+            finally:
+                cursor.close()
+        except mysql.connector.Error as err:
+            return jsonify({"status": "error", "message": f"Erro ao buscar {tabela}, {err}"}), 500
+        finally:
+            conn.close()
+
+    return jsonify({
+        "status": "ok",
+        "data": {str(id): encontrados[id] for id in ids if id in encontrados},
+        "missing": [id for id in ids if id not in encontrados],
+    }), 200
@@ -0,0 +1,238 @@
+import glob
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, jsonify, request
+
+PROFILE_HEADER = 'X-Profile'
+
+
+# Profiler por amostragem dos requests. Um request entra no profile quando
+# manda o header X-Profile com o token ou quando e sorteado (sample_rate,
+# opcionalmente so nas rotas de `routes`). Enquanto ele roda, uma thread le a
+# pilha da thread do request a cada `interval` segundos e conta as pilhas no
+# formato "collapsed" (frames separados por ';'), agrupadas por rota.
+#
+# Sem PROFILE_TOKEN nada e registrado no app: nenhum hook por request e
+# nenhuma thread, entao desligado o custo e zero. Cada processo grava as suas
+# pilhas em PROFILE_DIR; o download junta os arquivos de todos os workers.
+class Profiler:
+    def __init__(self, token, directory, sample_rate=0.0, interval=0.005, routes=None, max_depth=128):
+        self.token = token
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.routes = routes
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = {}
+        self._profiles = {}
+        self._thread = None
+        self._pid = None
+        self._epoch = None
+
+    @classmethod
+    def from_env(cls):
+        rotas = [r.strip() for r in os.getenv('PROFILE_ROUTES', '').split(',') if r.strip()]
+        return cls(
+            os.getenv('PROFILE_TOKEN', ''),
+            os.getenv('PROFILE_DIR', '/tmp/app_profiles'),
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+            interval=float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000,
+            routes=set(rotas) or None,
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+        # Resumo por rota: requests com profile e amostras
+        @app.route('/profile', methods=['GET'])
+        def estatisticas_profile():
+            if not self._authorized(request.headers.get(PROFILE_HEADER)):
+                return jsonify({"status": "error", "message": "Token de profile inválido"}), 403
+            return jsonify(self.summary())
+
+        # Pilhas no formato collapsed (flamegraph.pl, speedscope, inferno).
+        # ?route= filtra uma rota; sem ele cada pilha comeca pelo nome da rota.
+        @app.route('/profile/collapsed', methods=['GET'])
+        def estatisticas_profile_collapsed():
+            if not self._authorized(request.headers.get(PROFILE_HEADER)):
+                return jsonify({"status": "error", "message": "Token de profile inválido"}), 403
+            rota = request.args.get('route')
+            nome = f"profile-{rota or 'all'}.folded"
+            return Response(self.collapsed(rota), mimetype='text/plain',
+                            headers={'Content-Disposition': f"attachment; filename={nome}"})
+
+        @app.route('/profile', methods=['DELETE'])
+        def estatisticas_profile_reset():
+            if not self._authorized(request.headers.get(PROFILE_HEADER)):
+                return jsonify({"status": "error", "message": "Token de profile inválido"}), 403
+            self.reset()
+            return jsonify({"status": "ok", "message": "Profiles apagados"})
+
+    def _authorized(self, valor):
+        return bool(valor) and hmac.compare_digest(valor.encode(), self.token.encode())
+
+    def _before_request(self):
+        rota = request.endpoint
+        if rota is None or rota.startswith('estatisticas_profile'):
+            return None
+        pedido = request.headers.get(PROFILE_HEADER)
+        if pedido is not None:
+            if not self._authorized(pedido):
+                return None
+        elif not (self.sample_rate and random.random() < self.sample_rate
+                  and (self.routes is None or rota in self.routes)):
+            return None
+        self._start(rota)
+        return None
+
+    def _teardown_request(self, exc):
+        self._stop()
+
+    def _start(self, rota):
+        self._ensure_thread()
+        with self._lock:
+            self._active[threading.get_ident()] = (rota, Counter())
+            self._wake.set()
+
+    def _stop(self):
+        with self._lock:
+            ativo = self._active.pop(threading.get_ident(), None)
+        if ativo is None:
+            return
+        epoch = self._read_epoch()
+        with self._lock:
+            # um reset feito em outro worker apaga tambem o que este acumulou
+            if epoch != self._epoch:
+                self._profiles.clear()
+                self._epoch = epoch
+            rota, pilhas = ativo
+            profile = self._profiles.setdefault(rota, {'requests': 0, 'samples': 0, 'stacks': Counter()})
+            profile['requests'] += 1
+            profile['samples'] += sum(pilhas.values())
+            profile['stacks'].update(pilhas)
+        self.flush()
+
+    # A thread nao sobrevive ao fork; cada worker sobe a sua no primeiro uso
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._active.clear()
+                self._profiles.clear()
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    # Dorme enquanto nenhum request estiver em profile
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                alvos = list(self._active.items())
+            if not alvos:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            amostras = [(ident, self._collapse(frames[ident])) for ident, _ in alvos if ident in frames]
+            with self._lock:
+                for ident, pilha in amostras:
+                    ativo = self._active.get(ident)
+                    if ativo is not None:
+                        ativo[1][pilha] += 1
+            time.sleep(self.interval)
+
+    # Da raiz pra folha: "funcao (modulo:linha da def);..."
+    def _collapse(self, frame):
+        pilha = []
+        while frame is not None and len(pilha) < self.max_depth:
+            code = frame.f_code
+            pilha.append(f"{code.co_name} ({frame.f_globals.get('__name__', '?')}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(pilha))
+
+    # Grava o estado deste processo (escrita atomica via rename)
+    def flush(self):
+        with self._lock:
+            data = {rota: {'requests': p['requests'], 'samples': p['samples'], 'stacks': dict(p['stacks'])}
+                    for rota, p in self._profiles.items()}
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    # Junta os arquivos de todos os workers (inclusive os ja reciclados)
+    def _merged(self):
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for rota, p in data.items():
+                alvo = merged.setdefault(rota, {'requests': 0, 'samples': 0, 'stacks': Counter()})
+                alvo['requests'] += p['requests']
+                alvo['samples'] += p['samples']
+                alvo['stacks'].update(p['stacks'])
+        return merged
+
+    def summary(self):
+        return {
+            'interval_ms': self.interval * 1000,
+            'sample_rate': self.sample_rate,
+            'routes': {rota: {'requests': p['requests'], 'samples': p['samples']}
+                       for rota, p in sorted(self._merged().items())},
+        }
+
+    def collapsed(self, rota=None):
+        linhas = []
+        for nome, p in sorted(self._merged().items()):
+            if rota is not None and nome != rota:
+                continue
+            for pilha, total in p['stacks'].most_common():
+                linhas.append(f"{pilha if rota else nome + ';' + pilha} {total}")
+        return '\n'.join(linhas) + '\n' if linhas else ''
+
+    def _read_epoch(self):
+        try:
+            with open(os.path.join(self.directory, 'epoch')) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    # Apaga os arquivos e troca o epoch, pra que cada worker descarte o que
+    # tem em memoria no proximo request com profile
+    def reset(self):
+        epoch = f"{os.getpid()}-{time.time()}"
+        tmp = os.path.join(self.directory, 'epoch.tmp')
+        with open(tmp, 'w') as f:
+            f.write(epoch)
+        os.replace(tmp, os.path.join(self.directory, 'epoch'))
+        with self._lock:
+            self._profiles.clear()
+            self._epoch = epoch
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
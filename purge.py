@@ -0,0 +1,466 @@
+import bisect
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import aggregates
+
+PURGE_MAX_IDS = int(os.getenv('PURGE_MAX_IDS', 100000))
+
+# recurso -> (tabela, coluna em emprestimos, campos aceitos no filtro)
+TARGETS = {
+    'usuario': ('usuarios', 'usuario_id', ('nome', 'email')),
+    'livro': ('livros', 'livro_id', ('autor', 'titulo')),
+}
+
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+JOB_FIELDS = ('id', 'recurso', 'status', 'owners_total', 'owners_deleted', 'emprestimos_deleted',
+              'chunks', 'chunk_size', 'throttled_ms', 'error', 'owner', 'created_at', 'updated_at', 'finished_at')
+
+# Estado que um job retomado por outro worker precisa (ver _claim)
+RESUME_FIELDS = ('recurso', 'pedido', 'owners_deleted', 'emprestimos_deleted', 'chunks', 'chunk_size',
+                 'throttled_ms', 'last_owner_id')
+
+
+class PurgeCancelled(Exception):
+    pass
+
+
+# Corpo do POST: {"ids": [1, 2, 3]} ou {"filter": {"autor": "Fulano"}}
+# (igualdade em todos os campos). Levanta ValueError com a mensagem do 400.
+def read_purge_request(recurso, data):
+    if not isinstance(data, dict) or ('ids' in data) == ('filter' in data):
+        raise ValueError("Informe 'ids' (lista) ou 'filter' (objeto)")
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("'ids' deve ser uma lista não vazia")
+        if len(ids) > PURGE_MAX_IDS:
+            raise ValueError(f"No máximo {PURGE_MAX_IDS} ids por purge")
+        if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError("'ids' deve conter só inteiros")
+        return {'ids': sorted(set(ids))}
+
+    filtro = data['filter']
+    aceitos = TARGETS[recurso][2]
+    if not isinstance(filtro, dict) or not filtro:
+        raise ValueError("'filter' deve ser um objeto não vazio")
+    invalidos = [c for c in filtro if c not in aceitos]
+    if invalidos:
+        raise ValueError(f"Campos de filtro não suportados: {', '.join(invalidos)}. Campos aceitos: {', '.join(aceitos)}.")
+    if not all(isinstance(v, str) for v in filtro.values()):
+        raise ValueError("Os valores de 'filter' devem ser strings")
+    return {'filter': filtro}
+
+
+# Purge de usuarios/livros em lote, fora do request. Os emprestimos de cada
+# dono sao apagados antes, em transacoes curtas de ate chunk_size linhas; o
+# tamanho do bloco cai pela metade quando uma transacao passa de
+# max_chunk_time e volta a crescer quando ela fica rapida. Entre um bloco e
+# outro o job espera enquanto a replicacao (lag_fn) estiver acima de max_lag
+# ou houver mais que max_lock_waits transacoes esperando lock. Os contadores
+# de aggregates sao descontados na mesma transacao de cada bloco.
+#
+# O status fica na tabela purge_jobs (GET /purge/<id> de qualquer worker) e a
+# fila dos jobs e do processo: um job por vez em cada worker. O worker que
+# roda um job e o dono dele (coluna owner) enquanto o updated_at for mais
+# novo que `lease` segundos; cada bloco renova. Se o worker morre, qualquer
+# outro assume o job depois que o lease vence e continua do ultimo dono
+# terminado (last_owner_id).
+class PurgeJobs:
+    def __init__(self, conect_db, chunk_size=500, min_chunk_size=10, max_chunk_time=0.2, pause=0.01,
+                 lag_fn=None, max_lag=1.0, max_lock_waits=5, throttle_sleep=0.5, max_throttle=300.0,
+                 lease=60.0, on_commit=None):
+        self.conect_db = conect_db
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min(min_chunk_size, chunk_size)
+        self.max_chunk_time = max_chunk_time
+        self.pause = pause
+        self.lag_fn = lag_fn
+        self.max_lag = max_lag
+        self.max_lock_waits = max_lock_waits
+        self.throttle_sleep = throttle_sleep
+        self.max_throttle = max_throttle
+        self.lease = lease
+        self.on_commit = on_commit
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._owner = None
+        self._stats = {'jobs': 0, 'chunks': 0, 'emprestimos_deleted': 0, 'owners_deleted': 0,
+                       'throttles': 0, 'retries': 0, 'failures': 0, 'resumed': 0}
+
+    @classmethod
+    def from_env(cls, conect_db, lag_fn=None, on_commit=None):
+        return cls(
+            conect_db,
+            chunk_size=int(os.getenv('PURGE_CHUNK_SIZE', 500)),
+            min_chunk_size=int(os.getenv('PURGE_MIN_CHUNK_SIZE', 10)),
+            max_chunk_time=float(os.getenv('PURGE_MAX_CHUNK_MS', 200)) / 1000,
+            pause=float(os.getenv('PURGE_PAUSE_MS', 10)) / 1000,
+            lag_fn=lag_fn,
+            max_lag=float(os.getenv('PURGE_MAX_LAG', 1)),
+            max_lock_waits=int(os.getenv('PURGE_MAX_LOCK_WAITS', 5)),
+            throttle_sleep=float(os.getenv('PURGE_THROTTLE_SLEEP_MS', 500)) / 1000,
+            max_throttle=float(os.getenv('PURGE_MAX_THROTTLE', 300)),
+            lease=float(os.getenv('PURGE_LEASE', 60)),
+            on_commit=on_commit,
+        )
+
+    # Registra o job (status queued) e devolve o id; o trabalho roda na thread
+    def submit(self, recurso, pedido):
+        job_id = uuid.uuid4().hex
+        tabela, _, _ = TARGETS[recurso]
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                if 'ids' in pedido:
+                    total = len(pedido['ids'])
+                else:
+                    cursor.execute(f"SELECT COUNT(*) FROM {tabela}" + _where(pedido['filter']), tuple(pedido['filter'].values()))
+                    total = cursor.fetchone()[0]
+                cursor.execute(
+                    "INSERT INTO purge_jobs (id, recurso, status, pedido, owners_total, created_at, updated_at) "
+                    "VALUES (%s, %s, 'queued', %s, %s, NOW(), NOW())",
+                    (job_id, recurso, json.dumps(pedido), total),
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        self.start()
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM purge_jobs WHERE id = %s", (job_id,))
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    # Marca como cancelled; o job para no proximo bloco (o bloco em andamento
+    # e desfeito). Devolve False se o job nao existe ou ja terminou.
+    def cancel(self, job_id):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "UPDATE purge_jobs SET status = 'cancelled', finished_at = NOW(), updated_at = NOW() "
+                    "WHERE id = %s AND status IN ('queued', 'running')",
+                    (job_id,),
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = self.conect_db()
+        if not (conn and conn.is_connected()):
+            raise mysql.connector.InterfaceError(msg="Erro ao conectar ao banco de dados")
+        return conn
+
+    # Sobe a thread do processo. A thread nao sobrevive ao fork: cada worker
+    # chama no startup (pra tambem assumir jobs abandonados) ou no 1o submit.
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                self._thread = threading.Thread(target=self._run, name='purge', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    # Sem job na fila, procura a cada meio lease um job com o lease vencido
+    def _run(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.lease / 2)
+                job = self._claim(job_id)
+            except queue.Empty:
+                job_id, job = self._claim_expired()
+            except mysql.connector.Error:
+                continue
+            if job is None:
+                continue
+            try:
+                self._execute(job_id, job)
+            except Exception as err:
+                self._count('failures')
+                try:
+                    self._finish(job_id, 'failed', str(err))
+                except mysql.connector.Error:
+                    pass
+
+    def _execute(self, job_id, job):
+        self._count('jobs')
+        recurso = job['recurso']
+        try:
+            for owner_id in self._owners(recurso, json.loads(job['pedido']), job['last_owner_id']):
+                acabou = False
+                while not acabou:
+                    try:
+                        acabou = self._chunk(job_id, job, recurso, owner_id)
+                    except mysql.connector.Error as err:
+                        if err.errno not in RETRYABLE_ERRORS:
+                            raise
+                        # deadlock ou lock wait timeout: tenta de novo com um bloco menor
+                        self._count('retries')
+                        job['chunk_size'] = max(self.min_chunk_size, job['chunk_size'] // 2)
+                    self._throttle(job_id, job)
+        except PurgeCancelled:
+            return
+        self._finish(job_id, 'done', None)
+
+    # Job da fila local: so roda se ainda estiver queued (outro worker pode
+    # te-lo assumido enquanto esperava na fila)
+    def _claim(self, job_id):
+        return self._take("id = %s AND status = 'queued'", (job_id,), job_id)
+
+    # Job queued ou running cujo dono parou de renovar o lease
+    def _claim_expired(self):
+        vencido = "status IN ('queued', 'running') AND updated_at < NOW() - INTERVAL %s SECOND"
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT id FROM purge_jobs WHERE {vencido} ORDER BY updated_at LIMIT 1",
+                               (int(self.lease),))
+                linha = cursor.fetchone()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        if linha is None:
+            return None, None
+        job = self._take(f"id = %s AND {vencido}", (linha[0], int(self.lease)), linha[0])
+        if job is not None:
+            self._count('resumed')
+        return linha[0], job
+
+    # Passa o job pra running com este worker como dono e le o estado pra
+    # continuar de onde parou. None se a condicao nao bateu (outro levou).
+    def _take(self, condicao, params, job_id):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(f"UPDATE purge_jobs SET status = 'running', owner = %s, updated_at = NOW() WHERE {condicao}",
+                               (self._owner,) + params)
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return None
+                cursor.execute(f"SELECT {', '.join(RESUME_FIELDS)} FROM purge_jobs WHERE id = %s", (job_id,))
+                job = cursor.fetchone()
+                conn.commit()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        job['chunk_size'] = job['chunk_size'] or self.chunk_size
+        return job
+
+    # Ids dos donos em ordem crescente, depois de `depois` (ultimo dono ja
+    # terminado): a lista do pedido ou o filtro lido em paginas por id
+    def _owners(self, recurso, pedido, depois=None):
+        if 'ids' in pedido:
+            ids = pedido['ids']
+            yield from ids[bisect.bisect_right(ids, depois):] if depois is not None else ids
+            return
+        tabela, _, _ = TARGETS[recurso]
+        filtro = pedido['filter']
+        ultimo = depois or 0
+        while True:
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        f"SELECT id FROM {tabela}" + _where(filtro) + " AND id > %s ORDER BY id LIMIT %s",
+                        tuple(filtro.values()) + (ultimo, self.chunk_size),
+                    )
+                    ids = [linha[0] for linha in cursor.fetchall()]
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
+            if not ids:
+                return
+            yield from ids
+            ultimo = ids[-1]
+
+    # Um bloco numa transacao: ate chunk_size emprestimos do dono ou, quando
+    # nao sobra nenhum, o proprio dono. Devolve True quando o dono acabou.
+    # O progresso e gravado na mesma transacao (e renova o lease); se o job
+    # foi cancelado ou assumido por outro worker o UPDATE nao acha a linha
+    # 'running' deste dono e o bloco e desfeito.
+    def _chunk(self, job_id, job, recurso, owner_id):
+        tabela, coluna, _ = TARGETS[recurso]
+        conn = self._connect()
+        inicio = time.monotonic()
+        try:
+            # cursor comum: o DELETE ... IN muda de tamanho a cada bloco e
+            # encheria o cache de prepared statements da conexao
+            cursor = conn.cursor(buffered=True)
+            try:
+                cursor.execute(
+                    f"SELECT id, usuario_id, livro_id, data_emprestimo FROM emprestimos WHERE {coluna} = %s "
+                    "ORDER BY id LIMIT %s FOR UPDATE",
+                    (owner_id, job['chunk_size']),
+                )
+                linhas = cursor.fetchall()
+                emprestimo_ids = [linha[0] for linha in linhas]
+                dono_apagado = False
+                if linhas:
+                    aggregates.apply(cursor, removidas=[linha[1:] for linha in linhas])
+                    marcadores = ', '.join(['%s'] * len(emprestimo_ids))
+                    cursor.execute(f"DELETE FROM emprestimos WHERE id IN ({marcadores})", emprestimo_ids)
+                    job['emprestimos_deleted'] += cursor.rowcount
+                else:
+                    # emprestimos que chegaram depois do ultimo bloco saem aqui
+                    # pelo cascade, ja descontados dos contadores
+                    aggregates.before_owner_delete(cursor, coluna, owner_id)
+                    cursor.execute(f"DELETE FROM {tabela} WHERE id = %s", (owner_id,))
+                    dono_apagado = cursor.rowcount > 0
+                    job['owners_deleted'] += dono_apagado
+                job['chunks'] += 1
+                if not linhas:
+                    job['last_owner_id'] = owner_id
+                cursor.execute(
+                    "UPDATE purge_jobs SET owners_deleted = %s, emprestimos_deleted = %s, chunks = %s, "
+                    "chunk_size = %s, throttled_ms = %s, last_owner_id = %s, updated_at = NOW() "
+                    "WHERE id = %s AND status = 'running' AND owner = %s",
+                    (job['owners_deleted'], job['emprestimos_deleted'], job['chunks'], job['chunk_size'],
+                     job['throttled_ms'], job['last_owner_id'], job_id, self._owner),
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    raise PurgeCancelled()
+                conn.commit()
+            except mysql.connector.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._stats['chunks'] += 1
+            self._stats['emprestimos_deleted'] += len(emprestimo_ids)
+            self._stats['owners_deleted'] += dono_apagado
+        if self.on_commit is not None:
+            self.on_commit(recurso, owner_id if dono_apagado else None, emprestimo_ids)
+
+        decorrido = time.monotonic() - inicio
+        if decorrido > self.max_chunk_time:
+            job['chunk_size'] = max(self.min_chunk_size, job['chunk_size'] // 2)
+        elif decorrido < self.max_chunk_time / 2:
+            job['chunk_size'] = min(self.chunk_size, job['chunk_size'] * 2)
+        return not linhas
+
+    # Pausa entre blocos; espera mais enquanto a replica estiver atrasada ou
+    # houver muita gente esperando lock. Desiste depois de max_throttle segundos.
+    # Uma espera longa renova o lease a cada terco dele.
+    def _throttle(self, job_id, job):
+        time.sleep(self.pause)
+        inicio = renovado = time.monotonic()
+        while self._overloaded():
+            if time.monotonic() - inicio > self.max_throttle:
+                raise RuntimeError(f"Banco sobrecarregado (replicação ou locks) por mais de {self.max_throttle:.0f}s")
+            self._count('throttles')
+            time.sleep(self.throttle_sleep)
+            job['throttled_ms'] += int(self.throttle_sleep * 1000)
+            if time.monotonic() - renovado > self.lease / 3:
+                self._heartbeat(job_id, job)
+                renovado = time.monotonic()
+
+    # throttled_ms sempre cresce entre duas renovacoes, entao rowcount 0 quer
+    # dizer que o job nao e mais deste worker (cancelado ou assumido)
+    def _heartbeat(self, job_id, job):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("UPDATE purge_jobs SET throttled_ms = %s, updated_at = NOW() "
+                               "WHERE id = %s AND status = 'running' AND owner = %s",
+                               (job['throttled_ms'], job_id, self._owner))
+                conn.commit()
+                if cursor.rowcount == 0:
+                    raise PurgeCancelled()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _overloaded(self):
+        if self.lag_fn is not None:
+            lag = self.lag_fn()
+            if lag is not None and lag > self.max_lag:
+                return True
+        return self._lock_waits() > self.max_lock_waits
+
+    def _lock_waits(self):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT VARIABLE_VALUE FROM performance_schema.global_status "
+                               "WHERE VARIABLE_NAME = 'Innodb_row_lock_current_waits'")
+                linha = cursor.fetchone()
+                return int(linha[0]) if linha else 0
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, erro):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "UPDATE purge_jobs SET status = %s, error = %s, finished_at = NOW(), updated_at = NOW() "
+                    "WHERE id = %s AND status = 'running' AND owner = %s",
+                    (status, erro, job_id, self._owner),
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _count(self, chave):
+        with self._lock:
+            self._stats[chave] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+def _where(filtro):
+    return ' WHERE ' + ' AND '.join(f"{campo} = %s" for campo in filtro)
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+
+import mysql.connector
+from flask import g, has_request_context, jsonify, request
+
+from db_pool import ConnectionPool
+
+READ_METHODS = ('GET', 'HEAD')
+LAST_WRITE_COOKIE = 'last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+
+# Uma replica com o seu pool e o ultimo atraso medido
+class Replica:
+    def __init__(self, pool):
+        self.pool = pool
+        self.lag = None
+        self.checked_at = 0.0
+        self.error = None
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return f"{self.pool.config['host']}:{self.pool.config['port']}"
+
+    # Le o Seconds_Behind_Source. Replicacao parada (NULL), servidor que nao
+    # e replica ou erro de conexao deixam lag = None (replica fora de uso).
+    def check(self):
+        lag = None
+        try:
+            conn = self.pool.get_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                    status = cursor.fetchone()
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
+            if status is None:
+                self.error = "servidor não é réplica"
+            else:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                self.error = None if lag is not None else "replicação parada"
+        except mysql.connector.Error as err:
+            self.error = str(err)
+        self.lag = lag
+        self.checked_at = time.monotonic()
+
+    def as_dict(self):
+        return {"replica": self.name, "lag": self.lag, "error": self.error, "reads": self.reads}
+
+
+# Escolhe a conexao de cada request: escritas (e tudo fora de um request,
+# como a fila de escrita) vao pro primario; GET/HEAD vao pras replicas em
+# rodizio, desde que o atraso delas esteja abaixo de max_lag e seja menor que
+# o tempo desde a ultima escrita do cliente (read-your-writes). Senao o GET
+# tambem vai pro primario.
+class ReplicaRouter:
+    def __init__(self, primary, replicas=(), max_lag=1.0, check_interval=1.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = 0
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "fallbacks": 0}
+
+    # DB_REPLICAS="host:porta,host:porta" com o mesmo usuario/banco do primario
+    @classmethod
+    def from_env(cls, primary, config):
+        replicas = []
+        for endereco in os.getenv('DB_REPLICAS', '').split(','):
+            endereco = endereco.strip()
+            if not endereco:
+                continue
+            host, _, porta = endereco.partition(':')
+            replica_config = dict(config, host=host, port=int(porta or config['port']))
+            replicas.append(Replica(ConnectionPool.from_env(replica_config)))
+        return cls(
+            primary,
+            replicas,
+            max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', 1)),
+            check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 1)),
+        )
+
+    def init_app(self, app):
+        app.after_request(self._after_request)
+
+        @app.route('/replicas/stats', methods=['GET'])
+        def estatisticas_replicas():
+            return jsonify(self.stats_detail())
+
+    # Abre as conexoes minimas do primario e das replicas (startup do worker).
+    # Replica fora do ar fica sem uso ate o proximo check.
+    def warm(self):
+        self.primary.warm()
+        for replica in self.replicas:
+            try:
+                replica.pool.warm()
+            except mysql.connector.Error as err:
+                replica.error = str(err)
+                replica.lag = None
+
+    def get_connection(self, timeout=None):
+        if not self.replicas or not has_request_context() or request.method not in READ_METHODS:
+            return self.primary.get_connection(timeout)
+        if primary_requested():
+            self._stats["primary_reads"] += 1
+            return self.primary.get_connection(timeout)
+
+        desde_escrita = _since_last_write()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if not self._usable(replica, desde_escrita):
+                continue
+            try:
+                conn = replica.pool.get_connection(timeout)
+            except mysql.connector.Error as err:
+                replica.error = str(err)
+                replica.lag = None
+                continue
+            replica.reads += 1
+            self._stats["replica_reads"] += 1
+            g.replica_read = True
+            return conn
+
+        self._stats["fallbacks"] += 1
+        return self.primary.get_connection(timeout)
+
+    # O atraso e medido no maximo a cada check_interval segundos, por um
+    # request so; os outros usam a ultima medida
+    def _usable(self, replica, desde_escrita):
+        self._refresh(replica)
+        if replica.lag is None or replica.lag > self.max_lag:
+            return False
+        # Seconds_Behind_Source tem resolucao de 1s (0 quer dizer "menos de
+        # 1s") e a medida pode ter ate check_interval segundos de idade
+        atraso = replica.lag + 1 + (time.monotonic() - replica.checked_at)
+        return desde_escrita is None or desde_escrita > atraso
+
+    def _refresh(self, replica):
+        if time.monotonic() - replica.checked_at >= self.check_interval and replica._lock.acquire(blocking=False):
+            try:
+                replica.check()
+            finally:
+                replica._lock.release()
+
+    # Maior atraso entre as replicas em uso (None sem replicas), pra quem
+    # precisa segurar escritas grandes enquanto a replicacao esta atrasada
+    def replication_lag(self):
+        atrasos = []
+        for replica in self.replicas:
+            self._refresh(replica)
+            if replica.lag is not None:
+                atrasos.append(replica.lag)
+        return max(atrasos) if atrasos else None
+
+    # Marca as respostas de escrita com o horario do commit; o cliente devolve
+    # no cookie (automatico em navegadores/sessoes) ou no header X-Last-Write
+    def _after_request(self, response):
+        if self.replicas and request.method not in READ_METHODS and response.status_code < 400:
+            agora = f"{time.time():.3f}"
+            response.headers[LAST_WRITE_HEADER] = agora
+            response.set_cookie(LAST_WRITE_COOKIE, agora, max_age=60, httponly=True)
+        return response
+
+    def stats(self):
+        return dict(self._stats)
+
+    def stats_detail(self):
+        stats = self.stats()
+        stats["max_lag"] = self.max_lag
+        stats["replicas"] = [replica.as_dict() for replica in self.replicas]
+        return stats
+
+
+# O request atual leu de uma replica, que pode estar atras do primario
+def replica_read():
+    return has_request_context() and g.get('replica_read', False)
+
+
+# ?consistency=primary: o cliente quer o dado do primario (nem replica nem cache)
+def primary_requested():
+    return has_request_context() and request.args.get('consistency') == 'primary'
+
+
+def _since_last_write():
+    valor = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    if not valor:
+        return None
+    try:
+        return time.time() - float(valor)
+    except ValueError:
+        return None
@@ -0,0 +1,40 @@
+import os
+import re
+import unicodedata
+
+# innodb_ft_min_token_size do servidor (padrao 3): termos menores nao estao no indice
+SEARCH_MIN_TOKEN = int(os.getenv('SEARCH_MIN_TOKEN', 3))
+SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 20))
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+
+
+def strip_accents(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# Transforma o texto digitado numa busca booleana do FULLTEXT: todo termo e
+# obrigatorio (+) e aceita prefixo (*), entao "mem pos" acha "Memórias
+# Póstumas". Os operadores do modo booleano digitados pelo usuario viram
+# espaco. O indice usa collation accent-insensitive; tirar o acento aqui so
+# evita depender disso na string da busca.
+def build_boolean_query(q):
+    termos = re.findall(r'\w+', strip_accents(q).lower())
+    termos = [t for t in termos if len(t) >= SEARCH_MIN_TOKEN]
+    if not termos:
+        raise ValueError(f"A busca precisa de ao menos um termo com {SEARCH_MIN_TOKEN} letras ou mais")
+    return ' '.join(f"+{t}*" for t in termos)
+
+
+def read_search_args(args):
+    q = args.get('q', '').strip()
+    if not q:
+        raise ValueError("Parâmetro 'q' é obrigatório")
+    limit = args.get('limit', SEARCH_DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("Parâmetro 'limit' deve ser um inteiro")
+    if limit < 1:
+        raise ValueError("Parâmetro 'limit' deve ser maior que zero")
+    return build_boolean_query(q), min(limit, SEARCH_MAX_LIMIT)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(ROOT, 'aps-02')
+GUNICORN_CONF = os.path.join(ROOT, 'gunicorn.conf.py')
+
+# wsgi: o app Flask (aps-02/app.py) no gunicorn, pre-fork com threads
+# asgi: o app Quart (aps-02/app_async.py) no uvicorn, com driver e pool async
+MODES = ('wsgi', 'asgi')
+
+
+# Healthcheck do container: sai com 0 se o GET /ready responder 200
+def check_ready(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=3) as resposta:
+            return resposta.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sobe a API no modo WSGI ou ASGI")
+    parser.add_argument('--mode', choices=MODES, default=os.getenv('SERVER_MODE', 'wsgi'))
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 0)),
+                        help="0 = padrao do modo (wsgi: uma por CPU, asgi: 1)")
+    parser.add_argument('--check-ready', action='store_true', help="consulta o /ready local e sai")
+    args = parser.parse_args()
+
+    if args.check_ready:
+        sys.exit(0 if check_ready(args.port) else 1)
+
+    if args.mode == 'wsgi':
+        # o processo vira o master do gunicorn (sinais e exit code sao dele)
+        argv = [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONF, '--bind', f"{args.host}:{args.port}"]
+        if args.workers:
+            argv += ['--workers', str(args.workers)]
+            os.environ['WEB_CONCURRENCY'] = str(args.workers)
+        os.execv(sys.executable, argv)
+
+    # o app le o numero de workers (ex.: pra escolher o backend do cache)
+    os.environ['WEB_CONCURRENCY'] = str(args.workers or 1)
+    import uvicorn
+    uvicorn.run(
+        'app_async:app',
+        interface='asgi3',
+        app_dir=APP_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers or 1,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+import time
+
+import mysql.connector
+
+# Normalizacao do SQL em "fingerprint": literais viram ?, listas de IN e os
+# VALUES de um INSERT multi-row viram um item so, espacos e caixa somem
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_RE = re.compile(r"\bvalues\s*\([^()]*\)(?:\s*,\s*\([^()]*\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'replace')
+
+
+def fingerprint(sql):
+    fp = _STRING_RE.sub('?', sql)
+    fp = _PLACEHOLDER_RE.sub('?', fp)
+    fp = _SPACE_RE.sub(' ', fp).strip().lower()
+    fp = _NUMBER_RE.sub('?', fp)
+    fp = _IN_LIST_RE.sub('in (?+)', fp)
+    fp = _VALUES_RE.sub(lambda m: m.group(0)[:m.group(0).index(')') + 1] + ', ...', fp)
+    return fp
+
+
+# Cursor que mede cada execute; os lentos ficam pendentes e o EXPLAIN roda no
+# close(), quando a conexao ja nao tem resultado pendente pra ler
+class SlowQueryCursor:
+    def __init__(self, log, conn, cursor):
+        self._log = log
+        self._conn = conn
+        self._cursor = cursor
+        self._pending = []
+
+    def execute(self, operation, params=()):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params)
+        finally:
+            self._measure(operation, params, time.perf_counter() - t0)
+
+    def executemany(self, operation, seq_params):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            self._measure(operation, None, time.perf_counter() - t0)
+
+    def _measure(self, operation, params, elapsed):
+        if elapsed >= self._log.threshold:
+            self._pending.append((operation, params, elapsed))
+
+    def close(self):
+        try:
+            return self._cursor.close()
+        finally:
+            pendentes, self._pending = self._pending, []
+            for operation, params, elapsed in pendentes:
+                self._log.record(self._conn, operation, params, elapsed)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SlowQueryConnection:
+    def __init__(self, log, conn):
+        self._log = log
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return SlowQueryCursor(self._log, self._conn, self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# Statements acima de SLOW_QUERY_MS agregados por fingerprint: quantas vezes,
+# tempo total e maximo, um exemplo do SQL e o plano do EXPLAIN. O EXPLAIN roda
+# uma vez por fingerprint a cada explain_interval segundos, na mesma conexao
+# (depois do statement lento, fora do tempo medido). Os numeros sao do processo.
+class SlowQueryLog:
+    def __init__(self, threshold=0.1, explain_interval=300.0, max_fingerprints=500):
+        self.threshold = threshold
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {'slow': 0, 'explains': 0, 'explain_errors': 0, 'dropped': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            threshold=float(os.getenv('SLOW_QUERY_MS', 100)) / 1000,
+            explain_interval=float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 300)),
+            max_fingerprints=int(os.getenv('SLOW_QUERY_MAX_FINGERPRINTS', 500)),
+        )
+
+    # SLOW_QUERY_MS=0 desliga (a conexao volta sem o wrapper)
+    def wrap(self, conn):
+        if self.threshold <= 0:
+            return conn
+        return SlowQueryConnection(self, conn)
+
+    def record(self, conn, operation, params, elapsed):
+        fp = fingerprint(operation)
+        agora = time.time()
+        with self._lock:
+            self._stats['slow'] += 1
+            entry = self._entries.get(fp)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._stats['dropped'] += 1
+                    return
+                entry = self._entries[fp] = {
+                    'fingerprint': fp, 'sample': operation, 'count': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'last_seen': None, 'plan': None, 'full_scan': None,
+                    'explained_at': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed * 1000
+            entry['max_ms'] = max(entry['max_ms'], elapsed * 1000)
+            entry['last_seen'] = agora
+            explicar = (params is not None and fp.startswith(EXPLAINABLE)
+                        and (entry['explained_at'] is None or agora - entry['explained_at'] >= self.explain_interval))
+            if explicar:
+                # marca antes de soltar a trava pra outra thread nao repetir
+                entry['explained_at'] = agora
+        if explicar:
+            self._explain(conn, entry, operation, params)
+
+    # EXPLAIN com os parametros do statement lento (num UPDATE/DELETE o MySQL
+    # so mostra o plano, nao executa). type=ALL em alguma tabela e full scan.
+    def _explain(self, conn, entry, operation, params):
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            try:
+                cursor.execute("EXPLAIN " + operation, params)
+                plano = cursor.fetchall()
+            finally:
+                cursor.close()
+        except mysql.connector.Error as err:
+            with self._lock:
+                self._stats['explain_errors'] += 1
+                entry['plan'] = {'error': str(err)}
+            return
+        with self._lock:
+            self._stats['explains'] += 1
+            entry['plan'] = plano
+            entry['full_scan'] = any(str(linha.get('type')).upper() == 'ALL' for linha in plano)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['fingerprints'] = len(self._entries)
+            stats['full_scans'] = sum(1 for e in self._entries.values() if e['full_scan'])
+        return stats
+
+    # Fingerprints do mais caro (tempo total) pro mais barato
+    def stats_detail(self, limit=None):
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values()]
+        entries.sort(key=lambda e: e['total_ms'], reverse=True)
+        for e in entries:
+            e['total_ms'] = round(e['total_ms'], 3)
+            e['max_ms'] = round(e['max_ms'], 3)
+            e['avg_ms'] = round(e['total_ms'] / e['count'], 3)
+            del e['explained_at']
+        return {'threshold_ms': self.threshold * 1000, **self.stats(),
+                'queries': entries[:limit] if limit else entries}
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# IN (%s, %s, ...): o tamanho da lista muda a cada chamada (multiget, purge) e
+# cada tamanho seria um statement diferente no cache
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*%s\s*,", re.IGNORECASE)
+
+
+# Cursor entregue as rotas. Cada execute() pega do cache da conexao fisica o
+# cursor preparado daquele SQL (preparando na primeira vez) e executa com os
+# parametros no protocolo binario. close() devolve o cursor ao cache em vez
+# de desalocar o statement no servidor. SQL que nao vale preparar (ver
+# StatementRegistry._prepared) roda num cursor comum.
+class StatementCursor:
+    def __init__(self, registry, conn, dictionary):
+        self._registry = registry
+        self._conn = conn
+        self._dictionary = dictionary
+        self._cursor = None
+        self._owned = None
+
+    def execute(self, operation, params=()):
+        self._finish()
+        entry = self._registry._prepared(self._conn, operation, self._dictionary)
+        if entry is None:
+            self._owned = self._cursor = self._conn.cursor(dictionary=self._dictionary)
+            return self._cursor.execute(operation, params)
+        # o conector so reaproveita o statement se receber o mesmo objeto str,
+        # entao executa com o SQL guardado no cache e nao com o recebido
+        sql, self._cursor = entry
+        return self._cursor.execute(sql, params)
+
+    # executemany continua num cursor comum: o conector transforma o INSERT
+    # num multi-row, o que o cursor preparado nao faz (ele executa linha a linha)
+    def executemany(self, operation, seq_params):
+        self._finish()
+        self._owned = self._cursor = self._conn.cursor(dictionary=self._dictionary)
+        return self._cursor.executemany(operation, seq_params)
+
+    # Le o que sobrou do resultado anterior pra conexao ficar livre
+    def _finish(self):
+        if self._owned is not None:
+            self._owned.close()
+            self._owned = None
+        elif self._cursor is not None and getattr(self._conn, 'unread_result', False):
+            self._cursor.fetchall()
+        self._cursor = None
+
+    def close(self):
+        self._finish()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class StatementConnection:
+    def __init__(self, registry, conn):
+        self._registry = registry
+        self._conn = conn
+
+    def cursor(self, dictionary=False, **kwargs):
+        if kwargs:
+            return self._conn.cursor(dictionary=dictionary, **kwargs)
+        return StatementCursor(self._registry, self._conn, dictionary)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# Prepared statements reaproveitados entre requests. Cada conexao fisica
+# guarda os seus (em raw._statements, criado pelo pool) num LRU de max_size
+# statements; os contadores de preparos e execucoes por SQL sao do processo.
+# Um SQL so e preparado depois de prepare_after execucoes no processo, pra que
+# as variacoes raras (?fields=, busca) nao tirem do cache os statements das
+# rotas quentes; listas IN de tamanho variavel nunca sao preparadas. Os
+# contadores por SQL guardam no maximo max_tracked SQLs (LRU).
+class StatementRegistry:
+    def __init__(self, max_size=256, prepare_after=2, max_tracked=1000):
+        self.max_size = max_size
+        self.prepare_after = prepare_after
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._counts = OrderedDict()
+        self._totals = {"prepares": 0, "executions": 0, "unprepared": 0}
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv('STATEMENT_CACHE_SIZE', 256)),
+            prepare_after=int(os.getenv('STATEMENT_PREPARE_AFTER', 2)),
+            max_tracked=int(os.getenv('STATEMENT_STATS_MAX', 1000)),
+        )
+
+    # STATEMENT_CACHE_SIZE=0 desliga (a conexao volta sem o wrapper)
+    def wrap(self, conn):
+        if self.max_size <= 0:
+            return conn
+        return StatementConnection(self, conn)
+
+    # (sql, cursor preparado) do cache da conexao, ou None pra rodar o SQL
+    # num cursor comum
+    def _prepared(self, conn, operation, dictionary):
+        cache = conn._statements
+        key = (operation, dictionary)
+        entry = cache.get(key)
+        if entry is None and _IN_LIST_RE.search(operation):
+            with self._lock:
+                self._totals["executions"] += 1
+                self._totals["unprepared"] += 1
+            return None
+        with self._lock:
+            sql = ' '.join(operation.split())
+            counts = self._counts.get(sql)
+            if counts is None:
+                counts = self._counts[sql] = {"prepares": 0, "executions": 0, "unprepared": 0}
+                while len(self._counts) > self.max_tracked:
+                    self._counts.popitem(last=False)
+            else:
+                self._counts.move_to_end(sql)
+            counts["executions"] += 1
+            self._totals["executions"] += 1
+            if entry is None:
+                campo = "prepares" if counts["executions"] >= self.prepare_after else "unprepared"
+                counts[campo] += 1
+                self._totals[campo] += 1
+        if entry is not None:
+            cache.move_to_end(key)
+            return entry
+        if campo == "unprepared":
+            return None
+
+        entry = cache[key] = (operation, conn.cursor(prepared=True, dictionary=dictionary))
+        while len(cache) > self.max_size:
+            _, (_, antigo) = cache.popitem(last=False)
+            antigo.close()
+            with self._lock:
+                self._evictions += 1
+        return entry
+
+    # hits: execucoes de um statement que ja estava preparado na conexao
+    def stats(self):
+        with self._lock:
+            t = self._totals
+            return {"prepares": t["prepares"], "hits": t["executions"] - t["prepares"] - t["unprepared"],
+                    "unprepared": t["unprepared"], "executions": t["executions"],
+                    "evictions": self._evictions, "statements": len(self._counts)}
+
+    # Por statement, do mais executado pro menos
+    def stats_detail(self):
+        with self._lock:
+            linhas = [
+                {"sql": sql, "executions": c["executions"], "prepares": c["prepares"],
+                 "unprepared": c["unprepared"], "hits": c["executions"] - c["prepares"] - c["unprepared"]}
+                for sql, c in self._counts.items()
+            ]
+        linhas.sort(key=lambda linha: linha["executions"], reverse=True)
+        return {"max_size": self.max_size, "prepare_after": self.prepare_after, "totals": self.stats(),
+                "statements": linhas}
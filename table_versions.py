@@ -0,0 +1,114 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from functools import wraps
+
+from flask import g, has_request_context, make_response, request
+
+TABLES = ('usuarios', 'livros', 'emprestimos')
+
+# epoch (8 bytes) + um contador de 8 bytes por tabela
+_HEADER = struct.Struct('<Q')
+_COUNTER = struct.Struct('<Q')
+_SIZE = _HEADER.size + _COUNTER.size * len(TABLES)
+
+
+# Marca a resposta do request atual como possivelmente mais velha que a versao
+# lida antes da rota (linha do cache de entidades, leitura de replica): ela
+# sai sem ETag, senao o cliente ficaria preso nela com 304.
+def unversioned():
+    if has_request_context():
+        g.unversioned = True
+
+
+# Versao de cada tabela, guardada num arquivo mapeado em memoria que todos os
+# workers da maquina compartilham. Cada escrita incrementa o contador da
+# tabela; os GETs usam os contadores pra montar o ETag sem ir ao banco.
+# O epoch aleatorio e gerado quando o arquivo e criado, pra que um ETag antigo
+# nao volte a valer se o arquivo for apagado e os contadores recomecarem.
+class TableVersions:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._open()
+
+    # flock vale por descricao de arquivo aberta, entao cada processo precisa
+    # abrir o arquivo de novo depois do fork
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < _SIZE:
+                os.ftruncate(fd, _SIZE)
+                epoch = int.from_bytes(os.urandom(8), 'little')
+                os.pwrite(fd, _HEADER.pack(epoch), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, _SIZE)
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+
+    def bump(self, *tables):
+        self._check_pid()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for table in tables:
+                    offset = _HEADER.size + _COUNTER.size * TABLES.index(table)
+                    (valor,) = _COUNTER.unpack_from(self._map, offset)
+                    _COUNTER.pack_into(self._map, offset, valor + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def snapshot(self):
+        self._check_pid()
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            dados = self._map[:_SIZE]
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        (epoch,) = _HEADER.unpack_from(dados, 0)
+        valores = {
+            table: _COUNTER.unpack_from(dados, _HEADER.size + _COUNTER.size * i)[0]
+            for i, table in enumerate(TABLES)
+        }
+        return epoch, valores
+
+    # ETag forte: muda quando qualquer tabela da rota muda ou quando a URL
+    # (paginacao, formato...) e diferente
+    def etag(self, tables):
+        epoch, valores = self.snapshot()
+        chave = f"{epoch}:{request.full_path}:" + ",".join(f"{t}={valores[t]}" for t in tables)
+        return hashlib.sha1(chave.encode()).hexdigest()
+
+    # Decorator pros GETs: responde 304 sem executar a rota (e sem tocar no
+    # banco) quando o If-None-Match bate com a versao atual das tabelas.
+    # A versao e lida antes da consulta, entao no pior caso o ETag fica mais
+    # velho que os dados e o cliente so baixa de novo na proxima vez. So leva
+    # ETag o 200 lido do primario: erros e respostas marcadas com
+    # unversioned() nao.
+    def conditional(self, *tables):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                etag = self.etag(tables)
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+                    response.set_etag(etag)
+                    return response
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not g.get('unversioned', False):
+                    response.set_etag(etag)
+                return response
+            return wrapper
+        return decorator
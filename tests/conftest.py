@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os modulos compartilhados ficam na raiz do repositorio, como no app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
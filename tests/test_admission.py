@@ -0,0 +1,78 @@
+import threading
+import time
+
+from admission import Limiter
+
+
+def limiter(limit=2, min_limit=1, max_limit=10, max_queue=1, timeout=1.0):
+    return Limiter('teste', limit, min_limit, max_limit, max_queue, timeout)
+
+
+def test_admits_up_to_the_limit():
+    lim = limiter(limit=2)
+    prazo = time.monotonic() + 1
+    assert lim.acquire(prazo)
+    assert lim.acquire(prazo)
+    assert lim.stats()['in_flight'] == 2
+    assert lim.stats()['admitted'] == 2
+
+
+def test_waiter_times_out_at_the_deadline():
+    lim = limiter(limit=1)
+    assert lim.acquire(time.monotonic() + 1)
+    t0 = time.monotonic()
+    assert not lim.acquire(time.monotonic() + 0.05)
+    assert time.monotonic() - t0 >= 0.05
+    stats = lim.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waiting'] == 0
+
+
+def test_full_queue_is_rejected_immediately():
+    lim = limiter(limit=1, max_queue=1)
+    assert lim.acquire(time.monotonic() + 1)
+    esperando = threading.Thread(target=lim.acquire, args=(time.monotonic() + 0.5,))
+    esperando.start()
+    while lim.stats()['waiting'] < 1:
+        time.sleep(0.001)
+    t0 = time.monotonic()
+    assert not lim.acquire(time.monotonic() + 5)
+    assert time.monotonic() - t0 < 0.1
+    assert lim.stats()['rejected'] == 1
+    lim.release()
+    esperando.join()
+
+
+def test_release_wakes_a_waiter():
+    lim = limiter(limit=1)
+    assert lim.acquire(time.monotonic() + 1)
+    resultado = []
+    esperando = threading.Thread(target=lambda: resultado.append(lim.acquire(time.monotonic() + 2)))
+    esperando.start()
+    while lim.stats()['waiting'] < 1:
+        time.sleep(0.001)
+    lim.release()
+    esperando.join()
+    assert resultado == [True]
+    assert lim.stats()['in_flight'] == 1
+
+
+def test_limit_grows_while_latency_is_stable():
+    lim = limiter(limit=4, max_limit=10)
+    for _ in range(50):
+        lim.acquire(time.monotonic() + 1)
+        lim.release(rtt=0.01)
+    assert lim.stats()['limit'] == 10
+
+
+def test_limit_shrinks_when_latency_rises():
+    lim = limiter(limit=10, min_limit=2, max_limit=10)
+    for _ in range(20):
+        lim.acquire(time.monotonic() + 1)
+        lim.release(rtt=0.01)
+    for _ in range(20):
+        lim.acquire(time.monotonic() + 1)
+        lim.release(rtt=0.5)
+    assert lim.stats()['limit'] < 10
+    assert lim.stats()['limit'] >= 2
+    assert lim.stats()['latency_ms'] > 10
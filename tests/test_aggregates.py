@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+
+import pytest
+
+import aggregates
+
+
+class FakeCursor:
+    def __init__(self, linhas=()):
+        self.linhas = list(linhas)
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+
+    def executemany(self, sql, seq_params):
+        self.executed.append((sql, list(seq_params)))
+
+    def fetchall(self):
+        return self.linhas
+
+    def statements(self, tabela):
+        return [params for sql, params in self.executed if f"INTO {tabela} " in sql]
+
+
+HOJE = datetime.date(2026, 10, 18)
+
+
+def test_insert_and_delete_are_netted_per_key():
+    cursor = FakeCursor()
+    aggregates.apply(cursor,
+                     inseridas=[(2, 10, None), (1, 10, None), (1, 11, None)],
+                     removidas=[(1, 11, HOJE)])
+    assert cursor.statements('emprestimos_por_usuario') == [[(1, 1), (2, 1)]]
+    assert cursor.statements('emprestimos_por_livro') == [[(10, 2)]]
+    dias = {params[0]: params[-1] for params in cursor.statements('emprestimos_por_dia')}
+    assert dias == {None: 3, HOJE: -1}
+
+
+def test_nothing_is_written_when_the_deltas_cancel_out():
+    cursor = FakeCursor()
+    aggregates.apply(cursor, inseridas=[(1, 10, HOJE)], removidas=[(1, 10, HOJE)])
+    assert cursor.executed == []
+
+
+def test_null_owners_only_count_per_day():
+    cursor = FakeCursor()
+    aggregates.apply(cursor, removidas=[(None, None, HOJE)])
+    assert cursor.statements('emprestimos_por_usuario') == []
+    assert cursor.statements('emprestimos_por_livro') == []
+    assert [params[-1] for params in cursor.statements('emprestimos_por_dia')] == [-1]
+
+
+def test_owner_delete_discounts_the_cascaded_loans():
+    cursor = FakeCursor(linhas=[(1, 10, HOJE), (1, 11, HOJE)])
+    aggregates.before_owner_delete(cursor, 'usuario_id', 1)
+    sql, params = cursor.executed[0]
+    assert 'WHERE usuario_id = %s FOR UPDATE' in sql and params == (1,)
+    assert cursor.statements('emprestimos_por_livro') == [[(10, -1), (11, -1)]]
+    assert cursor.executed[-1] == ("DELETE FROM emprestimos_por_usuario WHERE usuario_id = %s", (1,))
+
+
+@pytest.mark.parametrize('limit, esperado', [(None, aggregates.STATS_DEFAULT_LIMIT), ('5', 5),
+                                             (str(aggregates.STATS_MAX_LIMIT + 1), aggregates.STATS_MAX_LIMIT)])
+def test_read_limit(limit, esperado):
+    assert aggregates.read_limit({} if limit is None else {'limit': limit}) == esperado
+
+
+@pytest.mark.parametrize('limit', ['0', 'x'])
+def test_read_limit_rejects_invalid_values(limit):
+    with pytest.raises(ValueError):
+        aggregates.read_limit({'limit': limit})
+
+
+def test_daily_counter_goes_to_a_random_slot(monkeypatch):
+    monkeypatch.setattr(aggregates, 'DAY_SLOTS', 4)
+    slots = set()
+    for _ in range(200):
+        cursor = FakeCursor()
+        aggregates.apply(cursor, inseridas=[(1, 10, None)])
+        ((dia, slot, delta),) = cursor.statements('emprestimos_por_dia')
+        assert (dia, delta) == (None, 1)
+        slots.add(slot)
+    assert slots == {0, 1, 2, 3}
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, sql, params=()):
+        FakeCursor.execute(self, sql, params)
+
+    async def executemany(self, sql, seq_params):
+        FakeCursor.executemany(self, sql, seq_params)
+
+    async def fetchall(self):
+        return self.linhas
+
+
+def test_async_variant_runs_the_same_statements(monkeypatch):
+    monkeypatch.setattr(aggregates, 'DAY_SLOTS', 1)
+    linhas = [(1, 10, HOJE), (2, 10, HOJE)]
+    sincrono = FakeCursor(linhas)
+    aggregates.before_owner_delete(sincrono, 'livro_id', 10)
+    assincrono = FakeAsyncCursor(linhas)
+    asyncio.run(aggregates.before_owner_delete_async(assincrono, 'livro_id', 10))
+    assert assincrono.executed == sincrono.executed
@@ -0,0 +1,196 @@
+import asyncio
+import importlib.util
+import os
+
+import mysql.connector
+import pytest
+
+APS02 = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aps-02')
+
+
+# Banco de mentira dividido pelos dois apps: os SELECT devolvem `linhas`, os
+# UPDATE mudam `atualizadas` linhas e o INSERT em emprestimos levanta `erro`,
+# se houver
+class FakeDB:
+    def __init__(self):
+        self.linhas = []
+        self.atualizadas = 1
+        self.erro = None
+
+
+class FakeCursor:
+    def __init__(self, db, dictionary=False):
+        self.db = db
+        self.dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = 0
+        self._linhas = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith("INSERT INTO emprestimos") and self.db.erro is not None:
+            raise self.db.erro
+        self._linhas = list(self.db.linhas) if sql.lstrip().startswith("SELECT") else []
+        self.lastrowid = 7
+        self.rowcount = self.db.atualizadas if sql.startswith("UPDATE") else 1
+
+    def executemany(self, sql, seq):
+        for params in seq:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self._linhas[0] if self._linhas else None
+
+    def fetchall(self):
+        return self._linhas
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db, dictionary)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, sql, params=()):
+        self._cursor.execute(sql, params)
+
+    async def executemany(self, sql, seq):
+        self._cursor.executemany(sql, seq)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+    async def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class FakeAsyncConn:
+    def __init__(self, db):
+        self.db = db
+
+    async def is_connected(self):
+        return True
+
+    async def cursor(self, dictionary=False):
+        return FakeAsyncCursor(FakeCursor(self.db, dictionary))
+
+    async def commit(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def carregar(nome, arquivo):
+    spec = importlib.util.spec_from_file_location(nome, os.path.join(APS02, arquivo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture(scope='module')
+def apps(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('apps')
+    with pytest.MonkeyPatch.context() as mp:
+        for nome in ('WRITE_BEHIND', 'ADMISSION_CONTROL', 'PROFILE_TOKEN', 'DB_REPLICAS', 'WEB_CONCURRENCY'):
+            mp.delenv(nome, raising=False)
+        mp.setenv('DB_SSL_CA', '')
+        mp.setenv('CACHE_BACKEND', 'local')
+        mp.setenv('METRICS_DIR', str(tmp / 'metrics'))
+        mp.setenv('VERSIONS_PATH', str(tmp / 'versions.bin'))
+        sincrono = carregar('aps02_app', 'app.py')
+        assincrono = carregar('aps02_app_async', 'app_async.py')
+    return sincrono, assincrono
+
+
+@pytest.fixture
+def db(apps, monkeypatch):
+    sincrono, assincrono = apps
+    db = FakeDB()
+
+    async def conect_db_async():
+        return FakeAsyncConn(db)
+
+    monkeypatch.setattr(sincrono, 'conect_db', lambda: FakeConn(db))
+    monkeypatch.setattr(assincrono, 'conect_db', conect_db_async)
+    return db
+
+
+def chamar_sincrono(app, metodo, url, corpo):
+    resposta = app.test_client().open(url, method=metodo, json=corpo)
+    return resposta.status_code, resposta.get_json()
+
+
+def chamar_assincrono(app, metodo, url, corpo):
+    async def chamar():
+        resposta = await app.test_client().open(url, method=metodo, json=corpo)
+        return resposta.status_code, await resposta.get_json()
+    return asyncio.run(chamar())
+
+
+@pytest.mark.parametrize('metodo, url, corpo, linhas, erro, status', [
+    ('POST', '/emprestimo', {'usuario_id': 1, 'livro_id': 2}, [], None, 201),
+    ('POST', '/emprestimo', {'usuario_id': 1, 'livro_id': 2}, [],
+     mysql.connector.IntegrityError(msg="Duplicate entry", errno=1062), 409),
+    ('POST', '/emprestimo', {'usuario_id': 1, 'livro_id': 2}, [],
+     mysql.connector.IntegrityError(msg="Cannot add or update a child row", errno=1452), 404),
+    ('GET', '/usuario', None, [], None, 404),
+    ('GET', '/livro', None, [], None, 404),
+    ('GET', '/emprestimo', None, [], None, 404),
+    ('GET', '/livro', None, [{'id': 1, 'titulo': 'T', 'isbn': 'X', 'autor': 'A'}], None, 200),
+    ('GET', '/usuario/5', None, [], None, 404),
+    ('GET', '/livro/5', None, [], None, 404),
+    ('GET', '/emprestimo/5', None, [], None, 404),
+    ('GET', '/livro/5', None, [{'id': 5, 'titulo': 'T', 'isbn': 'X', 'autor': 'A'}], None, 200),
+])
+def test_async_app_answers_like_the_sync_app(apps, db, metodo, url, corpo, linhas, erro, status):
+    sincrono, assincrono = apps
+    db.linhas = linhas
+    db.erro = erro
+    esperado = chamar_sincrono(sincrono.app, metodo, url, corpo)
+    assert esperado[0] == status
+    assert chamar_assincrono(assincrono.app, metodo, url, corpo) == esperado
+
+
+def test_async_writes_bump_versions_and_invalidate_cache(apps, db):
+    _, assincrono = apps
+    db.linhas = [(5,)]
+    assincrono.cache.set('livro', 5, {'id': 5})
+    antes = assincrono.versions.snapshot()
+    status, _ = chamar_assincrono(assincrono.app, 'PUT', '/livro/5', {'titulo': 'Novo'})
+    assert status == 200
+    assert assincrono.cache.get('livro', 5) is None
+    assert assincrono.versions.snapshot() != antes
+
+
+def test_unchanged_loan_is_reported_after_the_counters_update(apps, db):
+    sincrono, assincrono = apps
+    # o UPDATE nao mudou nada, mas os contadores rodam depois dele
+    db.linhas = [(1, 2, '2024-01-01')]
+    db.atualizadas = 0
+    esperado = chamar_sincrono(sincrono.app, 'PUT', '/emprestimo/3', {'livro_id': 9})
+    assert esperado[0] == 400
+    assert chamar_assincrono(assincrono.app, 'PUT', '/emprestimo/3', {'livro_id': 9}) == esperado
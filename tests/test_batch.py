@@ -0,0 +1,82 @@
+import pytest
+
+from batch import INSERTS, REF_RE, BatchError, BatchResult, _resolve, run_batch
+
+
+class FakeCursor:
+    def __init__(self):
+        self.executed = []
+        self.lastrowid = 0
+        self.rowcount = 1
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+        if sql.startswith('INSERT INTO') and sql in INSERTS.values():
+            self.lastrowid += 1
+
+    def executemany(self, sql, seq_params):
+        self.executed.append((sql, list(seq_params)))
+
+
+def resultado_com_ids(*ids):
+    resultado = BatchResult()
+    for indice, id in enumerate(ids):
+        resultado.results.append({'index': indice, 'status': 201, 'id': id} if id is not None
+                                 else {'index': indice, 'status': 200})
+    return resultado
+
+
+@pytest.mark.parametrize('valor, casa', [('$0', True), ('$12', True), ('$', False), ('$a', False),
+                                         ('x$1', False), ('$1 ', False), ('$-1', False)])
+def test_ref_re(valor, casa):
+    assert bool(REF_RE.match(valor)) is casa
+
+
+def test_resolve_reference_and_literal_id():
+    resultado = resultado_com_ids(10, 20)
+    assert _resolve(resultado, '$1') == 20
+    assert _resolve(resultado, '7') == 7
+
+
+@pytest.mark.parametrize('valor', ['$2', '$1'])
+def test_resolve_rejects_references_without_id(valor):
+    # $2 ainda nao rodou; $1 nao gerou id
+    with pytest.raises(BatchError, match='Referência inválida'):
+        _resolve(resultado_com_ids(10, None), valor)
+
+
+def test_resolve_rejects_non_numeric_id():
+    with pytest.raises(BatchError, match='Id inválido'):
+        _resolve(BatchResult(), 'abc')
+
+
+def test_references_in_path_and_id_fields():
+    cursor = FakeCursor()
+    resultado = run_batch(cursor, [
+        {'method': 'POST', 'path': '/usuario', 'body': {'nome': 'Ana', 'email': 'a@x', 'cpf': '1'}},
+        {'method': 'POST', 'path': '/livro', 'body': {'titulo': 'T', 'isbn': '9', 'autor': 'A'}},
+        {'method': 'POST', 'path': '/emprestimo', 'body': {'usuario_id': '$0', 'livro_id': '$1'}},
+        {'method': 'PUT', 'path': '/livro/$1', 'body': {'titulo': 'Novo'}},
+    ])
+    assert [r['id'] for r in resultado.results[:3]] == [1, 2, 3]
+    assert (INSERTS['emprestimo'], (1, 2)) in cursor.executed
+    assert any(sql.startswith('UPDATE livros') and params[-1] == 2 for sql, params in cursor.executed)
+
+
+def test_text_fields_that_look_like_references_are_kept():
+    cursor = FakeCursor()
+    run_batch(cursor, [
+        {'method': 'POST', 'path': '/usuario', 'body': {'nome': 'Ana', 'email': 'a@x', 'cpf': '1'}},
+        {'method': 'POST', 'path': '/livro', 'body': {'titulo': '$0', 'isbn': '9', 'autor': 'A'}},
+    ])
+    assert (INSERTS['livro'], ('$0', '9', 'A')) in cursor.executed
+
+
+def test_failed_reference_reports_the_operation_index():
+    with pytest.raises(BatchError) as erro:
+        run_batch(FakeCursor(), [
+            {'method': 'POST', 'path': '/usuario', 'body': {'nome': 'Ana', 'email': 'a@x', 'cpf': '1'}},
+            {'method': 'DELETE', 'path': '/livro/$5'},
+        ])
+    assert erro.value.index == 1
+    assert erro.value.status == 400
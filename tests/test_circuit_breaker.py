@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import async_pool
+import circuit_breaker
+import db_pool
+from async_pool import AsyncConnectionPool
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from db_pool import ConnectionPool
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=relogio))
+    # jitter no maximo: a espera e exatamente o backoff
+    monkeypatch.setattr(circuit_breaker, 'random', SimpleNamespace(uniform=lambda a, b: b))
+    return relogio
+
+
+def falhar(breaker, vezes):
+    for _ in range(vezes):
+        breaker.before_call()
+        breaker.on_failure()
+
+
+def test_opens_after_consecutive_failures(relogio):
+    breaker = CircuitBreaker(failures=3, base_backoff=1.0)
+    falhar(breaker, 2)
+    assert breaker.stats()['state'] == CLOSED
+    falhar(breaker, 1)
+    stats = breaker.stats()
+    assert stats['state'] == OPEN
+    assert stats['state_code'] == 1
+    assert stats['opens'] == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_success_resets_the_failure_count(relogio):
+    breaker = CircuitBreaker(failures=3)
+    falhar(breaker, 2)
+    breaker.before_call()
+    breaker.on_success()
+    falhar(breaker, 2)
+    assert breaker.stats()['state'] == CLOSED
+
+
+def test_half_open_lets_a_single_probe_through(relogio):
+    breaker = CircuitBreaker(failures=1, base_backoff=1.0)
+    falhar(breaker, 1)
+    relogio.agora += 1.0
+    breaker.before_call()
+    assert breaker.stats()['state'] == HALF_OPEN
+    assert breaker.stats()['probes'] == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.on_success()
+    assert breaker.stats()['state'] == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_doubles_the_backoff(relogio):
+    breaker = CircuitBreaker(failures=1, base_backoff=1.0, max_backoff=3.0)
+    falhar(breaker, 1)
+    assert breaker.stats()['retry_in'] == 1.0
+    relogio.agora += 1.0
+    falhar(breaker, 1)
+    assert breaker.stats()['state'] == OPEN
+    assert breaker.stats()['retry_in'] == 2.0
+    relogio.agora += 2.0
+    falhar(breaker, 1)
+    assert breaker.stats()['retry_in'] == 3.0
+
+
+def test_backoff_resets_after_a_successful_probe(relogio):
+    breaker = CircuitBreaker(failures=1, base_backoff=1.0)
+    falhar(breaker, 1)
+    relogio.agora += 1.0
+    falhar(breaker, 1)
+    relogio.agora += 2.0
+    breaker.before_call()
+    breaker.on_success()
+    falhar(breaker, 1)
+    assert breaker.stats()['retry_in'] == 1.0
+
+
+def test_jitter_keeps_at_least_half_the_backoff(monkeypatch, relogio):
+    monkeypatch.setattr(circuit_breaker, 'random', SimpleNamespace(uniform=lambda a, b: a))
+    breaker = CircuitBreaker(failures=1, base_backoff=4.0)
+    falhar(breaker, 1)
+    assert breaker.stats()['retry_in'] == 2.0
+
+
+# Conexao que falha com OSError (ex.: recusada, erro de SSL) nas primeiras
+# `falhas` tentativas
+class Banco:
+    def __init__(self, falhas):
+        self.falhas = falhas
+
+    def connect(self, **config):
+        if self.falhas:
+            self.falhas -= 1
+            raise OSError("Connection refused")
+        return SimpleNamespace(in_transaction=False, close=lambda: None)
+
+    async def connect_async(self, **config):
+        return self.connect(**config)
+
+
+def test_os_error_on_the_probe_reopens_the_breaker(relogio, monkeypatch):
+    banco = Banco(falhas=2)
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', banco.connect)
+    pool = ConnectionPool({}, min_size=0, max_size=1, breaker=CircuitBreaker(failures=1, base_backoff=1.0))
+    with pytest.raises(OSError):
+        pool.get_connection()
+    assert pool.breaker.stats()['state'] == OPEN
+    relogio.agora += 1.0
+    with pytest.raises(OSError):
+        pool.get_connection()
+    assert pool.breaker.stats()['state'] == OPEN
+    relogio.agora += 2.0
+    pool.get_connection().close()
+    assert pool.breaker.stats()['state'] == CLOSED
+
+
+def test_async_pool_probe_reopens_the_breaker(relogio, monkeypatch):
+    banco = Banco(falhas=2)
+    monkeypatch.setattr(async_pool.mysql.connector.aio, 'connect', banco.connect_async)
+    pool = AsyncConnectionPool({}, min_size=0, max_size=1, breaker=CircuitBreaker(failures=1, base_backoff=1.0))
+
+    async def checkout():
+        conn = await pool.get_connection()
+        await conn.close()
+
+    with pytest.raises(OSError):
+        asyncio.run(checkout())
+    relogio.agora += 1.0
+    with pytest.raises(OSError):
+        asyncio.run(checkout())
+    assert pool.breaker.stats()['state'] == OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(checkout())
+    relogio.agora += 2.0
+    asyncio.run(checkout())
+    assert pool.stats()['breaker']['state'] == CLOSED
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import mysql.connector
+import pytest
+from mysql.connector.errors import PoolError
+
+import db_pool
+from db_pool import ConnectionPool
+
+
+class FakeRaw:
+    def __init__(self, numero):
+        self.numero = numero
+        self.closed = False
+        self.connected = True
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def conexoes(monkeypatch):
+    criadas = []
+
+    def connect(**config):
+        raw = FakeRaw(len(criadas))
+        criadas.append(raw)
+        return raw
+
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', connect)
+    return criadas
+
+
+def test_close_returns_the_connection_to_the_pool(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=2)
+    conn = pool.get_connection()
+    conn.close()
+    conn.close()
+    outra = pool.get_connection()
+    assert outra._raw is conexoes[0]
+    assert len(conexoes) == 1
+    assert not conexoes[0].closed
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['created'] == 1
+    assert stats['in_use'] == 1
+
+
+def test_open_transaction_is_rolled_back_on_release(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=1)
+    conn = pool.get_connection()
+    conexoes[0].in_transaction = True
+    conn.close()
+    assert conexoes[0].rollbacks == 1
+
+
+def test_checkout_waits_and_times_out_when_the_pool_is_exhausted(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=0.05)
+    conn = pool.get_connection()
+    with pytest.raises(PoolError):
+        pool.get_connection()
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['timeouts'] == 1
+    conn.close()
+
+
+def test_release_wakes_a_waiting_checkout(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=2)
+    conn = pool.get_connection()
+    obtidas = []
+    esperando = threading.Thread(target=lambda: obtidas.append(pool.get_connection()))
+    esperando.start()
+    while pool.stats()['waits'] < 1:
+        time.sleep(0.001)
+    conn.close()
+    esperando.join()
+    assert obtidas[0]._raw is conexoes[0]
+
+
+def test_broken_idle_connection_is_replaced(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=1, ping_interval=0)
+    pool.get_connection().close()
+    conexoes[0].connected = False
+    conn = pool.get_connection()
+    assert conn._raw is conexoes[1]
+    assert conexoes[0].closed
+    assert pool.stats()['broken'] == 1
+
+
+def test_expired_connections_are_evicted(conexoes):
+    pool = ConnectionPool({}, min_size=0, max_size=2, max_lifetime=0)
+    pool.get_connection().close()
+    conn = pool.get_connection()
+    assert conn._raw is conexoes[1]
+    assert conexoes[0].closed
+    assert pool.stats()['evictions'] == 1
+
+
+def test_failed_connect_frees_the_slot(conexoes, monkeypatch):
+    def falha(**config):
+        raise mysql.connector.InterfaceError("recusada")
+
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=0.05)
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', falha)
+    with pytest.raises(mysql.connector.Error):
+        pool.get_connection()
+    assert pool.stats()['size'] == 0
+
+
+def test_warm_opens_min_size_connections(conexoes):
+    pool = ConnectionPool({}, min_size=3, max_size=5)
+    pool.warm()
+    stats = pool.stats()
+    assert stats['size'] == 3
+    assert stats['idle'] == 3
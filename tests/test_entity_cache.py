@@ -0,0 +1,93 @@
+import pytest
+
+import entity_cache
+from entity_cache import EntityCache, LocalBackend, SQLiteBackend
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'local':
+        return LocalBackend(max_entries=2)
+    return SQLiteBackend(str(tmp_path / 'cache.sqlite'), max_entries=2)
+
+
+def test_get_set_and_invalidate(backend):
+    cache = EntityCache(backend, ttl=60)
+    assert cache.get('livro', 1) is None
+    cache.set('livro', 1, {'id': 1, 'titulo': 'T'})
+    assert cache.get('livro', 1) == {'id': 1, 'titulo': 'T'}
+    cache.invalidate('livro', 1)
+    assert cache.get('livro', 1) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 2, 1)
+
+
+def test_invalidate_all_only_clears_one_entity(backend):
+    cache = EntityCache(backend, ttl=60)
+    cache.set('livro', 1, 'a')
+    cache.set('usuario', 1, 'b')
+    cache.invalidate_all('livro')
+    assert cache.get('livro', 1) is None
+    assert cache.get('usuario', 1) == 'b'
+
+
+def test_expired_entries_are_misses(backend, monkeypatch):
+    cache = EntityCache(backend, ttl=60)
+    cache.set('livro', 1, 'a')
+    agora = entity_cache.time.time() + 120
+    monotonic = entity_cache.time.monotonic() + 120
+    monkeypatch.setattr(entity_cache.time, 'time', lambda: agora)
+    monkeypatch.setattr(entity_cache.time, 'monotonic', lambda: monotonic)
+    assert cache.get('livro', 1) is None
+    assert backend.evictions == 1
+
+
+def test_size_is_bounded(backend):
+    cache = EntityCache(backend, ttl=60)
+    for id in range(1, 4):
+        cache.set('livro', id, id)
+    assert backend.size() == 2
+    assert backend.evictions == 1
+    assert cache.get('livro', 3) == 3
+
+
+def test_local_backend_drops_the_least_recently_used():
+    cache = EntityCache(LocalBackend(max_entries=2), ttl=60)
+    cache.set('livro', 1, 'a')
+    cache.set('livro', 2, 'b')
+    cache.get('livro', 1)
+    cache.set('livro', 3, 'c')
+    assert cache.get('livro', 1) == 'a'
+    assert cache.get('livro', 2) is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    worker_a = EntityCache(SQLiteBackend(path), ttl=60)
+    worker_b = EntityCache(SQLiteBackend(path), ttl=60)
+    worker_a.set('livro', 1, 'a')
+    assert worker_b.get('livro', 1) == 'a'
+    worker_b.invalidate('livro', 1)
+    assert worker_a.get('livro', 1) is None
+
+
+def test_zero_ttl_disables_the_cache():
+    cache = EntityCache(LocalBackend(), ttl=0)
+    cache.set('livro', 1, 'a')
+    assert cache.get('livro', 1) is None
+
+
+def test_backend_follows_the_worker_count(monkeypatch, tmp_path):
+    monkeypatch.delenv('CACHE_BACKEND', raising=False)
+    monkeypatch.setenv('CACHE_PATH', str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    assert isinstance(EntityCache.from_env().backend, LocalBackend)
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert isinstance(EntityCache.from_env().backend, SQLiteBackend)
+
+
+def test_local_backend_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'local')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    with pytest.raises(ValueError, match='4 workers'):
+        EntityCache.from_env()
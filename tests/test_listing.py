@@ -0,0 +1,30 @@
+import base64
+
+import pytest
+
+from listing import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    for last_id in (0, 1, 42, 2 ** 40):
+        assert decode_cursor(encode_cursor(last_id)) == last_id
+
+
+def test_cursor_is_opaque_without_padding():
+    token = encode_cursor(42)
+    assert '=' not in token
+    assert '42' not in token
+
+
+@pytest.mark.parametrize('token', [
+    '',
+    'nao-e-base64!',
+    base64.urlsafe_b64encode(b'[1, 2]').decode(),
+    base64.urlsafe_b64encode(b'{"outro": 1}').decode(),
+    base64.urlsafe_b64encode(b'{"id": "1"}').decode(),
+    base64.urlsafe_b64encode(b'{"id": 1.5}').decode(),
+    base64.urlsafe_b64encode(b'42').decode(),
+])
+def test_decode_cursor_rejects_invalid_tokens(token):
+    with pytest.raises(ValueError, match="'after'"):
+        decode_cursor(token)
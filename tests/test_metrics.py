@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from flask import Flask, jsonify
+
+from metrics import Metrics, retire
+
+
+def pid_morto():
+    processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+    processo.wait()
+    return processo.pid
+
+
+# Grava o arquivo de metricas de outro worker, no formato do _snapshot
+def arquivo_de_worker(directory, pid, **valores):
+    worker = Metrics(directory)
+    worker.register('db_pool', lambda: valores, counters=('checkouts',), gauges=('in_use',))
+    snapshot = worker._snapshot()
+    snapshot['pid'] = pid
+    with open(os.path.join(directory, f"{pid}.json"), 'w') as f:
+        json.dump(snapshot, f)
+
+
+def amostras(texto):
+    return dict(linha.rsplit(' ', 1) for linha in texto.splitlines() if not linha.startswith('#'))
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    metrics = Metrics(str(tmp_path))
+    metrics.register('db_pool', lambda: {'checkouts': 3, 'in_use': 1},
+                     counters=('checkouts',), gauges=('in_use',))
+    return metrics
+
+
+def test_request_histograms_by_route_and_phase(metrics):
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/livro')
+    def listar_livros():
+        with metrics.phase('connect'):
+            pass
+        return jsonify([1, 2, 3])
+
+    client = app.test_client()
+    client.get('/livro')
+    client.get('/livro')
+    valores = amostras(client.get('/metrics').get_data(as_text=True))
+    assert valores['app_request_duration_seconds_count{route="listar_livros"}'] == '2'
+    assert valores['app_request_phase_seconds_count{route="listar_livros",phase="connect"}'] == '2'
+    assert valores['app_response_size_bytes_bucket{route="listar_livros",le="+Inf"}'] == '2'
+
+
+def test_counters_are_summed_across_workers(metrics, tmp_path):
+    arquivo_de_worker(str(tmp_path), os.getppid(), checkouts=10, in_use=2)
+    valores = amostras(metrics.render())
+    assert valores['app_db_pool_checkouts_total'] == '13'
+    assert valores['app_db_pool_in_use'] == '3'
+
+
+def test_concurrent_flushes_do_not_fail(metrics, tmp_path):
+    arquivo_de_worker(str(tmp_path), os.getppid(), checkouts=10, in_use=2)
+    erros = []
+
+    def flush(wait):
+        try:
+            for _ in range(200):
+                metrics.flush(wait=wait)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=flush, args=(i % 2 == 0,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert erros == []
+    assert not [nome for nome in os.listdir(tmp_path) if nome.endswith('.tmp')]
+    valores = amostras(metrics.render())
+    assert valores['app_db_pool_checkouts_total'] == '13'
+    assert valores['app_db_pool_in_use'] == '3'
+
+
+def test_dead_workers_keep_counters_but_not_gauges(metrics, tmp_path):
+    arquivo_de_worker(str(tmp_path), pid_morto(), checkouts=10, in_use=2)
+    valores = amostras(metrics.render())
+    assert valores['app_db_pool_checkouts_total'] == '13'
+    assert valores['app_db_pool_in_use'] == '1'
+
+
+def test_dead_worker_file_is_merged_into_retired(metrics, tmp_path):
+    pid = pid_morto()
+    arquivo_de_worker(str(tmp_path), pid, checkouts=10, in_use=2)
+    metrics.render()
+    assert not os.path.exists(tmp_path / f"{pid}.json")
+    arquivo_de_worker(str(tmp_path), pid_morto(), checkouts=5, in_use=2)
+    valores = amostras(metrics.render())
+    assert valores['app_db_pool_checkouts_total'] == '18'
+    with open(tmp_path / 'retired.json') as f:
+        assert json.load(f)['sources'] == [['db_pool', {'checkouts': 15}, {}, {}]]
+
+
+def test_retire_is_idempotent(tmp_path):
+    pid = pid_morto()
+    arquivo_de_worker(str(tmp_path), pid, checkouts=10, in_use=0)
+    retire(str(tmp_path), pid)
+    retire(str(tmp_path), pid)
+    with open(tmp_path / 'retired.json') as f:
+        assert json.load(f)['sources'] == [['db_pool', {'checkouts': 10}, {}, {}]]
+
+
+def test_reused_pid_does_not_make_counters_go_back(metrics, tmp_path):
+    # arquivo deixado por um processo antigo com o mesmo pid deste
+    arquivo_de_worker(str(tmp_path), os.getpid(), checkouts=10, in_use=2)
+    valores = amostras(metrics.render())
+    assert valores['app_db_pool_checkouts_total'] == '13'
+    assert valores['app_db_pool_in_use'] == '1'
+
+
+def test_per_process_gauges_are_labelled_by_pid(tmp_path):
+    metrics = Metrics(str(tmp_path))
+    metrics.register('db_breaker', lambda: {'state_code': 1}, per_process=('state_code',))
+    valores = amostras(metrics.render())
+    assert valores[f'app_db_breaker_state_code{{pid="{os.getpid()}"}}'] == '1'
@@ -0,0 +1,39 @@
+import pytest
+
+import multiget
+from multiget import parse_ids
+
+
+def test_query_string_list():
+    assert parse_ids('1,2,3') == [1, 2, 3]
+
+
+def test_empty_items_and_spaces_are_ignored():
+    assert parse_ids(' 1, ,2,') == [1, 2]
+
+
+def test_json_list():
+    assert parse_ids([3, '4', 5]) == [3, 4, 5]
+
+
+def test_repeated_ids_keep_first_order():
+    assert parse_ids('5,1,5,2,1') == [5, 1, 2]
+
+
+@pytest.mark.parametrize('valor', ['', ',,', [], None, {'ids': [1]}, 7])
+def test_missing_list_is_rejected(valor):
+    with pytest.raises(ValueError, match='lista de ids'):
+        parse_ids(valor)
+
+
+@pytest.mark.parametrize('valor', ['1,abc', [1, None], [1, True], [1, [2]], '1.5'])
+def test_invalid_ids_are_rejected(valor):
+    with pytest.raises(ValueError, match='Id inválido'):
+        parse_ids(valor)
+
+
+def test_limit_counts_distinct_ids(monkeypatch):
+    monkeypatch.setattr(multiget, 'MULTIGET_MAX_IDS', 3)
+    assert parse_ids('1,2,3,3,1') == [1, 2, 3]
+    with pytest.raises(ValueError, match='No máximo 3'):
+        parse_ids('1,2,3,4')
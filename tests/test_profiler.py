@@ -0,0 +1,67 @@
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from profiler import PROFILE_HEADER, Profiler
+
+TOKEN = 'segredo'
+
+
+def funcao_lenta():
+    time.sleep(0.05)
+
+
+@pytest.fixture
+def client(tmp_path):
+    profiler = Profiler(TOKEN, str(tmp_path), interval=0.002)
+    app = Flask(__name__)
+    profiler.init_app(app)
+
+    @app.route('/livro')
+    def listar_livros():
+        funcao_lenta()
+        return jsonify([])
+
+    return app.test_client()
+
+
+def test_requests_with_the_token_are_sampled(client):
+    client.get('/livro', headers={PROFILE_HEADER: TOKEN})
+    client.get('/livro')
+    rotas = client.get('/profile', headers={PROFILE_HEADER: TOKEN}).get_json()['routes']
+    assert rotas['listar_livros']['requests'] == 1
+    assert rotas['listar_livros']['samples'] > 0
+
+
+def test_collapsed_stacks_start_with_the_route(client):
+    client.get('/livro', headers={PROFILE_HEADER: TOKEN})
+    texto = client.get('/profile/collapsed', headers={PROFILE_HEADER: TOKEN}).get_data(as_text=True)
+    linhas = texto.splitlines()
+    assert linhas
+    for linha in linhas:
+        pilha, total = linha.rsplit(' ', 1)
+        assert pilha.startswith('listar_livros;')
+        assert int(total) > 0
+    assert any('funcao_lenta' in linha for linha in linhas)
+    so_a_rota = client.get('/profile/collapsed?route=listar_livros', headers={PROFILE_HEADER: TOKEN})
+    assert not so_a_rota.get_data(as_text=True).startswith('listar_livros;')
+
+
+def test_wrong_token_is_not_profiled_and_cannot_read(client):
+    client.get('/livro', headers={PROFILE_HEADER: 'outro'})
+    assert client.get('/profile', headers={PROFILE_HEADER: 'outro'}).status_code == 403
+    assert client.get('/profile', headers={PROFILE_HEADER: TOKEN}).get_json()['routes'] == {}
+
+
+def test_reset_clears_the_profiles(client):
+    client.get('/livro', headers={PROFILE_HEADER: TOKEN})
+    client.delete('/profile', headers={PROFILE_HEADER: TOKEN})
+    assert client.get('/profile', headers={PROFILE_HEADER: TOKEN}).get_json()['routes'] == {}
+
+
+def test_disabled_without_a_token(tmp_path):
+    app = Flask(__name__)
+    Profiler('', str(tmp_path)).init_app(app)
+    assert app.test_client().get('/profile').status_code == 404
+    assert not app.before_request_funcs
@@ -0,0 +1,233 @@
+from types import SimpleNamespace
+
+import pytest
+
+import purge
+from purge import PurgeCancelled, PurgeJobs, read_purge_request
+
+
+def test_ids_are_deduplicated_and_sorted():
+    assert read_purge_request('livro', {'ids': [3, 1, 3, 2]}) == {'ids': [1, 2, 3]}
+
+
+def test_filter_on_accepted_fields():
+    assert read_purge_request('livro', {'filter': {'autor': 'Fulano'}}) == {'filter': {'autor': 'Fulano'}}
+    assert read_purge_request('usuario', {'filter': {'email': 'a@x', 'nome': 'Ana'}}) == \
+        {'filter': {'email': 'a@x', 'nome': 'Ana'}}
+
+
+@pytest.mark.parametrize('data', [None, [], {}, {'ids': [1], 'filter': {'autor': 'x'}}, {'outro': 1}])
+def test_exactly_one_of_ids_or_filter(data):
+    with pytest.raises(ValueError, match="'ids' \\(lista\\) ou 'filter'"):
+        read_purge_request('livro', data)
+
+
+@pytest.mark.parametrize('ids', [[], '1,2', 5])
+def test_ids_must_be_a_non_empty_list(ids):
+    with pytest.raises(ValueError, match='lista não vazia'):
+        read_purge_request('livro', {'ids': ids})
+
+
+@pytest.mark.parametrize('ids', [[1, '2'], [1, 2.0], [True], [None]])
+def test_ids_must_be_integers(ids):
+    with pytest.raises(ValueError, match='só inteiros'):
+        read_purge_request('livro', {'ids': ids})
+
+
+def test_ids_limit(monkeypatch):
+    monkeypatch.setattr(purge, 'PURGE_MAX_IDS', 2)
+    with pytest.raises(ValueError, match='No máximo 2'):
+        read_purge_request('livro', {'ids': [1, 2, 3]})
+
+
+@pytest.mark.parametrize('filtro', [{}, [], 'autor'])
+def test_filter_must_be_a_non_empty_object(filtro):
+    with pytest.raises(ValueError, match='objeto não vazio'):
+        read_purge_request('livro', {'filter': filtro})
+
+
+def test_filter_fields_depend_on_the_resource():
+    with pytest.raises(ValueError, match='não suportados: email'):
+        read_purge_request('livro', {'filter': {'email': 'a@x'}})
+    with pytest.raises(ValueError, match='não suportados: autor'):
+        read_purge_request('usuario', {'filter': {'autor': 'x'}})
+
+
+def test_filter_values_must_be_strings():
+    with pytest.raises(ValueError, match='strings'):
+        read_purge_request('livro', {'filter': {'autor': 1}})
+
+
+# Banco falso pros blocos do purge: livros com os seus emprestimos e a linha
+# do job, que deixa de ser 'running' deste worker quando running=False
+class FakeDB:
+    def __init__(self, emprestimos, livros=()):
+        self.emprestimos = dict(emprestimos)
+        self.livros = set(livros) | {livro for livro, _ in self.emprestimos.values()}
+        self.running = True
+        self.deletes = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.agora = 0.0
+        self.demora = 0.0
+
+    def conect_db(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, **kwargs):
+        return PurgeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+class PurgeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.linhas = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        db = self.db
+        self.linhas = []
+        self.rowcount = 0
+        if sql.startswith("SELECT id, usuario_id, livro_id, data_emprestimo FROM emprestimos"):
+            livro, limite = params
+            ids = sorted(i for i, (l, _) in db.emprestimos.items() if l == livro)[:limite]
+            self.linhas = [(i, db.emprestimos[i][1], livro, None) for i in ids]
+        elif sql.startswith("SELECT usuario_id, livro_id, data_emprestimo FROM emprestimos"):
+            self.linhas = [(u, l, None) for l, u in db.emprestimos.values() if l == params[0]]
+        elif sql.startswith("DELETE FROM emprestimos WHERE id IN"):
+            db.agora += db.demora
+            db.deletes.append(('emprestimos', list(params)))
+            for i in params:
+                self.rowcount += db.emprestimos.pop(i, None) is not None
+        elif sql.startswith("DELETE FROM livros WHERE id"):
+            db.deletes.append(('livros', [params[0]]))
+            self.rowcount = int(params[0] in db.livros)
+            db.livros.discard(params[0])
+        elif sql.startswith("SELECT id FROM livros"):
+            autor, depois, limite = params
+            self.linhas = [(i,) for i in sorted(db.livros) if i > depois][:limite]
+        elif sql.startswith("UPDATE purge_jobs"):
+            self.rowcount = int(db.running)
+
+    def executemany(self, sql, seq_params):
+        pass
+
+    def fetchall(self):
+        return self.linhas
+
+    def close(self):
+        pass
+
+
+def novo_job(chunk_size):
+    return {'recurso': 'livro', 'owners_deleted': 0, 'emprestimos_deleted': 0, 'chunks': 0,
+            'chunk_size': chunk_size, 'throttled_ms': 0, 'last_owner_id': None}
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    db = FakeDB({1: (7, 100), 2: (7, 101), 3: (7, 102), 4: (8, 100)})
+    monkeypatch.setattr(purge, 'time', SimpleNamespace(monotonic=lambda: db.agora, sleep=lambda s: None))
+    return db
+
+
+def test_loans_are_deleted_before_the_owner(relogio):
+    db = relogio
+    jobs = PurgeJobs(db.conect_db, chunk_size=2, min_chunk_size=1)
+    job = novo_job(2)
+    assert not jobs._chunk('job', job, 'livro', 7)
+    assert not jobs._chunk('job', job, 'livro', 7)
+    assert jobs._chunk('job', job, 'livro', 7)
+    assert db.deletes == [('emprestimos', [1, 2]), ('emprestimos', [3]), ('livros', [7])]
+    assert (job['emprestimos_deleted'], job['owners_deleted'], job['chunks']) == (3, 1, 3)
+    assert job['last_owner_id'] == 7
+    assert db.commits == 3
+    assert 8 in db.livros and 4 in db.emprestimos
+
+
+def test_chunk_size_halves_when_slow_and_grows_back_when_fast(relogio):
+    db = relogio
+    db.emprestimos = {i: (7, 100) for i in range(1, 41)}
+    jobs = PurgeJobs(db.conect_db, chunk_size=8, min_chunk_size=2, max_chunk_time=0.2)
+    job = novo_job(8)
+    db.demora = 0.5
+    tamanhos = []
+    for _ in range(3):
+        jobs._chunk('job', job, 'livro', 7)
+        tamanhos.append(job['chunk_size'])
+    db.demora = 0.0
+    for _ in range(3):
+        jobs._chunk('job', job, 'livro', 7)
+        tamanhos.append(job['chunk_size'])
+    assert tamanhos == [4, 2, 2, 4, 8, 8]
+    assert [len(ids) for _, ids in db.deletes] == [8, 4, 2, 2, 4, 8]
+
+
+def test_chunk_of_a_cancelled_job_is_rolled_back(relogio):
+    db = relogio
+    db.running = False
+    jobs = PurgeJobs(db.conect_db, chunk_size=2)
+    with pytest.raises(PurgeCancelled):
+        jobs._chunk('job', novo_job(2), 'livro', 7)
+    assert (db.commits, db.rollbacks) == (0, 1)
+    assert jobs.stats()['chunks'] == 0
+
+
+def test_resume_skips_owners_already_done():
+    jobs = PurgeJobs(FakeDB({}).conect_db)
+    assert list(jobs._owners('livro', {'ids': [1, 3, 5, 7]})) == [1, 3, 5, 7]
+    assert list(jobs._owners('livro', {'ids': [1, 3, 5, 7]}, 3)) == [5, 7]
+    assert list(jobs._owners('livro', {'ids': [1, 3, 5, 7]}, 4)) == [5, 7]
+    assert list(jobs._owners('livro', {'ids': [1, 3]}, 3)) == []
+
+
+def test_resume_with_a_filter_pages_after_the_last_owner():
+    db = FakeDB({}, livros=range(1, 8))
+    jobs = PurgeJobs(db.conect_db, chunk_size=2)
+    assert list(jobs._owners('livro', {'filter': {'autor': 'X'}}, 3)) == [4, 5, 6, 7]
+    assert list(jobs._owners('livro', {'filter': {'autor': 'X'}})) == list(range(1, 8))
+
+
+def test_throttle_gives_up_after_max_throttle():
+    jobs = PurgeJobs(FakeDB({}).conect_db, pause=0, lag_fn=lambda: 10, max_lag=1,
+                     throttle_sleep=0.001, max_throttle=0.02)
+    job = novo_job(2)
+    with pytest.raises(RuntimeError, match='sobrecarregado'):
+        jobs._throttle('job', job)
+    assert jobs.stats()['throttles'] > 0
+    assert job['throttled_ms'] == jobs.stats()['throttles']
+
+
+def test_throttle_stops_when_the_lease_was_lost():
+    db = FakeDB({})
+    db.running = False
+    jobs = PurgeJobs(db.conect_db, pause=0, lag_fn=lambda: 10, max_lag=1,
+                     throttle_sleep=0.005, max_throttle=5, lease=0.03)
+    with pytest.raises(PurgeCancelled):
+        jobs._throttle('job', novo_job(2))
+
+
+def test_throttle_returns_once_the_database_recovers():
+    atrasos = iter([10, 10, 0])
+    jobs = PurgeJobs(FakeDB({}).conect_db, pause=0, lag_fn=lambda: next(atrasos), max_lag=1,
+                     throttle_sleep=0.001, max_throttle=5, max_lock_waits=5)
+    jobs._lock_waits = lambda: 0
+    jobs._throttle('job', novo_job(2))
+    assert jobs.stats()['throttles'] == 2
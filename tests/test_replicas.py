@@ -0,0 +1,126 @@
+import time
+
+import pytest
+from flask import Flask
+
+from replicas import LAST_WRITE_HEADER, Replica, ReplicaRouter, primary_requested, replica_read
+
+
+class FakeCursor:
+    def __init__(self, status):
+        self.status = status
+
+    def execute(self, sql):
+        assert sql == "SHOW REPLICA STATUS"
+
+    def fetchone(self):
+        return self.status
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.pool.status)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, host, status=None):
+        self.config = {'host': host, 'port': 3306}
+        self.status = status
+
+    def get_connection(self, timeout=None):
+        return FakeConn(self)
+
+
+def replica(host, lag):
+    r = Replica(FakePool(host, {'Seconds_Behind_Source': lag}))
+    r.check()
+    return r
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def origem(conn):
+    return conn.pool.config['host']
+
+
+def test_writes_go_to_the_primary(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0)], check_interval=60)
+    with app.test_request_context('/livro', method='POST'):
+        assert origem(router.get_connection()) == 'primario'
+
+
+def test_reads_rotate_between_fresh_replicas(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0), replica('r2', 0)], check_interval=60)
+    hosts = []
+    for _ in range(4):
+        with app.test_request_context('/livro/1'):
+            hosts.append(origem(router.get_connection()))
+    assert hosts == ['r1', 'r2', 'r1', 'r2']
+    assert router.stats()['replica_reads'] == 4
+
+
+def test_lagging_replica_falls_back_to_the_primary(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 5)], max_lag=1, check_interval=60)
+    with app.test_request_context('/livro/1'):
+        assert origem(router.get_connection()) == 'primario'
+    assert router.stats()['fallbacks'] == 1
+
+
+def test_stopped_replication_is_not_used(app):
+    parada = Replica(FakePool('r1', {'Seconds_Behind_Source': None}))
+    parada.check()
+    assert parada.error == "replicação parada"
+    router = ReplicaRouter(FakePool('primario'), [parada], check_interval=60)
+    with app.test_request_context('/livro/1'):
+        assert origem(router.get_connection()) == 'primario'
+
+
+def test_recent_write_reads_from_the_primary(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0)], check_interval=60)
+    with app.test_request_context('/livro/1', headers={LAST_WRITE_HEADER: f"{time.time():.3f}"}):
+        assert origem(router.get_connection()) == 'primario'
+    with app.test_request_context('/livro/1', headers={LAST_WRITE_HEADER: f"{time.time() - 10:.3f}"}):
+        assert origem(router.get_connection()) == 'r1'
+
+
+def test_consistency_primary(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0)], check_interval=60)
+    with app.test_request_context('/livro/1?consistency=primary'):
+        assert origem(router.get_connection()) == 'primario'
+    assert router.stats()['primary_reads'] == 1
+
+
+def test_write_responses_carry_the_commit_time(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0)], check_interval=60)
+    router.init_app(app)
+
+    @app.route('/livro', methods=['POST'])
+    def adicionar_livro():
+        return {'status': 'ok'}, 201
+
+    resposta = app.test_client().post('/livro')
+    assert float(resposta.headers[LAST_WRITE_HEADER]) == pytest.approx(time.time(), abs=5)
+
+
+def test_replica_read_marks_the_request(app):
+    router = ReplicaRouter(FakePool('primario'), [replica('r1', 0)], check_interval=60)
+    with app.test_request_context('/livro/1'):
+        assert not replica_read()
+        router.get_connection()
+        assert replica_read()
+    with app.test_request_context('/livro/1?consistency=primary'):
+        router.get_connection()
+        assert primary_requested()
+        assert not replica_read()
@@ -0,0 +1,26 @@
+import pytest
+
+from search import SEARCH_MIN_TOKEN, build_boolean_query
+
+
+def test_every_term_is_required_prefix():
+    assert build_boolean_query('mem pos') == '+mem* +pos*'
+
+
+def test_accents_and_case_are_removed():
+    assert build_boolean_query('Memórias Póstumas') == '+memorias* +postumas*'
+
+
+def test_boolean_operators_typed_by_the_user_become_spaces():
+    assert build_boolean_query('+dom -casmurro* "machado" (assis) ~x<y>') == '+dom* +casmurro* +machado* +assis*'
+
+
+def test_short_terms_are_dropped():
+    curto = 'a' * (SEARCH_MIN_TOKEN - 1)
+    assert build_boolean_query(f"{curto} machado") == '+machado*'
+
+
+@pytest.mark.parametrize('q', ['', '   ', 'a', '+- "" ()'])
+def test_query_without_usable_terms_is_rejected(q):
+    with pytest.raises(ValueError):
+        build_boolean_query(q)
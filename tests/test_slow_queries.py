@@ -0,0 +1,35 @@
+import pytest
+
+from slow_queries import fingerprint
+
+
+@pytest.mark.parametrize('sql, esperado', [
+    ("SELECT * FROM livros WHERE id = 42", "select * from livros where id = ?"),
+    ("SELECT * FROM livros WHERE id = %s", "select * from livros where id = ?"),
+    ("SELECT * FROM t WHERE x = %(x)s AND y = 1.5", "select * from t where x = ? and y = ?"),
+    ("SELECT  *\n\tFROM   livros", "select * from livros"),
+    ("SELECT * FROM livros WHERE titulo = 'Dom Casmurro'", "select * from livros where titulo = ?"),
+    ("SELECT * FROM livros WHERE titulo = 'it''s' AND autor = 'a\\'b'",
+     "select * from livros where titulo = ? and autor = ?"),
+    ('SELECT * FROM livros WHERE titulo = "x"', "select * from livros where titulo = ?"),
+])
+def test_literals_become_placeholders(sql, esperado):
+    assert fingerprint(sql) == esperado
+
+
+def test_in_lists_of_any_size_share_a_fingerprint():
+    um = fingerprint("SELECT * FROM livros WHERE id IN (%s)")
+    tres = fingerprint("SELECT * FROM livros WHERE id IN (%s, %s, %s)")
+    literais = fingerprint("SELECT * FROM livros WHERE id IN (1,2,3,4)")
+    assert um == tres == literais == "select * from livros where id in (?+)"
+
+
+def test_multi_row_values_collapse():
+    um = fingerprint("INSERT INTO t (a, b) VALUES (%s, %s)")
+    varios = fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)")
+    assert um == "insert into t (a, b) values (?, ?)"
+    assert varios == "insert into t (a, b) values (?, ?), ..."
+
+
+def test_identifiers_with_digits_are_kept():
+    assert fingerprint("SELECT col1 FROM t2") == "select col1 from t2"
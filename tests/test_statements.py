@@ -0,0 +1,124 @@
+from collections import OrderedDict
+
+from statements import StatementRegistry
+
+
+class FakeCursor:
+    def __init__(self, prepared):
+        self.prepared = prepared
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+
+    def executemany(self, sql, seq_params):
+        self.executed.append((sql, list(seq_params)))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRaw:
+    def __init__(self):
+        self._statements = OrderedDict()
+        self.cursors = []
+
+    def cursor(self, prepared=False, dictionary=False, **kwargs):
+        cursor = FakeCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+
+def executar(conn, sql, params=(1,)):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    cursor.close()
+
+
+def test_statement_is_prepared_once_per_connection():
+    registry = StatementRegistry(prepare_after=1)
+    raw = FakeRaw()
+    conn = registry.wrap(raw)
+    for id in (1, 2, 3):
+        executar(conn, "SELECT * FROM livros WHERE id = %s", (id,))
+    assert len(raw.cursors) == 1
+    assert raw.cursors[0].prepared
+    assert [params for _, params in raw.cursors[0].executed] == [(1,), (2,), (3,)]
+    stats = registry.stats()
+    assert (stats['prepares'], stats['hits'], stats['executions']) == (1, 2, 3)
+
+
+def test_each_connection_has_its_own_statements():
+    registry = StatementRegistry(prepare_after=1)
+    raws = [FakeRaw(), FakeRaw()]
+    for raw in raws:
+        executar(registry.wrap(raw), "SELECT * FROM livros WHERE id = %s")
+    assert all(len(raw.cursors) == 1 for raw in raws)
+    assert registry.stats()['prepares'] == 2
+    assert registry.stats()['statements'] == 1
+
+
+def test_least_recently_used_statement_is_closed():
+    registry = StatementRegistry(max_size=2, prepare_after=1)
+    raw = FakeRaw()
+    conn = registry.wrap(raw)
+    executar(conn, "SELECT 1 FROM livros WHERE id = %s")
+    executar(conn, "SELECT 2 FROM livros WHERE id = %s")
+    executar(conn, "SELECT 1 FROM livros WHERE id = %s")
+    executar(conn, "SELECT 3 FROM livros WHERE id = %s")
+    primeiro, segundo, terceiro = raw.cursors
+    assert segundo.closed
+    assert not primeiro.closed and not terceiro.closed
+    assert registry.stats()['evictions'] == 1
+
+
+def test_executemany_and_cursor_options_skip_the_cache():
+    registry = StatementRegistry(prepare_after=1)
+    raw = FakeRaw()
+    conn = registry.wrap(raw)
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO livros (titulo) VALUES (%s)", [('a',), ('b',)])
+    cursor.close()
+    conn.cursor(buffered=True)
+    assert [c.prepared for c in raw.cursors] == [False, False]
+    assert raw.cursors[0].closed
+    assert raw._statements == {}
+
+
+def test_disabled_registry_returns_the_raw_connection():
+    raw = FakeRaw()
+    assert StatementRegistry(max_size=0).wrap(raw) is raw
+
+
+def test_sql_is_prepared_only_after_repeated_executions():
+    registry = StatementRegistry(prepare_after=3)
+    raw = FakeRaw()
+    conn = registry.wrap(raw)
+    for id in (1, 2, 3, 4):
+        executar(conn, "SELECT * FROM livros WHERE id = %s", (id,))
+    assert [c.prepared for c in raw.cursors] == [False, False, True]
+    assert raw.cursors[0].closed and raw.cursors[1].closed
+    stats = registry.stats()
+    assert (stats['unprepared'], stats['prepares'], stats['hits']) == (2, 1, 1)
+
+
+def test_variable_in_lists_are_never_prepared():
+    registry = StatementRegistry(prepare_after=1)
+    raw = FakeRaw()
+    conn = registry.wrap(raw)
+    for _ in range(3):
+        executar(conn, "SELECT * FROM livros WHERE id IN (%s, %s)", (1, 2))
+    executar(conn, "SELECT * FROM livros WHERE id IN (%s)", (1,))
+    assert [c.prepared for c in raw.cursors] == [False, False, False, True]
+    assert registry.stats()['unprepared'] == 3
+
+
+def test_per_statement_counts_are_bounded():
+    registry = StatementRegistry(prepare_after=1, max_tracked=2)
+    conn = registry.wrap(FakeRaw())
+    for n in range(5):
+        executar(conn, f"SELECT {n} FROM livros WHERE id = %s")
+    assert registry.stats()['statements'] == 2
+    assert [linha['sql'] for linha in registry.stats_detail()['statements']] == \
+        ["SELECT 3 FROM livros WHERE id = %s", "SELECT 4 FROM livros WHERE id = %s"]
@@ -0,0 +1,94 @@
+import pytest
+from flask import Flask, jsonify
+
+from table_versions import TableVersions, unversioned
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'versions')
+
+
+@pytest.fixture
+def app(path):
+    versions = TableVersions(path)
+    app = Flask(__name__)
+    app.chamadas = 0
+
+    @app.route('/livro')
+    @versions.conditional('livros')
+    def listar_livros():
+        app.chamadas += 1
+        return jsonify([])
+
+    @app.route('/erro')
+    @versions.conditional('livros')
+    def erro():
+        return jsonify({"status": "error"}), 404
+
+    app.versions = versions
+    return app
+
+
+def test_bump_is_seen_by_every_instance_of_the_file(path):
+    worker_a = TableVersions(path)
+    worker_b = TableVersions(path)
+    worker_a.bump('livros', 'emprestimos')
+    worker_b.bump('livros')
+    epoch_a, valores_a = worker_a.snapshot()
+    epoch_b, valores_b = worker_b.snapshot()
+    assert epoch_a == epoch_b
+    assert valores_a == valores_b == {'usuarios': 0, 'livros': 2, 'emprestimos': 1}
+
+
+def test_recreated_file_gets_a_new_epoch(path, tmp_path):
+    epoch, _ = TableVersions(path).snapshot()
+    outro, _ = TableVersions(str(tmp_path / 'outro')).snapshot()
+    assert epoch != outro
+
+
+def test_matching_etag_returns_304_without_running_the_view(app):
+    client = app.test_client()
+    resposta = client.get('/livro')
+    etag = resposta.headers['ETag']
+    assert resposta.status_code == 200
+    resposta = client.get('/livro', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert app.chamadas == 1
+
+
+def test_bump_invalidates_the_etag(app):
+    client = app.test_client()
+    etag = client.get('/livro').headers['ETag']
+    app.versions.bump('usuarios')
+    assert client.get('/livro', headers={'If-None-Match': etag}).status_code == 304
+    app.versions.bump('livros')
+    resposta = client.get('/livro', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+
+
+def test_etag_depends_on_the_url(app):
+    client = app.test_client()
+    assert client.get('/livro').headers['ETag'] != client.get('/livro?limit=5').headers['ETag']
+
+
+def test_errors_have_no_etag(app):
+    resposta = app.test_client().get('/erro')
+    assert resposta.status_code == 404
+    assert 'ETag' not in resposta.headers
+
+
+def test_unversioned_responses_have_no_etag(path):
+    versions = TableVersions(path)
+    app = Flask(__name__)
+
+    @app.route('/livro/<int:id>')
+    @versions.conditional('livros')
+    def obter_livro(id):
+        unversioned()
+        return jsonify({'id': id})
+
+    resposta = app.test_client().get('/livro/1')
+    assert resposta.status_code == 200
+    assert 'ETag' not in resposta.headers
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import mysql.connector
+import pytest
+
+from write_behind import QueueFull, WriteBehindQueue
+
+QUERY = "INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo) VALUES (%s, %s, NOW())"
+
+
+# Banco falso: ids sequenciais; o livro 0 viola a FK
+class FakeDB:
+    def __init__(self):
+        self.next_id = 1
+        self.lotes = []
+        self.commits = 0
+
+    def conect_db(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def is_connected(self):
+        return True
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.lastrowid = None
+
+    def _check(self, valores):
+        if valores[1] == 0:
+            raise mysql.connector.IntegrityError(msg="livro inexistente", errno=1452)
+
+    def executemany(self, query, linhas):
+        for valores in linhas:
+            self._check(valores)
+        self.db.lotes.append(len(linhas))
+        self.lastrowid = self.db.next_id
+        self.db.next_id += len(linhas)
+
+    def execute(self, query, valores):
+        self._check(valores)
+        self.lastrowid = self.db.next_id
+        self.db.next_id += 1
+
+    def close(self):
+        pass
+
+
+def test_rows_are_grouped_in_one_commit():
+    db = FakeDB()
+    fila = WriteBehindQueue(db.conect_db, QUERY, max_rows=50, max_delay=0.2)
+    tickets = [fila.submit((1, livro)) for livro in range(1, 6)]
+    for ticket in tickets:
+        assert ticket.wait(2)
+    assert [t.emprestimo_id for t in tickets] == [1, 2, 3, 4, 5]
+    assert db.lotes == [5]
+    assert db.commits == 1
+    assert fila.receipt(tickets[0].id).as_dict() == {"status": "ok", "recibo": tickets[0].id, "emprestimo_id": 1}
+    stats = fila.stats()
+    assert (stats["enqueued"], stats["flushes"], stats["rows"], stats["errors"]) == (5, 1, 5, 0)
+    fila.shutdown()
+
+
+def test_max_rows_splits_the_batches():
+    db = FakeDB()
+    fila = WriteBehindQueue(db.conect_db, QUERY, max_rows=2, max_delay=0.2)
+    tickets = [fila.submit((1, livro)) for livro in range(1, 6)]
+    for ticket in tickets:
+        assert ticket.wait(2)
+    assert max(db.lotes) <= 2
+    assert sum(db.lotes) == 5
+    fila.shutdown()
+
+
+def test_a_bad_row_fails_alone():
+    db = FakeDB()
+    fila = WriteBehindQueue(db.conect_db, QUERY, max_rows=50, max_delay=0.2)
+    tickets = [fila.submit((1, livro)) for livro in (1, 0, 2)]
+    for ticket in tickets:
+        assert ticket.wait(2)
+    assert tickets[0].emprestimo_id is not None and tickets[2].emprestimo_id is not None
+    assert tickets[1].as_dict()["status"] == "error"
+    assert fila.stats()["errors"] == 1
+    fila.shutdown()
+
+
+def test_full_queue_rejects_immediately():
+    liberado = threading.Event()
+    db = FakeDB()
+
+    def conect_db():
+        liberado.wait(2)
+        return db.conect_db()
+
+    fila = WriteBehindQueue(conect_db, QUERY, max_rows=1, max_delay=0, capacity=1)
+    primeiro = fila.submit((1, 1))
+    # a thread pega o primeiro e fica presa no conect_db; o segundo ocupa a fila
+    while fila.stats()["queued"]:
+        time.sleep(0.001)
+    fila.submit((1, 2))
+    with pytest.raises(QueueFull):
+        fila.submit((1, 3))
+    assert fila.stats()["rejected"] == 1
+    liberado.set()
+    assert primeiro.wait(2)
+    fila.shutdown()
+
+
+def test_shutdown_drains_the_queue_and_refuses_new_rows():
+    db = FakeDB()
+    fila = WriteBehindQueue(db.conect_db, QUERY, max_rows=50, max_delay=0.05)
+    tickets = [fila.submit((1, livro)) for livro in range(1, 4)]
+    fila.shutdown()
+    assert all(t.done for t in tickets)
+    with pytest.raises(QueueFull):
+        fila.submit((1, 4))
@@ -0,0 +1,177 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import mysql.connector
+
+from bulk import insert_chunk
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Um INSERT enfileirado. O request que enfileirou espera em wait() pelo id
+# real (ack duravel) ou devolve o recibo e consulta depois.
+class Ticket:
+    __slots__ = ('id', 'valores', 'emprestimo_id', 'erro', '_done')
+
+    def __init__(self, valores):
+        self.id = uuid.uuid4().hex
+        self.valores = valores
+        self.emprestimo_id = None
+        self.erro = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _resolve(self, emprestimo_id, erro):
+        self.emprestimo_id = emprestimo_id
+        self.erro = erro
+        self._done.set()
+
+    def as_dict(self):
+        if not self.done:
+            return {"status": "pending", "recibo": self.id}
+        if self.erro is not None:
+            return {"status": "error", "recibo": self.id, "message": self.erro}
+        return {"status": "ok", "recibo": self.id, "emprestimo_id": self.emprestimo_id}
+
+
+# Fila de escrita com group commit: os requests enfileiram linhas e uma thread
+# grava em INSERTs multi-row, uma transacao a cada max_rows linhas ou
+# max_delay segundos (o que vier primeiro). Com a fila cheia submit() levanta
+# QueueFull em vez de esperar. A fila e do processo: cada worker tem a sua.
+class WriteBehindQueue:
+    def __init__(self, conect_db, query, max_rows=200, max_delay=0.005, capacity=10000,
+                 receipts=100000, on_commit=None, on_insert=None):
+        self.conect_db = conect_db
+        self.query = query
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        self.on_insert = on_insert
+        self._queue = queue.Queue(maxsize=capacity)
+        self._receipts = OrderedDict()
+        self._max_receipts = receipts
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._stats = {"enqueued": 0, "rejected": 0, "flushes": 0, "rows": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, conect_db, query, on_commit=None, on_insert=None):
+        return cls(
+            conect_db,
+            query,
+            max_rows=int(os.getenv('WRITE_BEHIND_MAX_ROWS', 200)),
+            max_delay=float(os.getenv('WRITE_BEHIND_MAX_DELAY_MS', 5)) / 1000,
+            capacity=int(os.getenv('WRITE_BEHIND_CAPACITY', 10000)),
+            on_commit=on_commit,
+            on_insert=on_insert,
+        )
+
+    def submit(self, valores):
+        self._ensure_thread()
+        ticket = Ticket(valores)
+        with self._lock:
+            if self._stopping:
+                raise QueueFull("Fila de escrita encerrada")
+            try:
+                self._queue.put_nowait(ticket)
+            except queue.Full:
+                self._stats["rejected"] += 1
+                raise QueueFull("Fila de escrita cheia")
+            self._stats["enqueued"] += 1
+            self._receipts[ticket.id] = ticket
+            while len(self._receipts) > self._max_receipts:
+                self._receipts.popitem(last=False)
+        return ticket
+
+    def receipt(self, recibo):
+        with self._lock:
+            return self._receipts.get(recibo)
+
+    # A thread nao sobrevive ao fork; cada worker sobe a sua no primeiro uso
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                primeiro = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            lote = [primeiro]
+            limite = time.monotonic() + self.max_delay
+            while len(lote) < self.max_rows:
+                restante = limite - time.monotonic()
+                try:
+                    if restante <= 0:
+                        lote.append(self._queue.get_nowait())
+                    else:
+                        lote.append(self._queue.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._flush(lote)
+
+    def _flush(self, lote):
+        conn = self.conect_db()
+        if not (conn and conn.is_connected()):
+            self._fail(lote, "Erro ao conectar ao banco de dados")
+            return
+        try:
+            resultado = insert_chunk(conn, self.query, [(ticket, ticket.valores) for ticket in lote], self.on_insert)
+        except mysql.connector.Error as err:
+            self._fail(lote, str(err))
+            return
+        finally:
+            conn.close()
+
+        if self.on_commit is not None:
+            self.on_commit()
+        erros = 0
+        for ticket, emprestimo_id, erro in resultado:
+            erros += erro is not None
+            ticket._resolve(emprestimo_id, erro)
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["rows"] += len(lote) - erros
+            self._stats["errors"] += erros
+
+    def _fail(self, lote, erro):
+        for ticket in lote:
+            ticket._resolve(None, erro)
+        with self._lock:
+            self._stats["errors"] += len(lote)
+
+    # Para de aceitar linhas e espera a thread gravar o que ja estava na fila
+    def shutdown(self, timeout=30):
+        with self._lock:
+            self._stopping = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        return stats